@@ -0,0 +1,525 @@
+#!/usr/bin/env python3
+# asyncio variant of the scholar querier and of the .pdf download path, for
+# crawls that keep many page fetches and downloads in flight from a single
+# process. python 3 only, requires aiohttp.
+#
+# results pages are parsed with the same parser classes as ScholarQuerier.
+# unlike ScholarQuerier, the querier keeps no per-query state: every query
+# collects its articles in a ScholarResults object of its own, so that any
+# number of queries can run concurrently on one querier.
+#
+# concurrency is bounded by semaphores (overall, and per host for
+# downloads), every request has a timeout, and cancelling a crawl (or
+# running out of time) leaves partial downloads behind as .part files,
+# which both download pools resume. a failed request only costs its own
+# results page, citation or download, never those of the others.
+#
+# tests/standin.py is a local stand-in for scholar (and for the hosts of
+# .pdf files), to run against with --site.
+
+import os
+import re
+import sys
+import time
+import asyncio
+import optparse
+
+from urllib.parse import urlparse
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from scholar import ScholarConf, ScholarQuerier, ScholarUtils, SearchScholarQuery, FormatError, encode
+from downloader import DownloadJob, DownloadError, resume_headers, check_complete, check_content_type, check_range, check_size, expected_size, rename_partial, _DONE, _SKIPPED, _FAILED
+from scheduler import RateLimiter, RateLimitError
+
+# connect and read timeout, in seconds
+TIMEOUT = 30.0
+# max. nr. of attempts for requests which get throttled or blocked
+MAX_ATTEMPTS = 4
+
+def check_aiohttp():
+    if aiohttp is None:
+        raise ImportError("aioscholar.py requires the aiohttp package")
+
+class LimiterResponse(object):
+    # the parts of a requests.Response that RateLimiter.report() looks at
+
+    def __init__(self, response, body=b''):
+        self.url = str(response.url)
+        self.status_code = response.status
+        self.headers = response.headers
+        self.content = body
+
+async def acquire(limiter, host):
+    # asyncio version of RateLimiter.acquire()
+    wait = limiter.reserve(host)
+    while wait > 0.0:
+        await asyncio.sleep(wait)
+        wait = limiter.reserve(host)
+
+class ScholarResults(object):
+    # stands in for the querier the results page parsers report to (see
+    # ScholarQuerier.Parser), so that each query collects its own articles
+
+    def __init__(self, query):
+        self.query = query
+        self.articles = []
+
+    def add_article(self, art):
+        self.articles.append(art)
+
+class AsyncScholarQuerier(object):
+
+    # the settings pane is handled exactly as in ScholarQuerier
+    GET_SETTINGS_URL = ScholarQuerier.GET_SETTINGS_URL
+    SET_SETTINGS_URL = ScholarQuerier.SET_SETTINGS_URL
+    _get_settings_url = ScholarQuerier._get_settings_url
+
+    def __init__(self, session, parser='bs', concurrency=8, timeout=None, limiter=None, site=None):
+        # session is an aiohttp.ClientSession, which (like the querier
+        # itself) must be created from within a coroutine. site replaces
+        # ScholarConf.SCHOLAR_SITE in all urls, e.g. to run against a local
+        # stand-in server.
+        check_aiohttp()
+
+        if parser not in ScholarQuerier.PARSERS:
+            raise FormatError('parser must be one of %s' % ', '.join(sorted(ScholarQuerier.PARSERS)))
+        self.parser_class = ScholarQuerier.PARSERS[parser]
+
+        self.session = session
+        self.timeout = aiohttp.ClientTimeout(total=(timeout or TIMEOUT))
+        self.limiter = limiter
+        self.site = site
+        self.settings = None
+
+        # citation export data, keyed by cluster id (see get_citations())
+        self.citations = {}
+
+        self.__semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def fetch(self, url):
+        # returns the body of url. raises aiohttp.ClientError on http errors
+        # and asyncio.TimeoutError on timeouts.
+        if self.site is not None and url.startswith(ScholarConf.SCHOLAR_SITE):
+            url = self.site + url[len(ScholarConf.SCHOLAR_SITE):]
+
+        host = urlparse(url).netloc.lower()
+        for attempt in range(MAX_ATTEMPTS):
+
+            # wait for our turn before taking up a connection slot
+            if self.limiter is not None:
+                await acquire(self.limiter, host)
+
+            async with self.__semaphore:
+                ScholarUtils.log('info', 'requesting %s' % url)
+                async with self.session.get(url, timeout=self.timeout) as response:
+                    body = await response.read()
+
+                    verdict = RateLimiter.OK
+                    if self.limiter is not None:
+                        verdict = self.limiter.report(host, LimiterResponse(response, body))
+
+                    if verdict == RateLimiter.OK or attempt == MAX_ATTEMPTS - 1:
+                        break
+
+        if verdict == RateLimiter.BLOCKED:
+            raise RateLimitError("blocked by %s after %d attempts" % (host, MAX_ATTEMPTS))
+
+        response.raise_for_status()
+        return body
+
+    async def apply_settings(self, settings):
+        if settings is None or not settings.is_configured():
+            return True
+
+        self.settings = settings
+
+        html = await self.fetch(self.GET_SETTINGS_URL)
+        url = self._get_settings_url(html, settings)
+        if url is None:
+            return False
+
+        await self.fetch(url)
+        ScholarUtils.log('info', 'settings applied')
+        return True
+
+    async def parse(self, query, html):
+        # parsing a page takes long enough to stall other transfers, so it
+        # runs in the default executor
+        results = ScholarResults(query)
+        parser = self.parser_class(results)
+        await asyncio.get_event_loop().run_in_executor(None, parser.parse, html)
+
+        return results.articles
+
+    async def send_query(self, query):
+        # returns the articles on the results page of query
+        return await self.send_query_url(query, query.get_url())
+
+    async def send_query_url(self, query, url):
+        html = await self.fetch(url)
+        return await self.parse(query, html)
+
+    async def query_articles(self, query, max_results=None):
+        # returns up to max_results articles of query, across results pages.
+        # the first page tells how many results there are, after which all
+        # the remaining pages are fetched concurrently.
+        page_size = query.num_results or ScholarConf.MAX_PAGE_RESULTS
+        start = query.offset or 0
+
+        articles = await self.send_query(query)
+        # without a total nor a limit, we can't tell which pages to get
+        if len(articles) == 0 or (max_results is None and not query['num_results']):
+            return articles
+
+        end = start + (max_results if max_results is not None else sys.maxsize)
+        if query['num_results']:
+            end = min(end, query['num_results'])
+
+        urls = []
+        first_url = query.get_url()
+        for offset in range(start + page_size, end, page_size):
+            query.set_offset(offset)
+            url = query.get_url()
+            # queries without an offset argument (e.g. cluster queries)
+            # always return the same page
+            if url == first_url:
+                break
+            urls.append(url)
+        query.set_offset(start)
+
+        # google reports estimates. don't go past the first empty page.
+        pages = await asyncio.gather(*[self.send_query_url(query, url) for url in urls], return_exceptions=True)
+        for url, page in zip(urls, pages):
+            if isinstance(page, BaseException):
+                # keep the pages we did get
+                ScholarUtils.log('warn', 'results retrieval failed: %s : %s' % (url, page))
+                continue
+            if len(page) == 0:
+                break
+            articles.extend(page)
+
+        if max_results is not None:
+            del articles[max_results:]
+
+        return articles
+
+    async def get_citation_data(self, article):
+        if article['url_citation'] is None:
+            return False
+        if article.citation_data is not None:
+            return True
+        if article['cluster_id'] in self.citations:
+            article.set_citation_data(self.citations[article['cluster_id']])
+            return True
+
+        try:
+            data = await self.fetch(article['url_citation'])
+        except (aiohttp.ClientError, asyncio.TimeoutError, RateLimitError) as err:
+            ScholarUtils.log('info', 'requesting citation data failed: %s' % err)
+            return False
+
+        if article['cluster_id'] is not None:
+            self.citations[article['cluster_id']] = data
+        article.set_citation_data(data)
+        return True
+
+    async def get_citations(self, articles):
+        # fetches the citation export data of articles concurrently, once
+        # per cluster id. returns the nr. of articles that have it.
+        queue, seen = [], set()
+        for art in articles:
+            if art.citation_data is None and art['url_citation'] is not None:
+                if art['cluster_id'] is None or art['cluster_id'] not in seen:
+                    queue.append(art)
+                    seen.add(art['cluster_id'])
+
+        for art, result in zip(queue, await asyncio.gather(*[self.get_citation_data(art) for art in queue], return_exceptions=True)):
+            if isinstance(result, BaseException):
+                ScholarUtils.log('info', 'requesting citation data failed: %s : %s' % (art['url_citation'], result))
+
+        for art in articles:
+            if art.citation_data is None and art['cluster_id'] in self.citations:
+                art.set_citation_data(self.citations[art['cluster_id']])
+
+        return len([art for art in articles if art.citation_data is not None])
+
+async def fetch_pdf(session, url, filename, timeout=None, limiter=None, chunk_size=(64 * 1024)):
+    # asyncio version of downloader.fetch_pdf(): streams url into
+    # filename + '.part', resuming from whatever is already there, and
+    # renames it to filename once complete. returns the nr. of bytes
+    # received.
+    partial = filename + '.part'
+    offset, headers = resume_headers(partial)
+
+    # throttling responses are retried, after the limiter's backoff (as
+    # HTTPTransport.get() does for the threaded pool)
+    host = urlparse(url).netloc.lower()
+    for attempt in range(MAX_ATTEMPTS):
+
+        if limiter is not None:
+            await acquire(limiter, host)
+
+        async with session.get(url, headers=headers, timeout=timeout) as response:
+
+            verdict = RateLimiter.OK
+            if limiter is not None:
+                verdict = limiter.report(host, LimiterResponse(response), inspect_body=False)
+
+            if verdict == RateLimiter.OK:
+                received = await _write_partial(response, partial, offset, chunk_size)
+                break
+
+            if verdict == RateLimiter.BLOCKED or attempt == MAX_ATTEMPTS - 1:
+                raise RateLimitError("%s by %s after %d attempts" % (verdict, host, attempt + 1))
+
+    rename_partial(partial, filename)
+
+    return received
+
+async def _write_partial(response, partial, offset, chunk_size):
+    # appends the body of response to partial, which has offset bytes
+    # already. returns the nr. of bytes received, 0 if there was nothing
+    # left to get.
+
+    if response.status == 416:
+        check_complete(partial, response.headers.get('Content-Range'))
+        return 0
+
+    response.raise_for_status()
+    check_content_type(partial, response.headers.get('Content-Type', ''))
+    offset = check_range(partial, offset, response.status, response.headers)
+
+    received = 0
+    # chunks are small, so blocking writes are fine here
+    with open(partial, 'ab' if offset > 0 else 'wb') as partial_file:
+        async for chunk in response.content.iter_chunked(chunk_size):
+            partial_file.write(chunk)
+            received += len(chunk)
+
+    check_size(partial, expected_size(response.status, response.headers))
+
+    return received
+
+class AsyncDownloadPool(object):
+
+    def __init__(self, session, workers=64, host_connections=2, retries=2, timeout=None, limiter=None):
+        check_aiohttp()
+
+        self.session = session
+        self.workers = max(1, workers)
+        self.host_connections = max(1, host_connections)
+        self.retries = retries
+        self.limiter = limiter
+        # no limit on the total time of a download, only on connecting and
+        # on each read, so that large files don't time out
+        self.timeout = aiohttp.ClientTimeout(total=None, sock_connect=(timeout or TIMEOUT), sock_read=(timeout or TIMEOUT))
+        self.jobs = []
+
+        self.__queue = []
+        self.__finished = 0
+
+    def add(self, url, filename):
+        # skip the download if the file already exists (or if some other
+        # job in this batch already writes to it)
+        job = DownloadJob(url, filename)
+        if os.path.exists(filename) or filename in [j.filename for j in self.jobs]:
+            job.status = _SKIPPED
+        else:
+            self.__queue.append(job)
+
+        self.jobs.append(job)
+        return job
+
+    async def run(self, timeout=None):
+        # downloads all queued jobs, giving up on the ones still running
+        # after timeout seconds (if given). returns the list of jobs.
+        start = time.time()
+
+        semaphore = asyncio.Semaphore(self.workers)
+        hosts = {}
+        for job in self.__queue:
+            if job.host not in hosts:
+                hosts[job.host] = asyncio.Semaphore(self.host_connections)
+
+        tasks = [asyncio.ensure_future(self.__download(job, hosts[job.host], semaphore)) for job in self.__queue]
+        try:
+            if tasks:
+                await asyncio.wait_for(asyncio.gather(*tasks, return_exceptions=True), timeout)
+        except asyncio.TimeoutError:
+            print("aioscholar.py::AsyncDownloadPool.run() : [INFO] timed out after %d sec" % (timeout))
+        finally:
+            # e.g. if we got cancelled ourselves
+            for task in tasks:
+                task.cancel()
+            self.__queue = []
+
+        self.report(time.time() - start)
+
+        return self.jobs
+
+    def report(self, elapsed):
+
+        counts = {}
+        for job in self.jobs:
+            counts[job.status] = counts.get(job.status, 0) + 1
+
+        size = sum([job.size for job in self.jobs])
+
+        print("aioscholar.py::AsyncDownloadPool.report() : [INFO] %d jobs : %d done, %d skipped, %d failed, %d unfinished"
+            % (len(self.jobs), counts.get(_DONE, 0), counts.get(_SKIPPED, 0), counts.get(_FAILED, 0), len(self.jobs) - sum(counts.get(s, 0) for s in (_DONE, _SKIPPED, _FAILED))))
+        print("aioscholar.py::AsyncDownloadPool.report() : [INFO] %d bytes in %.2f sec (%.1f KB/s)"
+            % (size, elapsed, (size / 1024.0) / max(elapsed, 0.001)))
+
+        for job in self.jobs:
+            if job.status == _FAILED:
+                print("aioscholar.py::AsyncDownloadPool.report() : [ERROR] %s -> %s : %s" % (job.url, job.filename, job.error))
+
+    async def __download(self, job, host_semaphore, semaphore):
+
+        # take the host slot first, so that jobs waiting for a busy host
+        # don't hold on to one of the overall slots
+        async with host_semaphore, semaphore:
+
+            start = time.time()
+            try:
+                for attempt in range(self.retries + 1):
+                    try:
+                        job.size += await fetch_pdf(self.session, job.url, job.filename, self.timeout, self.limiter)
+                        job.status = _DONE
+                        break
+                    except (DownloadError, RateLimitError) as err:
+                        # retrying won't help (throttling responses were
+                        # retried already)
+                        job.error = err
+                        job.status = _FAILED
+                        break
+                    except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as err:
+                        # e.g. a dropped connection: retry, resuming from
+                        # where we stopped
+                        job.error = err
+                        job.status = _FAILED
+                    except Exception as err:
+                        job.error = err
+                        job.status = _FAILED
+                        break
+            finally:
+                job.elapsed = time.time() - start
+
+        self.__finished += 1
+        print("aioscholar.py::AsyncDownloadPool.run() : [INFO] [%d/%d] %s %s (%d bytes, %.2f sec)"
+            % (self.__finished, len(self.jobs), job.status, job.filename, job.size, job.elapsed))
+
+def to_filename(title):
+    # same naming as leonardo.py's to_camelcase()
+    s = re.sub(r"[^\w\s]", '', title)
+    s = re.sub(r"\s+", '_', s)
+
+    return s.lower() + ".pdf"
+
+async def crawl(options):
+
+    limiter = None
+    if not options.no_rate_limit:
+        limiter = RateLimiter()
+
+    async with aiohttp.ClientSession(headers={'User-Agent': ScholarConf.USER_AGENT}) as session:
+
+        querier = AsyncScholarQuerier(session, parser=options.parser, concurrency=options.concurrency,
+            timeout=options.timeout, limiter=limiter, site=options.site)
+
+        query = SearchScholarQuery()
+        if options.author:
+            query.set_author(options.author)
+        if options.allw:
+            query.set_words(options.allw)
+        if options.phrase:
+            query.set_phrase(options.phrase)
+        if options.after or options.before:
+            query.set_timeframe(options.after, options.before)
+
+        articles = await querier.query_articles(query, max_results=options.count)
+        for art in articles:
+            print(encode(art.as_txt()) + '\n')
+
+        if not options.output_dir:
+            return articles
+        if not os.path.isdir(options.output_dir):
+            os.makedirs(options.output_dir)
+
+        pool = AsyncDownloadPool(session, workers=options.download_workers, host_connections=options.host_connections,
+            timeout=options.timeout, limiter=limiter)
+        for art in articles:
+            url = art['url_pdf'] or art['url']
+            if art['title'] and url and url.endswith(".pdf"):
+                pool.add(url, os.path.join(options.output_dir, to_filename(art['title'])))
+
+        await pool.run(timeout=options.deadline)
+
+    return articles
+
+def main():
+    usage = """aioscholar.py [options]
+queries Google Scholar and downloads .pdf files of the results, with many
+requests in flight at once (requires python 3 and aiohttp)."""
+
+    fmt = optparse.IndentedHelpFormatter(max_help_position=50, width=100)
+    parser = optparse.OptionParser(usage=usage, formatter=fmt)
+    parser.add_option('-a', '--author', metavar='AUTHORS', default=None,
+                      help='Author name(s)')
+    parser.add_option('-A', '--all', metavar='WORDS', default=None, dest='allw',
+                      help='Results must contain all of these words')
+    parser.add_option('-p', '--phrase', metavar='PHRASE', default=None,
+                      help='Results must contain exact phrase')
+    parser.add_option('--after', metavar='YEAR', default=None,
+                      help='Results must have appeared in or after given year')
+    parser.add_option('--before', metavar='YEAR', default=None,
+                      help='Results must have appeared in or before given year')
+    parser.add_option('-c', '--count', type='int', default=None,
+                      help='Maximum number of results')
+    parser.add_option('--parser', metavar='PARSER', type='choice', choices=sorted(ScholarQuerier.PARSERS.keys()), default='lxml',
+                      help='results page parser, "bs" (BeautifulSoup) or "lxml" (faster, default)')
+    parser.add_option('--output-dir', metavar='OUTPUT_DIR', default=None,
+                      help='download .pdf files of the results to OUTPUT_DIR')
+    parser.add_option('--concurrency', metavar='N', type='int', default=8,
+                      help='max. nr. of concurrent results page and citation requests (default 8)')
+    parser.add_option('--download-workers', metavar='N', type='int', default=64,
+                      help='max. nr. of concurrent downloads (default 64)')
+    parser.add_option('--host-connections', metavar='N', type='int', default=2,
+                      help='max. nr. of concurrent downloads from the same host (default 2)')
+    parser.add_option('--timeout', metavar='SECONDS', type='float', default=TIMEOUT,
+                      help='timeout of each request, in seconds (default %d)' % (TIMEOUT))
+    parser.add_option('--deadline', metavar='SECONDS', type='float', default=None,
+                      help='give up on downloads still running after SECONDS')
+    parser.add_option('--site', metavar='URL', default=None,
+                      help='send queries to URL instead of %s (e.g. a local stand-in server)' % (ScholarConf.SCHOLAR_SITE))
+    parser.add_option('--no-rate-limit', action='store_true', default=False,
+                      help='do not pace requests per host')
+    parser.add_option('-d', '--debug', action='count', default=0,
+                      help='Enable verbose logging to stderr. Repeated options increase detail of debug output.')
+
+    options, _ = parser.parse_args()
+
+    if not (options.author or options.allw or options.phrase):
+        parser.print_help()
+        return 1
+
+    if options.debug > 0:
+        ScholarConf.LOG_LEVEL = min(options.debug, ScholarUtils.LOG_LEVELS['debug'])
+
+    check_aiohttp()
+
+    try:
+        asyncio.run(crawl(options))
+    except KeyboardInterrupt:
+        # partial downloads are resumed on the next run
+        print("aioscholar.py::main() : [INFO] interrupted")
+        return 1
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
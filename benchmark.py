@@ -0,0 +1,418 @@
+#!/usr/bin/env python
+
+# micro-benchmarks for the hot paths of leonardo: parsing of scholar results
+# pages, exporting articles, walking taxonomy trees and parsing the ccs
+# taxonomy out of acm article pages.
+#
+# cases run over recorded pages (see --record) found in the fixtures
+# directory, plus synthetic inputs of increasing size. each (case, input)
+# pair runs in a forked process, which reports the best and median times of
+# a few repetitions and the peak memory used by a single run. results can be
+# saved as a baseline, and compared against a previously saved baseline.
+#
+# peak memory is the growth of the resident set size of the process during
+# the run, on top of what it had before (including what it shares with the
+# parent process). on linux, the peak rss gets reset right before the run;
+# elsewhere, only growth past the highest rss so far (of the process and of
+# the parent it was forked from) shows up, which often is none at all.
+
+import gc
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import optparse
+import multiprocessing
+
+try:
+    # unix only
+    import resource
+except ImportError:
+    resource = None
+
+from tree import *
+from scholar import *
+import leonardo
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+# kinds of recorded pages, each in its own subdirectory of FIXTURES_DIR
+FIXTURE_KINDS = ['scholar', 'acm']
+
+# relative change (vs. the baseline) above which a result gets flagged, as
+# long as the absolute change is above the noise floor (in sec and KB)
+THRESHOLD = 0.10
+MIN_TIME_DELTA = 0.001
+MIN_PEAK_DELTA = 1024.0
+
+# synthetic inputs
+
+def synthetic_scholar_page(nr_results):
+    # a results page in the layout handled by ScholarArticleParser120726,
+    # covering the link, .pdf link and [CITATION] title formats
+    results = []
+    for i in range(nr_results):
+        if i % 3 == 2:
+            h3 = ('<h3 class="gs_rt"><span class="gs_ctu"><span class="gs_ct1">[CITATION]</span>'
+                  '<span class="gs_ct2">[C]</span></span> <b>Synthetic</b> citation title %d</h3>' % (i))
+        else:
+            h3 = ('<h3 class="gs_rt"><a href="http://example.org/article%d%s"><b>Synthetic</b> article title %d</a></h3>'
+                  % (i, ".pdf" if i % 3 == 0 else "", i))
+
+        results.append(
+            '<div class="gs_r"><div class="gs_ggs gs_fl"><div class="gs_ttss"><a href="http://example.org/%d.pdf">[PDF] example.org</a></div></div>'
+            '<div class="gs_ri">%s'
+            '<div class="gs_a">A Author, B Author - Some Conference, %d - example.org</div>'
+            '<div class="gs_rs">An excerpt of the article\nwith <b>some</b> highlighted words %d</div>'
+            '<div class="gs_fl"><a href="/scholar?cites=%d&amp;as_sdt=2005&amp;hl=en&amp;num=20">Cited by %d</a> '
+            '<a href="/scholar?q=related:x%d:scholar.google.com/">Related articles</a> '
+            '<a href="/scholar?cluster=%d&amp;hl=en&amp;num=20">All %d versions</a> '
+            '<a href="/scholar.bib?q=info:x%d:scholar.google.com/&amp;output=citation">Import into BibTeX</a></div>'
+            '</div></div>' % (i, h3, 1990 + (i % 25), i, 100000 + i, i * 7, i, 100000 + i, 1 + (i % 9), i))
+
+    return ('<html><body><div id="gs_ab_md">About %d results (<b>0.05</b> sec)</div>%s</body></html>'
+        % (nr_results * 10, ''.join(results)))
+
+def synthetic_acm_page(nr_terms):
+    # an acm article page with an inline ccs script of nr_terms index terms,
+    # each one the child of a random earlier term (or of the root, "0")
+    rng = random.Random(nr_terms)
+    lids = {"0": "0"}
+    terms = []
+    for i in range(nr_terms):
+        cat_id = str(10000000 + i)
+        parent = rng.choice(list(lids.keys())[:50] + [str(10000000 + j) for j in range(max(0, i - 5), i)])
+        lids[cat_id] = lids[parent] + "." + cat_id
+        terms.append("{ f: '<a href=\"ccs.cfm?id=%s&lid=%s\">Category %d</a>', w: %d }" % (cat_id, lids[cat_id], i, i % 3))
+
+    return ('<html><head><script type="text/javascript">\n'
+        '// CCS&nbsp;for&nbsp;this&nbsp;Article\n'
+        'var ccs = [ %s ];\n'
+        '</script></head><body></body></html>' % (", ".join(terms)))
+
+def synthetic_tree(nr_nodes, chain=False):
+    # a tree rooted at "0" where each node hangs from a random earlier node
+    # (i.e. of logarithmic depth), or a single chain of nodes
+    rng = random.Random(nr_nodes)
+    tree = Tree()
+    tree.add_node("0")
+    for i in range(1, nr_nodes):
+        parent = str(i - 1) if chain else str(rng.randint(0, i - 1))
+        tree.add_node(str(i), parent, "category %d" % (i))
+
+    return tree
+
+# fixtures
+
+def load_fixtures(fixtures_dir, kind):
+    # returns [(name, contents), ...] for the recorded pages of kind
+    kind_dir = os.path.join(fixtures_dir, kind)
+    if not os.path.isdir(kind_dir):
+        return []
+
+    fixtures = []
+    for filename in sorted(os.listdir(kind_dir)):
+        with open(os.path.join(kind_dir, filename), 'rb') as fixture_file:
+            fixtures.append(("recorded:" + filename, fixture_file.read()))
+
+    return fixtures
+
+def record_fixtures(fixtures_dir, kind, urls):
+    transport = leonardo.HTTPTransport()
+
+    kind_dir = os.path.join(fixtures_dir, kind)
+    if not os.path.isdir(kind_dir):
+        os.makedirs(kind_dir)
+
+    for url in urls:
+        filename = os.path.join(kind_dir, hashlib.sha1(url.encode('utf-8')).hexdigest()[:16] + ".html")
+        with open(filename, 'wb') as fixture_file:
+            fixture_file.write(transport.open(url).read())
+        print("benchmark.py::record_fixtures() : [INFO] %s -> %s" % (url, filename))
+
+# cases. each case has a setup function, which returns a list of (name,
+# input) pairs, and an operation which runs on an input.
+
+class _Sink(object):
+    # swallows the output of chatty operations
+    def write(self, data):
+        pass
+
+    def flush(self):
+        pass
+
+def _parse(parser, page):
+    querier = ScholarQuerier(parser=parser)
+    querier.query = SearchScholarQuery()
+    querier.parse(page)
+
+    return querier.articles
+
+def _scholar_pages(fixtures_dir):
+    pages = load_fixtures(fixtures_dir, 'scholar')
+    for nr_results in [20, 200, 2000]:
+        pages.append(("synthetic:%d" % (nr_results), synthetic_scholar_page(nr_results)))
+
+    return pages
+
+def _articles(fixtures_dir):
+    return [(name, _parse('bs', page)) for name, page in _scholar_pages(fixtures_dir)]
+
+def _acm_pages(fixtures_dir):
+    pages = load_fixtures(fixtures_dir, 'acm')
+    for nr_terms in [20, 200, 2000]:
+        pages.append(("synthetic:%d" % (nr_terms), synthetic_acm_page(nr_terms)))
+
+    return pages
+
+def _trees(fixtures_dir):
+    trees = []
+    for nr_nodes in [100, 1000, 10000]:
+        trees.append(("synthetic:%d" % (nr_nodes), synthetic_tree(nr_nodes)))
+    # a deep, narrow tree (well past the recursion limit)
+    trees.append(("synthetic-chain:5000", synthetic_tree(5000, chain=True)))
+
+    return trees
+
+# operations are module-level functions, so that they can be handed to
+# worker processes however these get started
+
+def _parse_bs(page):
+    return _parse('bs', page)
+
+def _parse_lxml(page):
+    return _parse('lxml', page)
+
+def _as_txt(articles):
+    return [art.as_txt() for art in articles]
+
+def _as_csv(articles):
+    return [art.as_csv() for art in articles]
+
+def _traverse(tree):
+    return list(tree.traverse("0"))
+
+def _display(tree):
+    return tree.display("0")
+
+def _is_ancestor(tree):
+    return [tree.is_ancestor("0", i) for i in tree.nodes]
+
+def _acm_parse_regex(page):
+    return leonardo.parse_acm_taxonomy(page)
+
+def _acm_parse_js2xml(page):
+    return leonardo.parse_acm_taxonomy(page, fast=False)
+
+CASES = [
+    ('scholar_parse_bs',    _scholar_pages, _parse_bs),
+    ('scholar_parse_lxml',  _scholar_pages, _parse_lxml),
+    ('article_as_txt',      _articles,      _as_txt),
+    ('article_as_csv',      _articles,      _as_csv),
+    ('tree_traverse',       _trees,         _traverse),
+    ('tree_display',        _trees,         _display),
+    ('tree_is_ancestor',    _trees,         _is_ancestor),
+    ('acm_parse_regex',     _acm_pages,     _acm_parse_regex),
+    ('acm_parse_js2xml',    _acm_pages,     _acm_parse_js2xml),
+]
+
+# measurement
+
+def _reset_peak_rss():
+    # linux 4.0+ : resets the peak rss of the process (VmHWM) to its current
+    # rss. returns False where that isn't possible.
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+        return True
+    except (IOError, OSError):
+        return False
+
+def _proc_status_kb(field):
+    # a field of /proc/self/status, e.g. VmRSS, in KB
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith(field + ':'):
+                return float(line.split()[1])
+    return 0.0
+
+def _max_rss_kb():
+    if resource is None:
+        return 0.0
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on mac os, KB elsewhere
+    return rss / 1024.0 if sys.platform == 'darwin' else float(rss)
+
+def _measure(operation, data, repeat, conn):
+    # runs in a forked process, so that memory measurements of one case are
+    # not affected by others. sends (error, best, median, peak) back through
+    # conn, with error None unless the operation raised an exception.
+    stdout = sys.stdout
+    sys.stdout = _Sink()
+    try:
+        # peak memory of a single run, in KB
+        gc.collect()
+        if _reset_peak_rss():
+            before = _proc_status_kb('VmRSS')
+            operation(data)
+            # the kernel updates rss counters in batches, which can make
+            # this a little off (even negative)
+            peak = max(0.0, _proc_status_kb('VmHWM') - before)
+        else:
+            before = _max_rss_kb()
+            operation(data)
+            peak = _max_rss_kb() - before
+
+        times = []
+        for i in range(repeat):
+            start = time.time()
+            operation(data)
+            times.append(time.time() - start)
+    except Exception as e:
+        conn.send(("%s : %s" % (type(e).__name__, e), None, None, None))
+        conn.close()
+        return
+    finally:
+        sys.stdout = stdout
+
+    times.sort()
+    conn.send((None, times[0], times[len(times) // 2], peak))
+    conn.close()
+
+def _run_case(operation, data, repeat):
+    # (error, best, median, peak) of a case, see _measure()
+    parent_conn, child_conn = multiprocessing.Pipe()
+    process = multiprocessing.Process(target=_measure, args=(operation, data, repeat, child_conn))
+    process.start()
+    # otherwise recv() waits forever for a child which died without
+    # sending anything
+    child_conn.close()
+    try:
+        result = parent_conn.recv()
+    except EOFError:
+        result = None
+    process.join()
+    parent_conn.close()
+
+    if result is None:
+        return ("no result, exit code %s" % (process.exitcode), None, None, None)
+    return result
+
+def run(cases, fixtures_dir, repeat):
+    # returns the results and the errors of the cases, by case/input
+
+    results, errors = {}, {}
+    for name, setup, operation in CASES:
+        if cases and name not in cases:
+            continue
+
+        stdout = sys.stdout
+        sys.stdout = _Sink()
+        try:
+            inputs = setup(fixtures_dir)
+        finally:
+            sys.stdout = stdout
+
+        for input_name, data in inputs:
+            error, best, median, peak = _run_case(operation, data, repeat)
+
+            key = "%s/%s" % (name, input_name)
+            if error is not None:
+                # the other cases still run
+                errors[key] = error
+                print("%-48s [ERROR] %s" % (key, error))
+                continue
+
+            results[key] = {'best': best, 'median': median, 'peak_kb': peak}
+            print("%-48s %10.3f ms %10.3f ms %12.1f KB" % (key, best * 1000.0, median * 1000.0, peak))
+
+    return results, errors
+
+def compare(results, baseline):
+
+    print("\n%-48s %12s %12s %8s %12s %12s %8s" % ("case/input", "best (ms)", "baseline", "delta", "peak (KB)", "baseline", "delta"))
+
+    regressions = 0
+    for key in sorted(results):
+        if key not in baseline:
+            continue
+
+        result, base = results[key], baseline[key]
+        time_delta = (result['best'] - base['best']) / max(base['best'], 1e-9)
+        peak_delta = (result['peak_kb'] - base['peak_kb']) / max(base['peak_kb'], 1e-9)
+
+        flag = ""
+        if (time_delta > THRESHOLD and result['best'] - base['best'] > MIN_TIME_DELTA) \
+            or (peak_delta > THRESHOLD and result['peak_kb'] - base['peak_kb'] > MIN_PEAK_DELTA):
+            flag = " <-- regression"
+            regressions += 1
+
+        print("%-48s %12.3f %12.3f %+7.1f%% %12.1f %12.1f %+7.1f%%%s"
+            % (key, result['best'] * 1000.0, base['best'] * 1000.0, time_delta * 100.0,
+                result['peak_kb'], base['peak_kb'], peak_delta * 100.0, flag))
+
+    return regressions
+
+def main():
+    usage = """benchmark.py [options] [case ...]
+micro-benchmarks for the hot paths of leonardo. runs all cases by default.
+
+cases: %s
+
+Examples:
+
+# save a baseline, change some code, then compare against it:
+benchmark.py --save-baseline baseline.json
+benchmark.py --compare baseline.json
+
+# record scholar results pages to benchmark on:
+benchmark.py --record scholar "http://scholar.google.com/scholar?q=honeypots" """ % (", ".join([c[0] for c in CASES]))
+
+    fmt = optparse.IndentedHelpFormatter(max_help_position=50, width=100)
+    parser = optparse.OptionParser(usage=usage, formatter=fmt)
+    parser.add_option('--fixtures', metavar='DIR', default=FIXTURES_DIR,
+                      help='directory with recorded pages, in subdirectories %s. default is %s.' % (", ".join(FIXTURE_KINDS), FIXTURES_DIR))
+    parser.add_option('--repeat', metavar='N', type='int', default=5,
+                      help='nr. of timed runs per case. default is 5.')
+    parser.add_option('--save-baseline', metavar='FILE', default=None,
+                      help='save the results to FILE')
+    parser.add_option('--compare', metavar='FILE', default=None,
+                      help='compare the results against the baseline in FILE')
+    parser.add_option('--record', metavar='KIND', default=None,
+                      help='instead of benchmarking, record the pages at the given urls as fixtures of KIND (%s)' % (", ".join(FIXTURE_KINDS)))
+
+    options, args = parser.parse_args()
+
+    if options.record:
+        if options.record not in FIXTURE_KINDS or not args:
+            parser.print_help()
+            return 1
+        record_fixtures(options.fixtures, options.record, args)
+        return 0
+
+    unknown = [case for case in args if case not in [c[0] for c in CASES]]
+    if unknown:
+        sys.stderr.write("benchmark.py : [ERROR] unknown cases : %s\n" % (", ".join(unknown)))
+        return 1
+
+    print("%-48s %13s %13s %15s" % ("case/input", "best", "median", "peak memory"))
+    results, errors = run(args, options.fixtures, max(1, options.repeat))
+
+    if options.save_baseline:
+        with open(options.save_baseline, 'w') as baseline_file:
+            json.dump(results, baseline_file, indent=1, sort_keys=True)
+
+    if options.compare:
+        with open(options.compare, 'r') as baseline_file:
+            if compare(results, json.load(baseline_file)) > 0:
+                return 2
+
+    if errors:
+        sys.stderr.write("benchmark.py : [ERROR] %d cases failed : %s\n" % (len(errors), ", ".join(sorted(errors))))
+        return 1
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
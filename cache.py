@@ -0,0 +1,242 @@
+# on-disk cache for http responses. responses are stored as files named
+# after the sha1 digest of their canonical url, with an index holding the
+# url, endpoint, size, store and last access times of each entry. entries
+# expire after a per-endpoint ttl, and the least recently used entries are
+# evicted whenever the cache grows past its maximum size.
+#
+# scholar results pages (and citation exports) depend on the settings stored
+# in the preference cookie, e.g. results only come with citation export
+# links if a citation format is set. the caller describes those settings
+# with set_variant(), which becomes part of the key of such entries.
+#
+# the index is written every SAVE_EVERY stores (or SAVE_INTERVAL seconds),
+# and on close(), rather than on every store.
+
+import os
+import re
+import time
+import json
+import errno
+import hashlib
+import threading
+
+try:
+    # python 3
+    from urllib.parse import urlsplit, urlunsplit
+except ImportError:
+    # python 2
+    from urlparse import urlsplit, urlunsplit
+
+# default ports, dropped from canonical urls
+_DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+def canonical_url(url):
+    # lowercase scheme and host, drop default ports and fragments, and sort
+    # query arguments, so that equivalent urls map to the same cache entry
+    parts = urlsplit(url.strip())
+
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    if parts.port is not None and parts.port != _DEFAULT_PORTS.get(scheme):
+        host = "%s:%d" % (host, parts.port)
+
+    query = '&'.join(sorted([arg for arg in parts.query.split('&') if arg]))
+
+    return urlunsplit((scheme, host, parts.path or '/', query, ''))
+
+class ResponseCache(object):
+
+    # (endpoint, url pattern, ttl in seconds) tuples. the first matching
+    # pattern determines the endpoint of a url. a ttl of 0 means responses
+    # are never cached (e.g. the requests for applying scholar settings: the
+    # settings form holds a token tied to the session, and applying them is
+    # only useful for the cookies it sets).
+    ENDPOINTS = [
+        ('settings',  re.compile(r'/scholar_settings\?'),         0),
+        ('setprefs',  re.compile(r'/scholar_setprefs\?'),         0),
+        ('citation',  re.compile(r'/scholar\.[a-z]+\?'),          30 * 24 * 60 * 60),
+        ('results',   re.compile(r'/scholar\?'),                  24 * 60 * 60),
+        ('acm',       re.compile(r'//dl\.acm\.org[^/]*/'),        30 * 24 * 60 * 60),
+        ('default',   re.compile(r''),                            0),
+    ]
+
+    # endpoints whose responses depend on the scholar settings
+    VARIANT_ENDPOINTS = ('results', 'citation')
+
+    # default maximum size of the cache, in bytes
+    MAX_SIZE = 512 * 1024 * 1024
+
+    # the index is saved after this many changes, or if the last save is
+    # this many seconds ago
+    SAVE_EVERY = 100
+    SAVE_INTERVAL = 30.0
+
+    def __init__(self, cache_dir, max_size=None, ttls=None):
+
+        self.cache_dir = cache_dir
+        self.max_size = max_size or ResponseCache.MAX_SIZE
+
+        # per-endpoint ttls, possibly overridden by the caller
+        self.ttls = dict([(endpoint, ttl) for endpoint, _, ttl in ResponseCache.ENDPOINTS])
+        self.ttls.update(ttls or {})
+
+        self.stats = {'hits': 0, 'misses': 0, 'expired': 0, 'stores': 0, 'evictions': 0}
+
+        # see set_variant()
+        self.variant = ''
+
+        self.__lock = threading.Lock()
+        self.__index_file = os.path.join(cache_dir, 'index.json')
+        self.__index = {}
+        # changes since the index was last saved, and when that was
+        self.__changes = 0
+        self.__saved = time.time()
+
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+
+        if os.path.exists(self.__index_file):
+            try:
+                with open(self.__index_file, 'r') as index_file:
+                    self.__index = json.load(index_file)
+            except ValueError:
+                print("cache.py::ResponseCache() : [ERROR] corrupt index %s, starting from scratch" % (self.__index_file))
+
+    @property
+    def size(self):
+        return sum([entry['size'] for entry in self.__index.values()])
+
+    def set_variant(self, variant):
+        # variant is a string describing the scholar settings of the
+        # requests to come (e.g. 'citform=4')
+        self.variant = variant or ''
+
+    def endpoint(self, url):
+        for endpoint, pattern, _ in ResponseCache.ENDPOINTS:
+            if pattern.search(url):
+                return endpoint
+
+    def get(self, url):
+        # returns the cached body for url, or None on a miss
+        key = self.__key(url)
+
+        with self.__lock:
+
+            entry = self.__index.get(key)
+            if entry is None:
+                self.stats['misses'] += 1
+                return None
+
+            if time.time() - entry['stored'] > self.ttls.get(entry['endpoint'], 0):
+                self.stats['expired'] += 1
+                self.stats['misses'] += 1
+                self.__remove(key)
+                self.__changed()
+                return None
+
+            try:
+                with open(self.__path(key), 'rb') as body_file:
+                    body = body_file.read()
+            except IOError:
+                # the index is out of sync with the files on disk
+                self.stats['misses'] += 1
+                self.__remove(key)
+                self.__changed()
+                return None
+
+            entry['accessed'] = time.time()
+            self.stats['hits'] += 1
+
+            return body
+
+    def put(self, url, body):
+        # stores body for url, if its endpoint is cacheable. returns True if
+        # the body was stored.
+        endpoint = self.endpoint(url)
+        if self.ttls.get(endpoint, 0) <= 0 or len(body) > self.max_size:
+            return False
+
+        key = self.__key(url)
+
+        with self.__lock:
+
+            path = self.__path(key)
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+
+            # write to a temporary file first, so that readers never see a
+            # partially written body
+            with open(path + '.tmp', 'wb') as body_file:
+                body_file.write(body)
+            os.rename(path + '.tmp', path)
+
+            now = time.time()
+            self.__index[key] = {
+                'url': url, 'endpoint': endpoint, 'size': len(body),
+                'stored': now, 'accessed': now }
+            self.stats['stores'] += 1
+
+            self.__evict()
+            self.__changed()
+
+        return True
+
+    def invalidate(self, url):
+        with self.__lock:
+            self.__remove(self.__key(url))
+            self.__changed()
+
+    def close(self):
+        # persists the pending changes and the latest access times
+        with self.__lock:
+            self.__save()
+
+    def __key(self, url):
+        # entries of endpoints which depend on the scholar settings are
+        # keyed by the settings, too
+        if self.variant and self.endpoint(url) in ResponseCache.VARIANT_ENDPOINTS:
+            url = canonical_url(url) + '#' + self.variant
+        else:
+            url = canonical_url(url)
+        if not isinstance(url, bytes):
+            url = url.encode('utf-8')
+        return hashlib.sha1(url).hexdigest()
+
+    def __path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def __remove(self, key):
+        self.__index.pop(key, None)
+        try:
+            os.remove(self.__path(key))
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
+
+    def __evict(self):
+        # drop least recently used entries until we're under max_size
+        size = self.size
+        if size <= self.max_size:
+            return
+
+        for key in sorted(self.__index, key=lambda k: self.__index[k]['accessed']):
+            size -= self.__index[key]['size']
+            self.__remove(key)
+            self.stats['evictions'] += 1
+
+            if size <= self.max_size:
+                break
+
+    def __changed(self):
+        # saves the index every so often
+        self.__changes += 1
+        if self.__changes >= ResponseCache.SAVE_EVERY or time.time() - self.__saved > ResponseCache.SAVE_INTERVAL:
+            self.__save()
+
+    def __save(self):
+        with open(self.__index_file + '.tmp', 'w') as index_file:
+            json.dump(self.__index, index_file)
+        os.rename(self.__index_file + '.tmp', self.__index_file)
+
+        self.__changes = 0
+        self.__saved = time.time()
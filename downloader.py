@@ -0,0 +1,316 @@
+# concurrent download of .pdf files. a fixed number of worker threads
+# fetches files in parallel, while a per-host limit makes sure we don't
+# open too many simultaneous connections to the same server.
+#
+# files are streamed in chunks to <filename>.part and only renamed to
+# <filename> once complete and validated as a .pdf file. an interrupted 
+# download leaves its .part file behind, which is resumed with an http 
+# range request on the next attempt. the ETag (or Last-Modified date) of the
+# response which started the .part file is kept next to it, in
+# <filename>.part.validator, and the range request is made conditional on it
+# (If-Range), so that a file which changed on the server isn't spliced onto
+# the start of the old one. failed attempts are retried after an exponential
+# backoff.
+
+import os
+import re
+import sys
+import time
+import threading
+
+try:
+    # python 3
+    from urllib.parse import urlparse
+except ImportError:
+    # python 2
+    from urlparse import urlparse
+
+from transport import HTTPTransport
+
+(_PENDING, _DONE, _SKIPPED, _FAILED) = ('pending', 'done', 'skipped', 'failed')
+
+# every .pdf file starts with this signature
+PDF_MAGIC = b'%PDF-'
+
+class DownloadError(Exception):
+    pass
+
+def range_total(content_range):
+    # the complete size from a 416 response's Content-Range header
+    # (bytes */<size>), None if there's none
+    match = re.match(r'bytes \*/(\d+)$', (content_range or '').strip())
+    return int(match.group(1)) if match else None
+
+def expected_size(status, headers):
+    # the size of the whole file, once the body of a 200 (Content-Length)
+    # or 206 (the total of Content-Range) response is in. None if the
+    # server doesn't say, or if the body is compressed on the way (which
+    # Content-Length counts).
+    if headers.get('Content-Encoding', 'identity').strip().lower() not in ('', 'identity'):
+        return None
+
+    if status == 206:
+        match = re.match(r'bytes \d+-\d+/(\d+)$', headers.get('Content-Range', '').strip())
+        return int(match.group(1)) if match else None
+
+    length = headers.get('Content-Length', '').strip()
+    return int(length) if length.isdigit() else None
+
+def resume_headers(partial):
+    # (offset, headers) of the request for the rest of partial. without a
+    # validator there's no telling whether partial is the start of the
+    # file the server has now, so it starts from scratch.
+    offset = os.path.getsize(partial) if os.path.exists(partial) else 0
+    validator = None
+    if offset > 0 and os.path.exists(partial + '.validator'):
+        with open(partial + '.validator') as validator_file:
+            validator = validator_file.read().strip()
+
+    if not validator:
+        return 0, {}
+
+    return offset, {'Range': 'bytes=%d-' % (offset), 'If-Range': validator}
+
+def save_validator(partial, headers):
+    # keeps the ETag (weak ones won't do for If-Range) or else the
+    # Last-Modified date of a response that starts partial
+    validator = headers.get('ETag', '').strip()
+    if not validator or validator.startswith('W/'):
+        validator = headers.get('Last-Modified', '').strip()
+
+    if validator:
+        with open(partial + '.validator', 'w') as validator_file:
+            validator_file.write(validator)
+    elif os.path.exists(partial + '.validator'):
+        os.remove(partial + '.validator')
+
+def remove_partial(partial):
+    for path in [partial, partial + '.validator']:
+        if os.path.exists(path):
+            os.remove(path)
+
+def check_complete(partial, content_range):
+    # a 416 response: the server won't give us anything past the end of
+    # the partial file, so it's complete if it has exactly as many bytes as
+    # the file on the server. otherwise it's stale (e.g. the file changed
+    # since): remove it, to start from scratch on the next attempt.
+    size = os.path.getsize(partial)
+    total = range_total(content_range)
+    if total != size:
+        remove_partial(partial)
+        raise IOError("stale %s : %d bytes, but the server has %s" % (partial, size, total))
+
+def check_content_type(partial, content_type):
+    # html instead of a .pdf, e.g. a login or paywall page. a .part file
+    # left by an earlier attempt is no good either.
+    content_type = content_type.split(';')[0].strip().lower()
+    if content_type.startswith('text/'):
+        remove_partial(partial)
+        raise DownloadError("unexpected content type %s" % (content_type))
+
+def check_range(partial, offset, status, headers):
+    # returns the offset the body of a 200 or 206 response starts at
+    if offset > 0 and status != 206:
+        # the server ignored the range request, or the file changed since
+        # (If-Range): start from scratch
+        offset = 0
+    elif status == 206:
+        content_range = headers.get('Content-Range', '')
+        if not content_range.startswith('bytes %d-' % (offset)):
+            raise DownloadError("unexpected content range %s (have %d bytes)" % (content_range, offset))
+
+    if offset == 0:
+        save_validator(partial, headers)
+
+    return offset
+
+def check_size(partial, expected):
+    # e.g. the connection dropped before the end of the body, which not
+    # every http client notices: keep what we have, to resume it later
+    size = os.path.getsize(partial)
+    if expected is not None and size != expected:
+        raise DownloadError("truncated %s : %d bytes, expected %d" % (partial, size, expected))
+
+def rename_partial(partial, filename):
+    with open(partial, 'rb') as partial_file:
+        magic = partial_file.read(len(PDF_MAGIC))
+
+    if magic != PDF_MAGIC:
+        remove_partial(partial)
+        raise DownloadError("not a .pdf file")
+
+    # atomic on posix: filename is either absent or complete
+    os.rename(partial, filename)
+    # and the validator
+    remove_partial(partial)
+
+def fetch_pdf(transport, url, filename, chunk_size=(64 * 1024)):
+    # streams url into filename + '.part', resuming from whatever is already
+    # there, and renames it to filename once complete. returns the nr. of
+    # bytes received.
+    partial = filename + '.part'
+    offset, headers = resume_headers(partial)
+
+    received = 0
+    response = transport.get(url, headers=headers, stream=True)
+    try:
+        if response.status_code == 416:
+            check_complete(partial, response.headers.get('Content-Range'))
+            print("downloader.py::fetch_pdf() : [INFO] %s was complete already" % (partial))
+        else:
+            response.raise_for_status()
+            check_content_type(partial, response.headers.get('Content-Type', ''))
+            offset = check_range(partial, offset, response.status_code, response.headers)
+
+            with open(partial, 'ab' if offset > 0 else 'wb') as partial_file:
+                for chunk in response.iter_content(chunk_size):
+                    if chunk:
+                        partial_file.write(chunk)
+                        received += len(chunk)
+
+            check_size(partial, expected_size(response.status_code, response.headers))
+    finally:
+        response.close()
+
+    rename_partial(partial, filename)
+
+    return received
+
+class DownloadJob(object):
+
+    def __init__(self, url, filename):
+        self.url = url
+        self.filename = filename
+        self.host = urlparse(url).netloc.lower()
+        self.status = _PENDING
+        self.size = 0
+        self.elapsed = 0.0
+        self.error = None
+
+class DownloadPool(object):
+
+    # seconds to wait before the first retry of a download, doubled for
+    # every further one
+    BACKOFF = 1.0
+
+    def __init__(self, workers=4, host_connections=2, transport=None, retries=2, metrics=None):
+        self.workers = max(1, workers)
+        self.host_connections = max(1, host_connections)
+        self.transport = transport or HTTPTransport()
+        self.retries = retries
+        # optional Metrics instance (see metrics.py)
+        self.metrics = metrics
+        self.jobs = []
+
+        self.__queue = []
+        self.__active = {}
+        self.__finished = 0
+        self.__total = 0
+        self.__lock = threading.Condition()
+
+    def add(self, url, filename):
+        # skip the download if the file already exists (or if some other
+        # job in this batch already writes to it)
+        job = DownloadJob(url, filename)
+        if os.path.exists(filename) or filename in [j.filename for j in self.jobs]:
+            job.status = _SKIPPED
+        else:
+            self.__queue.append(job)
+
+        self.jobs.append(job)
+        return job
+
+    def run(self):
+
+        start = time.time()
+        self.__total = len(self.__queue)
+
+        threads = []
+        for i in range(min(self.workers, len(self.__queue))):
+            thread = threading.Thread(target=self.__work)
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+
+        for thread in threads:
+            thread.join()
+
+        self.report(time.time() - start)
+
+        return self.jobs
+
+    def report(self, elapsed):
+
+        counts = {}
+        for job in self.jobs:
+            counts[job.status] = counts.get(job.status, 0) + 1
+
+        size = sum([job.size for job in self.jobs])
+
+        print("downloader.py::DownloadPool.report() : [INFO] %d jobs : %d done, %d skipped, %d failed"
+            % (len(self.jobs), counts.get(_DONE, 0), counts.get(_SKIPPED, 0), counts.get(_FAILED, 0)))
+        print("downloader.py::DownloadPool.report() : [INFO] %d bytes in %.2f sec (%.1f KB/s)"
+            % (size, elapsed, (size / 1024.0) / max(elapsed, 0.001)))
+
+        for job in self.jobs:
+            if job.status == _FAILED:
+                print("downloader.py::DownloadPool.report() : [ERROR] %s -> %s : %s" % (job.url, job.filename, job.error))
+
+    def __next_job(self):
+        # pick the first queued job whose host has a free connection slot.
+        # returns None if there's nothing left to do.
+        with self.__lock:
+            while self.__queue:
+                for i, job in enumerate(self.__queue):
+                    if self.__active.get(job.host, 0) < self.host_connections:
+                        self.__active[job.host] = self.__active.get(job.host, 0) + 1
+                        return self.__queue.pop(i)
+
+                # all queued jobs are for busy hosts: wait for a download
+                # to finish
+                self.__lock.wait()
+
+            return None
+
+    def __release(self, job):
+        with self.__lock:
+            self.__active[job.host] -= 1
+            self.__finished += 1
+            self.__lock.notify_all()
+
+            return self.__finished
+
+    def __work(self):
+
+        job = self.__next_job()
+        while job is not None:
+
+            start = time.time()
+            for attempt in range(self.retries + 1):
+                if attempt > 0:
+                    time.sleep(self.BACKOFF * (2 ** (attempt - 1)))
+                try:
+                    job.size += fetch_pdf(self.transport, job.url, job.filename)
+                    job.status = _DONE
+                    break
+                except DownloadError:
+                    # retrying won't help
+                    job.error = sys.exc_info()[1]
+                    job.status = _FAILED
+                    break
+                except:
+                    # e.g. a dropped connection: retry, resuming from 
+                    # where we stopped
+                    job.error = sys.exc_info()[1]
+                    job.status = _FAILED
+
+            job.elapsed = time.time() - start
+            finished = self.__release(job)
+
+            if self.metrics is not None:
+                self.metrics.record('download', job.host, job.elapsed, job.size, error=(job.status == _FAILED))
+
+            print("downloader.py::DownloadPool.run() : [INFO] [%d/%d] %s %s (%d bytes, %.2f sec)"
+                % (finished, self.__total, job.status, job.filename, job.size, job.elapsed))
+
+            job = self.__next_job()
@@ -0,0 +1,266 @@
+#!/usr/bin/env python
+# inverted index over the .txt files extracted from downloaded articles,
+# backed by sqlite. for every term, the index keeps the documents it occurs
+# in, along with its positions in each document, so that both terms and
+# phrases can be looked up without going through the text again.
+#
+# the index is updated incrementally: only .txt files which are new or
+# changed since they were last indexed get (re-)tokenized, and postings of
+# .txt files which are gone get dropped.
+#
+# usage:
+#   index.py --index FILE --add DIR            index the .txt files in DIR
+#   index.py --index FILE 'term "a phrase"'    list documents matching all
+#                                              terms and phrases
+
+import os
+import re
+import sys
+import time
+import array
+import sqlite3
+import optparse
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+# a query is made of terms and "quoted phrases"
+QUERY_RE = re.compile(r'"([^"]*)"|(\S+)')
+
+def tokenize(text):
+    # lowercase words, in order of appearance
+    return TOKEN_RE.findall(text.lower())
+
+def encode_positions(positions):
+    positions = array.array('I', positions)
+    return sqlite3.Binary(positions.tobytes() if hasattr(positions, 'tobytes') else positions.tostring())
+
+def decode_positions(blob):
+    positions = array.array('I')
+    if hasattr(positions, 'frombytes'):
+        positions.frombytes(bytes(blob))
+    else:
+        positions.fromstring(str(blob))
+    return positions
+
+class TextIndex(object):
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS documents (
+            id          INTEGER PRIMARY KEY,
+            path        TEXT UNIQUE,
+            size        INTEGER,
+            mtime       REAL,
+            nr_tokens   INTEGER
+        );
+        CREATE TABLE IF NOT EXISTS terms (
+            id          INTEGER PRIMARY KEY,
+            term        TEXT UNIQUE,
+            df          INTEGER
+        );
+        CREATE TABLE IF NOT EXISTS postings (
+            term_id     INTEGER,
+            doc_id      INTEGER,
+            tf          INTEGER,
+            positions   BLOB,
+            PRIMARY KEY (term_id, doc_id)
+        );
+        CREATE INDEX IF NOT EXISTS postings_doc_id ON postings (doc_id);
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.executescript(TextIndex.SCHEMA)
+
+    def update(self, txt_dir):
+        # indexes the new and changed .txt files in txt_dir, and drops the
+        # ones which are gone. returns (nr. indexed, nr. removed).
+        txt_dir = os.path.abspath(txt_dir)
+        paths = [os.path.join(txt_dir, f) for f in sorted(os.listdir(txt_dir)) if f.endswith(".txt")]
+
+        indexed = {}
+        for doc_id, path, size, mtime in self.db.execute("SELECT id, path, size, mtime FROM documents WHERE path LIKE ?", (os.path.join(txt_dir, '%'),)):
+            if os.path.dirname(path) == txt_dir:
+                indexed[path] = (doc_id, size, mtime)
+
+        start = time.time()
+        added, removed = 0, 0
+        # term ids and document frequency updates, for the duration of the
+        # update
+        self.__ids, self.__df = {}, {}
+        with self.db:
+            for path in paths:
+                stat = os.stat(path)
+                if path in indexed:
+                    doc_id, size, mtime = indexed.pop(path)
+                    if size == stat.st_size and mtime == stat.st_mtime:
+                        continue
+                    self.__remove(doc_id)
+
+                self.__add(path, stat)
+                added += 1
+
+            for doc_id, _, _ in indexed.values():
+                self.__remove(doc_id)
+                removed += 1
+
+            self.db.executemany("UPDATE terms SET df = df + ? WHERE id = ?", [(df, term_id) for term_id, df in self.__df.items()])
+
+        self.__ids, self.__df = {}, {}
+
+        print("index.py::TextIndex.update() : [INFO] %s : %d documents indexed, %d removed (%.2f sec)"
+            % (txt_dir, added, removed, time.time() - start))
+
+        return added, removed
+
+    def search(self, query, limit=None):
+        # returns (path, nr. of matches) for the documents which contain all
+        # the terms and phrases in query, best matches first
+        parts = []
+        for phrase, term in QUERY_RE.findall(query):
+            tokens = tokenize(phrase or term)
+            if tokens:
+                parts.append(tokens)
+
+        if not parts:
+            return []
+
+        scores = None
+        for tokens in parts:
+            matches = self.__phrase_matches(tokens)
+            if scores is None:
+                scores = matches
+            else:
+                scores = dict([(doc_id, scores[doc_id] + count) for doc_id, count in matches.items() if doc_id in scores])
+            if not scores:
+                return []
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        if limit is not None:
+            ranked = ranked[:limit]
+
+        paths = self.__paths([doc_id for doc_id, _ in ranked])
+        return [(paths[doc_id], count) for doc_id, count in ranked]
+
+    def count(self):
+        return self.db.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def close(self):
+        self.db.close()
+
+    def __add(self, path, stat):
+
+        with open(path, 'rb') as txt_file:
+            text = txt_file.read().decode('utf-8', 'replace')
+
+        positions = {}
+        tokens = tokenize(text)
+        for i, token in enumerate(tokens):
+            positions.setdefault(token, []).append(i)
+
+        cursor = self.db.execute("INSERT INTO documents (path, size, mtime, nr_tokens) VALUES (?, ?, ?, ?)",
+            (path, stat.st_size, stat.st_mtime, len(tokens)))
+        doc_id = cursor.lastrowid
+
+        term_ids = self.__term_ids(positions.keys())
+        for term_id in term_ids.values():
+            self.__df[term_id] = self.__df.get(term_id, 0) + 1
+
+        self.db.executemany("INSERT INTO postings (term_id, doc_id, tf, positions) VALUES (?, ?, ?, ?)",
+            [(term_ids[term], doc_id, len(p), encode_positions(p)) for term, p in positions.items()])
+
+    def __term_ids(self, terms):
+        # {term : id}, adding the terms which aren't in the index yet
+        missing = [term for term in terms if term not in self.__ids]
+        # stay below sqlite's limit on the nr. of query parameters
+        for i in range(0, len(missing), 500):
+            chunk = missing[i:i + 500]
+            self.__ids.update(self.db.execute("SELECT term, id FROM terms WHERE term IN (%s)" % (", ".join(["?"] * len(chunk))), chunk).fetchall())
+
+        for term in missing:
+            if term not in self.__ids:
+                self.__ids[term] = self.db.execute("INSERT INTO terms (term, df) VALUES (?, 0)", (term,)).lastrowid
+
+        return dict([(term, self.__ids[term]) for term in terms])
+
+    def __remove(self, doc_id):
+        self.db.execute("UPDATE terms SET df = df - 1 WHERE id IN (SELECT term_id FROM postings WHERE doc_id = ?)", (doc_id,))
+        self.db.execute("DELETE FROM postings WHERE doc_id = ?", (doc_id,))
+        self.db.execute("DELETE FROM documents WHERE id = ?", (doc_id,))
+
+    def __postings(self, term):
+        # {doc id : positions blob} of term
+        return dict(self.db.execute(
+            "SELECT p.doc_id, p.positions FROM postings p JOIN terms t ON p.term_id = t.id WHERE t.term = ?", (term,)).fetchall())
+
+    def __phrase_matches(self, tokens):
+        # {doc id : nr. of occurrences} of a phrase (or of a single term)
+        if len(tokens) == 1:
+            return dict(self.db.execute(
+                "SELECT p.doc_id, p.tf FROM postings p JOIN terms t ON p.term_id = t.id WHERE t.term = ?", (tokens[0],)).fetchall())
+
+        # start from the rarest term, and only look at documents which have
+        # all of them
+        postings = [self.__postings(token) for token in tokens]
+        doc_ids = set(min(postings, key=len))
+        for p in postings:
+            doc_ids.intersection_update(p)
+
+        matches = {}
+        for doc_id in doc_ids:
+            # positions where the phrase would start, according to each term
+            starts = set(decode_positions(postings[0][doc_id]))
+            for offset in range(1, len(tokens)):
+                starts.intersection_update([pos - offset for pos in decode_positions(postings[offset][doc_id])])
+                if not starts:
+                    break
+            if starts:
+                matches[doc_id] = len(starts)
+
+        return matches
+
+    def __paths(self, doc_ids):
+        paths = {}
+        # stay below sqlite's limit on the nr. of query parameters
+        for i in range(0, len(doc_ids), 500):
+            chunk = doc_ids[i:i + 500]
+            paths.update(self.db.execute("SELECT id, path FROM documents WHERE id IN (%s)" % (", ".join(["?"] * len(chunk))), chunk).fetchall())
+        return paths
+
+def main():
+    usage = """index.py [options] [query]
+inverted index over .txt files. with --add, indexes the new and changed .txt
+files in a directory. with a query, lists the documents containing all its
+terms and "quoted phrases"."""
+
+    fmt = optparse.IndentedHelpFormatter(max_help_position=50, width=100)
+    parser = optparse.OptionParser(usage=usage, formatter=fmt)
+    parser.add_option('--index', metavar='FILE', default=None,
+                      help='index database file')
+    parser.add_option('--add', metavar='DIR', action='append', default=[],
+                      help='index the .txt files in DIR (may be given several times)')
+    parser.add_option('-l', '--limit', metavar='N', type='int', default=20,
+                      help='max. nr. of documents listed (default 20)')
+
+    options, args = parser.parse_args()
+
+    if not options.index or not (options.add or args):
+        parser.print_help()
+        return 1
+
+    index = TextIndex(options.index)
+
+    for txt_dir in options.add:
+        index.update(txt_dir)
+
+    if args:
+        start = time.time()
+        results = index.search(' '.join(args), limit=options.limit)
+        for path, count in results:
+            print("%6d %s" % (count, path))
+        print("index.py::main() : [INFO] %d documents in %.2f ms" % (len(results), (time.time() - start) * 1000.0))
+
+    index.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,15 +1,34 @@
 #!/usr/bin/env python
 
 import os
+import re
 import sys
+import copy
+import json
+import time
+import signal
 import optparse
-import urllib
-import requests
+import multiprocessing
 import js2xml
 
 from tree import *
 from scholar import *
-from BeautifulSoup import BeautifulSoup
+from downloader import DownloadPool
+from transport import HTTPTransport
+from cache import ResponseCache
+from scheduler import RateLimiter
+from manifest import ConversionManifest
+from store import ArticleStore
+from index import TextIndex
+from taxonomy import TaxonomyCache, acm_id
+from resolver import Resolver, ResolverCache
+from metrics import Metrics, url_host
+from profiling import profiled, start_profiling, stop_profiling
+try:
+    # for --tfidf (requires numpy and scipy)
+    from tfidf import TermDocumentMatrix
+except ImportError:
+    TermDocumentMatrix = None
 from pdfminer.pdfinterp import PDFResourceManager, PDFPageInterpreter
 from pdfminer.converter import TextConverter
 from pdfminer.layout import LAParams
@@ -18,49 +37,163 @@ from cStringIO import StringIO
 # for webpage parsing
 from lxml import html
 
-LIBRARY_PROXY = {
-    'dl.acm.org': 'dl.acm.org.proxy.library.cmu.edu'
+# pdfminer settings used for conversion. .txt files converted with other 
+# settings are redone (see manifest.py)
+CONVERSION_SETTINGS = {
+    'codec': 'utf-8',
+    'caching': True,
+    'laparams': dict((k, v) for k, v in vars(LAParams()).items() if isinstance(v, (bool, int, float, type(None))))
 }
 
 # taken from http://stackoverflow.com/questions/26494211/extracting-text-from-a-pdf-file-using-pdfminer-in-python
-def convert_pdf_to_txt(path):
-
-    # don't go ahead if the .txt file for path already exists
-    if os.path.exists(path.replace(".pdf", ".txt")):
-        return 0
-
-    rsrcmgr = PDFResourceManager()
+# yields (page number, text) for the pages of the .pdf file at path, one page
+# at a time: the text buffer is emptied after every page and parsed pdf 
+# objects aren't cached, so memory use doesn't grow with the length of the 
+# document. only the pages (0-based) in pagenos are extracted, if given, up to 
+# maxpages of them (0 for no limit). extraction ends early if stop(page 
+# number, text) returns True.
+def iter_pdf_pages(path, pagenos=None, maxpages=0, stop=None):
+
+    # resources (e.g. fonts) are shared by pages, so caching them is fine
+    rsrcmgr = PDFResourceManager(caching=CONVERSION_SETTINGS['caching'])
     retstr = StringIO()
-    codec = 'utf-8'
+    codec = CONVERSION_SETTINGS['codec']
     laparams = LAParams()
     device = TextConverter(rsrcmgr, retstr, codec=codec, laparams=laparams)
-    fp = file(path, 'rb')
+    fp = open(path, 'rb')
     interpreter = PDFPageInterpreter(rsrcmgr, device)
     password = ""
-    maxpages = 0
-    caching = True
-    pagenos=set()
+    last = max(pagenos) if pagenos else None
+    extracted = 0
 
     try:
-        for page in PDFPage.get_pages(fp, pagenos, maxpages=maxpages, password=password,caching=caching, check_extractable=True):
+        for pageno, page in enumerate(PDFPage.get_pages(fp, set(), maxpages=0, password=password, caching=False, check_extractable=True)):
+
+            if last is not None and pageno > last:
+                break
+            if pagenos and pageno not in pagenos:
+                continue
+
             interpreter.process_page(page)
+            text = retstr.getvalue()
+            retstr.seek(0)
+            retstr.truncate()
+            extracted += 1
+
+            yield pageno, text
+
+            if (maxpages and extracted >= maxpages) or (stop is not None and stop(pageno, text)):
+                break
+    finally:
+        fp.close()
+        device.close()
+        retstr.close()
+
+@profiled('convert_pdf_to_txt')
+def convert_pdf_to_txt(path, pagenos=None, maxpages=0, stop=None):
+
+    # save the text as <filename>.txt, page by page. write to a temporary 
+    # file first, so that <filename>.txt is never half-written.
+    tmp_path = path.replace(".pdf", ".txt.tmp")
+    text_file = open(tmp_path, "w")
+
+    try:
+        for pageno, text in iter_pdf_pages(path, pagenos=pagenos, maxpages=maxpages, stop=stop):
+            text_file.write(text)
     except:
-        print("leonardo.py::convert_to_pdf() : [ERROR] exception while reading .pdf file : %s" % (sys.exc_info()[0]))
+        print("leonardo.py::convert_pdf_to_txt() : [ERROR] exception while reading .pdf file : %s" % (sys.exc_info()[0]))
+        text_file.close()
+        os.remove(tmp_path)
         return -1
 
-    # extract the text from the read pages
-    text = retstr.getvalue()
-    # save it as <filename>.txt
-    text_file = open(path.replace(".pdf", ".txt"), "w")
-    text_file.write(text)
     text_file.close()
-
-    fp.close()
-    device.close()
-    retstr.close()
+    os.rename(tmp_path, path.replace(".pdf", ".txt"))
 
     return 0
 
+# runs convert_pdf_to_txt() in a worker process. never raises, so that a bad 
+# .pdf file can't take down the rest of the batch.
+def _convert_worker(path):
+
+    start = time.time()
+    try:
+        status = convert_pdf_to_txt(path)
+        error = "could not read .pdf file" if status < 0 else None
+    except:
+        status = -1
+        error = "%s : %s" % (sys.exc_info()[0].__name__, sys.exc_info()[1])
+
+    return (path, status, error, time.time() - start)
+
+def _ignore_sigint():
+    # let the parent process handle ctrl+c
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+# converts the .pdf files in output_dir to .txt files, using a pool of 
+# worker processes (pdfminer is cpu-bound). results are reported in the 
+# (sorted) order of the .pdf files, as they complete. only files which are 
+# new, changed or failed before are converted, unless force is set.
+def convert_articles(output_dir, workers=1, force=False, metrics=None):
+
+    if metrics is None:
+        metrics = Metrics()
+
+    with metrics.span('convert'):
+        return _convert_articles(output_dir, workers, force, metrics)
+
+def _convert_articles(output_dir, workers, force, metrics):
+
+    manifest = ConversionManifest(output_dir, CONVERSION_SETTINGS)
+    manifest.prune()
+
+    paths = [os.path.join(output_dir, f) for f in sorted(os.listdir(output_dir)) if f.endswith(".pdf")]
+    skipped = len(paths)
+    if not force:
+        paths = [path for path in paths if manifest.needs_conversion(path)]
+    skipped -= len(paths)
+
+    if not paths:
+        print("leonardo.py::convert_articles() : [INFO] all %d .pdf files up-to-date" % (skipped))
+        manifest.save()
+        return []
+
+    start = time.time()
+
+    pool = None
+    if workers > 1:
+        # recycle workers every few files, pdfminer isn't shy on memory
+        pool = multiprocessing.Pool(min(workers, len(paths)), _ignore_sigint, maxtasksperchild=20)
+        results = pool.imap(_convert_worker, paths)
+    else:
+        results = (_convert_worker(path) for path in paths)
+
+    failed = []
+    try:
+        for i, (path, status, error, elapsed) in enumerate(results):
+            metrics.record('convert', None, elapsed, os.path.getsize(path) if os.path.exists(path) else 0, error=(status < 0))
+            if status < 0:
+                failed.append(path)
+                manifest.record(path, ConversionManifest.FAILED, error)
+                print("leonardo.py::convert_articles() : [ERROR] [%d/%d] %s (%.2f sec) : %s" % (i + 1, len(paths), path, elapsed, error))
+            else:
+                status = manifest.record(path, ConversionManifest.OK)
+                print("leonardo.py::convert_articles() : [INFO] [%d/%d] %s (%.2f sec)%s"
+                    % (i + 1, len(paths), path, elapsed, " : no text (scanned .pdf file?)" if status == ConversionManifest.EMPTY else ""))
+
+            # don't lose too much progress on long runs
+            if (i + 1) % 100 == 0:
+                manifest.save()
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+        manifest.save()
+
+    print("leonardo.py::convert_articles() : [INFO] converted %d .pdf files (%d failed, %d up-to-date) in %.2f sec" 
+        % (len(paths) - len(failed), len(failed), skipped, time.time() - start))
+
+    return failed
+
 # taken from http://stackoverflow.com/questions/1175208/elegant-python-function-to-convert-camelcase-to-snake-case
 def to_camelcase(title):
     s = re.sub(r"[^\w\s]", '', title)
@@ -70,19 +203,13 @@ def to_camelcase(title):
 
 # in some cases, we get a url to a description webpage, which includes a link 
 # to the .pdf file. this function extracts that link.
-def extract_link(webpage):
-
-    key = webpage.lstrip("http://").split("/", 1)[0]
-
-    if key in LIBRARY_PROXY:
-        webpage = webpage.replace(key, LIBRARY_PROXY[key])
+# the per-publisher rules (and the library proxies) live in resolver.py.
+def extract_link(webpage, transport=None, resolver=None):
 
-    print(webpage)
+    if resolver is None:
+        resolver = Resolver(transport or HTTPTransport())
 
-    html_page = urllib.urlopen(webpage)
-    soup = BeautifulSoup(html_page)
-    for link in soup.findAll('a'):
-        print link.get('href')
+    return resolver.resolve(webpage)
 
 # some links cannot be directly followed unless they are stripped of unwanted 
 # prefixes, etc.
@@ -98,62 +225,221 @@ def cleanup_url(url):
 
     return url
 
-def download_articles(articles, output_dir):
+@profiled('download_articles')
+def download_articles(articles, output_dir, workers=4, host_connections=2, transport=None, store=None, taxonomies=None, resolver=None, metrics=None):
+
+    if metrics is None:
+        metrics = Metrics()
+
+    pool = DownloadPool(workers=workers, host_connections=host_connections, transport=transport, metrics=metrics)
+    if resolver is None:
+        resolver = Resolver(pool.transport, metrics=metrics)
+
+    downloads = []
+    # landing pages, resolved to .pdf urls all at once below, and the ACM
+    # pages fetched for their taxonomies, which the resolver reuses
+    landing_pages = []
+    pages = {}
 
     for article in articles:
 
+        # e.g. [CITATION] results, there's nothing to download
+        if not article['url']:
+            continue
+
+        # skip articles downloaded by a previous run
+        if store is not None:
+            pdf_path = store.pdf_path(article)
+            if pdf_path is not None and os.path.exists(pdf_path):
+                print("leonardo.py::download_articles() : [INFO] already downloaded to %s" % (pdf_path))
+                continue
+
         # filename derived from title, in camelcase (don't care how long it is)
-        title_camelcase = to_camelcase(article.attrs['title'][0]) + ".pdf"
+        title_camelcase = to_camelcase(article['title']) + ".pdf"
         filename = os.path.join(output_dir, title_camelcase)
         print("leonardo.py::download_articles() : [INFO] filename for .pdf file %s" % (filename))
 
         # download the article, save it in output dir (if filename doesn't exist yet)
-        url = cleanup_url(article.attrs['url'][0])
-        print("leonardo.py::download_articles() : [INFO] dirty vs. clean url : %s -> %s" % (article.attrs['url'][0], url))
+        url = cleanup_url(article['url'])
+        print("leonardo.py::download_articles() : [INFO] dirty vs. clean url : %s -> %s" % (article['url'], url))
 
         if url.endswith(".pdf"):
-            if not os.path.exists(filename):
-                urllib.urlretrieve(url, filename)
+            pool.add(url, filename)
+            downloads.append((article, filename))
         else:
 
             if "dl.acm.org" in url:
-                parse_acm_article(url)
-            else:
-                print("leonardo.py::download_articles() : [INFO] no parsing method for %s" % (url))
+                # the page the resolver needs (through the library proxy,
+                # if any) has the taxonomy too. a page we can't get or
+                # parse only costs the taxonomy (the timer records it as an
+                # acm error), the resolver still gets its turn.
+                try:
+                    with metrics.timer('acm', url_host(url)), metrics.span('acm'):
+                        parse_acm_article(resolver.page_url(url), transport, taxonomies, pages=pages)
+                except Exception as e:
+                    print("leonardo.py::download_articles() : [ERROR] no taxonomy for %s : %s" % (url, e))
+
+            landing_pages.append((article, filename, url))
+
+    # look for the .pdf files of the landing pages, concurrently
+    with metrics.span('resolve'):
+        pdf_urls = resolver.resolve_all([url for _, _, url in landing_pages], pages=pages)
+    for article, filename, url in landing_pages:
+        if pdf_urls.get(url) is None:
+            print("leonardo.py::download_articles() : [INFO] no .pdf file found for %s" % (url))
+            continue
+
+        pool.add(pdf_urls[url], filename)
+        downloads.append((article, filename))
+
+    # fetch the queued .pdf files in parallel
+    with metrics.span('download'):
+        results = pool.run()
+
+    # remember where the articles ended up
+    if store is not None:
+        store.set_pdf_paths([(article, filename) for article, filename in downloads if os.path.exists(filename)])
+
+    return results
 
 
 # special parser for ACM articles. scrapes ACM article pages and extracts 
 # the tree of index terms according to the ACM Computing Classification System
-def parse_acm_article(webpage):
+@profiled('parse_acm_article')
+def parse_acm_article(webpage, transport=None, taxonomies=None, pages=None):
+    # pages, if given, collects the page fetched (if any), keyed by webpage
+
+    # taxonomies parsed by earlier runs (see taxonomy.py)
+    if taxonomies is not None:
+        tax_tree = taxonomies.get(webpage)
+        if tax_tree is not None:
+            print("leonardo.py::parse_acm_article() : [INFO] cached taxonomy for %s" % (webpage))
+            tax_tree.display("0")
+            return tax_tree
+
+    if transport is None:
+        transport = HTTPTransport()
 
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64; rv:27.0) Gecko/20100101 Firefox/27.0'
-    }
+    # a refresh also bypasses the cached page
+    if taxonomies is not None and taxonomies.refresh and transport.cache is not None:
+        transport.cache.invalidate(webpage)
+
+    page = transport.open(webpage).read()
+    if pages is not None:
+        pages[webpage] = page
+    tax_tree = parse_acm_taxonomy(page)
+
+    if taxonomies is not None:
+        taxonomies.put(webpage, tax_tree)
+
+    tax_tree.display("0")
+
+    # # print js2xml.pretty_print(parsed_js) 
+    # print("***** DEPTH-FIRST ITERATION *****")
+    # for node in tax_tree.traverse("0"):
+    #     print(node)
+
+    return tax_tree
+
+# marker of the inline script which holds the CCS index terms of an article
+ACM_CCS_MARKER = 'CCS&nbsp;for&nbsp;this&nbsp;Article'
+# 'f' properties of the CCS script (quoted or not), with single or double 
+# quoted string values, e.g. f: '<a href="ccs.cfm?id=...&lid=...">...</a>'
+ACM_CCS_PROPERTY_RE = re.compile(r"""(?:\bf|'f'|"f")\s*:\s*(?:'((?:[^'\\]|\\.)*)'|"((?:[^"\\]|\\.)*)")""")
+ACM_CCS_LINK_RE = re.compile(r"""<a\s[^>]*?href\s*=\s*(?:"([^"]*)"|'([^']*)')[^>]*>([^<&]*)</a>""", re.IGNORECASE)
+ACM_CCS_ESCAPE_RE = re.compile(r"""\\(.)""")
+
+# returns the text of the inline CCS script of an ACM article page
+def acm_ccs_script(page):
+
+    # find the marker and the script around it, without parsing the page
+    marker = page.find(ACM_CCS_MARKER)
+    if marker >= 0:
+        start = page.rfind('<script', 0, marker)
+        start = page.find('>', start) + 1
+        end = page.find('</script>', marker)
+        if 0 < start <= marker < end:
+            return page[start:end]
+
+    tree = html.fromstring(page)
+    return tree.xpath("//script[contains(., '%s')]/text()" % (ACM_CCS_MARKER))[0]
+
+# (category, link) pairs of the CCS index terms in the script, straight from 
+# the script text. returns None for anything it isn't sure about (escapes 
+# other than quotes and slashes, entities or markup in category names, or 
+# fewer links than the script holds), so that the caller falls back to 
+# acm_ccs_links_js2xml().
+def acm_ccs_links_regex(taxonomy_js):
+
+    links = []
+    for single, double in ACM_CCS_PROPERTY_RE.findall(taxonomy_js):
+        value = single or double
+        if '\\' in value:
+            if re.search(r"""\\[^'"\\/]""", value):
+                return None
+            value = ACM_CCS_ESCAPE_RE.sub(r'\1', value)
+
+        if 'href' not in value:
+            continue
 
-    page = requests.get(webpage, headers=headers)
-    tree = html.fromstring(page.content)
+        match = ACM_CCS_LINK_RE.search(value)
+        if match is None:
+            return None
+
+        href = (match.group(1) or match.group(2)).replace('&amp;', '&')
+        if '&' not in href or '?' not in href or '&#' in href:
+            return None
+
+        links.append((match.group(3), href))
+
+    if not links or len(links) != taxonomy_js.count('href'):
+        return None
+
+    return links
+
+# (category, link) pairs of the CCS index terms in the script, by way of the
+# javascript parser
+def acm_ccs_links_js2xml(taxonomy_js):
 
-    taxonomy_js = tree.xpath("//script[contains(., 'CCS&nbsp;for&nbsp;this&nbsp;Article')]/text()")[0]
     # enter the javascript parser
     parsed_js = js2xml.parse(taxonomy_js)
-    
-    # values represent the name of the taxonomy categories
-    tax_tree = Tree()
-    tax_tree.add_node("0")
 
+    links = []
+    # values represent the name of the taxonomy categories
     raw_values = parsed_js.xpath("//property[@name='f']/string/text()")
     for rv in raw_values:
         # read the raw value into an html
         html_value = html.fromstring(rv)
         # extract the category and ids
-        cat_id = html_value.xpath("//a/@href")
+        hrefs = html_value.xpath("//a/@href")
 
-        if (len(cat_id) < 1):
+        if (len(hrefs) < 1):
             continue
 
-        cat = html_value.xpath("//a/text()")[0]
-        cat_id = html_value.xpath("//a/@href")[0].split("?", 1)[1].split("&", 1)[0].lstrip("id=")
-        cat_ids = html_value.xpath("//a/@href")[0].split("?", 1)[1].split("&", 1)[1].lstrip("lid=")
+        links.append((html_value.xpath("//a/text()")[0], hrefs[0]))
+
+    return links
+
+# builds the tree of ACM CCS index terms out of the contents of an ACM 
+# article page (separate from parse_acm_article(), so that it can be 
+# benchmarked on recorded pages). the links to the terms are pulled out of 
+# the script directly, unless that fails validation, in which case (or if 
+# fast is False) the script goes through js2xml.
+def parse_acm_taxonomy(page, fast=True):
+
+    taxonomy_js = acm_ccs_script(page)
+
+    links = acm_ccs_links_regex(taxonomy_js) if fast else None
+    if links is None:
+        links = acm_ccs_links_js2xml(taxonomy_js)
+
+    tax_tree = Tree()
+    tax_tree.add_node("0")
+
+    for cat, href in links:
+
+        cat_id = href.split("?", 1)[1].split("&", 1)[0].lstrip("id=")
+        cat_ids = href.split("?", 1)[1].split("&", 1)[1].lstrip("lid=")
 
         # print cat
         # print cat_id
@@ -165,17 +451,56 @@ def parse_acm_article(webpage):
         except:
             print("leonardo.py::parse_acm_article() : [ERROR] key error with (%s, %s)" % (cat_id, cat_ids.split(".")[-2]))
 
-    print tax_tree.display("0")
+    return tax_tree
 
-    # # print js2xml.pretty_print(parsed_js) 
-    # print("***** DEPTH-FIRST ITERATION *****")
-    # for node in tax_tree.traverse("0"):
-    #     print(node)
-        
+# lists the subcategories of a node of the merged CCS taxonomy with the most
+# articles among the given (ACM) articles
+def print_ccs_top(taxonomies, articles, node, k=10):
+
+    acm_ids = [acm_id(cleanup_url(article['url'])) for article in articles if article['url']]
+    acm_ids = [key for key in acm_ids if key is not None]
+
+    print("leonardo.py::print_ccs_top() : [INFO] top subcategories of %s, for %d ACM articles :" % (node, len(acm_ids)))
+    for child, category, count in taxonomies.top_subcategories(node, acm_ids, k=k):
+        print("%6d %s %s" % (count, child, category))
+
+class InstrumentedQuerier(ScholarQuerier):
+    # ScholarQuerier which records its requests (as the query, settings or
+    # citations stage, depending on the url) and the parsing of results
+    # pages in a Metrics instance
+
+    # the first matching pattern determines the stage of a request
+    STAGES = [
+        ('settings',  re.compile(r'/scholar_set(?:tings|prefs)\?')),
+        ('citations', re.compile(r'/scholar\.[a-z]+\?')),
+        ('query',     re.compile(r'')),
+    ]
+
+    def __init__(self, metrics, transport=None, parser='bs'):
+        ScholarQuerier.__init__(self, transport=transport, parser=parser)
+        self.metrics = metrics
+
+    def _get_http_response(self, url, log_msg=None, err_msg=None):
+        stage = [stage for stage, pattern in InstrumentedQuerier.STAGES if pattern.search(url)][0]
+
+        start = time.time()
+        html = ScholarQuerier._get_http_response(self, url, log_msg=log_msg, err_msg=err_msg)
+        # failed requests return None
+        self.metrics.record(stage, url_host(url), time.time() - start, len(html or ''), error=(html is None))
 
-def get_articles(options):
+        return html
 
-    querier = ScholarQuerier()
+    def parse(self, html):
+        with self.metrics.timer('parse') as timer:
+            timer.nbytes = len(html)
+            ScholarQuerier.parse(self, html)
+
+def get_querier(options, transport=None, metrics=None):
+
+    if metrics is not None:
+        querier = InstrumentedQuerier(metrics, transport=transport, parser=options.parser)
+    else:
+        querier = ScholarQuerier(transport=transport, parser=options.parser)
     settings = ScholarSettings()
 
     if options.citation == 'bt':
@@ -188,9 +513,29 @@ def get_articles(options):
         settings.set_citation_format(ScholarSettings.CITFORM_REFWORKS)
     elif options.citation is not None:
         print('Invalid citation link format, must be one of "bt", "en", "rm", or "rw".')
-        return 1
+        return None
+
+    # results pages with and without citation export links must not be
+    # mixed up in the response cache
+    if transport is not None and transport.cache is not None:
+        transport.cache.set_variant("citform=%d" % (settings.citform))
+
+    if metrics is not None:
+        with metrics.span('settings'):
+            querier.apply_settings(settings)
+    else:
+        querier.apply_settings(settings)
 
-    querier.apply_settings(settings)
+    return querier
+
+@profiled('get_articles')
+def get_articles(options, transport=None, querier=None, metrics=None):
+
+    # a querier passed in (e.g. in batch mode) already has its settings
+    if querier is None:
+        querier = get_querier(options, transport, metrics)
+    if querier is None:
+        return None
 
     # if options.cluster_id:
     #     query = ClusterScholarQuery(cluster=options.cluster_id)
@@ -217,17 +562,356 @@ def get_articles(options):
     if options.no_citations:
         query.set_include_citations(False)
 
-    if options.count is not None:
-        options.count = min(options.count, ScholarConf.MAX_PAGE_RESULTS)
-        query.set_num_page_results(options.count)
-
     if options.offset is not None:
         query.set_offset(options.offset)
 
+    # counts that fit in a single page are retrieved with a single query. 
+    # larger counts are fetched page by page, starting at the given offset.
+    if options.count is not None and options.count > ScholarConf.MAX_PAGE_RESULTS:
+        for article in querier.iter_articles(query, max_results=options.count):
+            print("leonardo.py::get_articles() : [INFO] got article : %s" % (encode(article['title'])))
+        return querier
+
+    if options.count is not None:
+        query.set_num_page_results(options.count)
+
     querier.send_query(query)
 
     return querier
 
+# query spec keys accepted in batch files. keys are the dest names of the 
+# query options (e.g. "allw" for -A/--all), plus an optional "name".
+BATCH_KEYS = ['author', 'allw', 'some', 'none', 'phrase', 'title_only', 'pub', 
+    'after', 'before', 'no_patents', 'no_citations', 'count', 'offset']
+
+# the kinds of values of query spec keys (null means the command line one)
+BATCH_FLAGS = ['title_only', 'no_patents', 'no_citations']
+BATCH_NUMBERS = ['after', 'before', 'count', 'offset']
+
+def check_batch_value(key, value):
+    # raises ValueError unless value fits key. numbers must be actual
+    # numbers: under python 2, the string "50" compares greater than any
+    # int (e.g. MAX_PAGE_RESULTS). years may be strings of digits, as on
+    # the command line.
+    if value is None:
+        return
+    if key in BATCH_FLAGS:
+        if not isinstance(value, bool):
+            raise ValueError("%s must be true or false" % (key))
+    elif key in BATCH_NUMBERS:
+        if key in ['after', 'before'] and isinstance(value, type(u'')) and value.isdigit():
+            return
+        if isinstance(value, bool) or not isinstance(value, int):
+            raise ValueError("%s must be an integer" % (key))
+        if value < (1 if key == 'count' else 0):
+            raise ValueError("%s must be %s" % (key, "positive" if key == 'count' else "non-negative"))
+    elif not isinstance(value, (type(u''), str)) or not value.strip():
+        raise ValueError("%s must be a non-empty string" % (key))
+
+def load_batch(filename):
+    # reads query specs from a json-lines file (blank lines and lines 
+    # starting with '#' are ignored)
+    specs = []
+    # output dir name -> line nr. of the query writing to it
+    dirs = {}
+    with open(filename, 'r') as batch_file:
+        for nr, line in enumerate(batch_file, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+
+            try:
+                spec = json.loads(line)
+            except ValueError:
+                raise ValueError("%s:%d : invalid json" % (filename, nr))
+
+            if not isinstance(spec, dict):
+                raise ValueError("%s:%d : query spec must be a json object" % (filename, nr))
+
+            unknown = [key for key in spec if key not in BATCH_KEYS and key != 'name']
+            if unknown:
+                raise ValueError("%s:%d : unknown query spec keys : %s" % (filename, nr, ', '.join(sorted(unknown))))
+
+            for key in sorted(spec):
+                try:
+                    check_batch_value(key, spec[key])
+                except ValueError as e:
+                    raise ValueError("%s:%d : %s" % (filename, nr, e))
+
+            # every query needs an output dir of its own (see run_batch())
+            query_dir = to_camelcase(batch_name(spec, len(specs)))
+            if not query_dir:
+                raise ValueError("%s:%d : name has no letters or digits" % (filename, nr))
+            if query_dir in dirs:
+                raise ValueError("%s:%d : name maps to the same output dir (%s) as the query on line %d" % (filename, nr, query_dir, dirs[query_dir]))
+            dirs[query_dir] = nr
+
+            specs.append(spec)
+
+    return specs
+
+def batch_name(spec, i):
+    # name of the i-th (from 0) query spec
+    return spec.get('name') or "query%03d" % (i + 1)
+
+def run_batch(options, specs, transport, store=None, index=None, tdm=None, taxonomies=None, resolver=None, metrics=None):
+    # runs the queries in specs through a single querier, so that settings
+    # are applied (and cookies loaded) once and the querier's citation data 
+    # and the transport's connections and response cache are shared. each 
+    # query gets a sub-directory of the output dir, with the .csv of its 
+    # results and its .pdf and .txt files. a summary of all queries is 
+    # (re-)written to the output dir after each query.
+    if metrics is None:
+        metrics = Metrics()
+
+    querier = get_querier(options, transport, metrics)
+    if querier is None:
+        return None
+
+    summary_path = os.path.join(options.output_dir, 'batch_summary.json')
+    summary = []
+
+    for i, spec in enumerate(specs):
+
+        name = batch_name(spec, i)
+        query_dir = os.path.join(options.output_dir, to_camelcase(name))
+
+        # query options default to the command line ones
+        query_options = copy.copy(options)
+        for key, value in spec.items():
+            if key != 'name':
+                setattr(query_options, key, value)
+
+        entry = {'name': name, 'query': spec, 'output_dir': query_dir, 'error': None}
+        start = time.time()
+        print("leonardo.py::run_batch() : [INFO] [%d/%d] query %s" % (i + 1, len(specs), name))
+
+        try:
+            with metrics.span('query'):
+                get_articles(query_options, transport, querier)
+            articles = list(querier.articles)
+            entry['articles'] = len(articles)
+
+            # a results page we didn't get is an error (the query needs to be
+            # redone), not the end of the results. go on with what we have.
+            if querier.failed_url is not None:
+                entry['error'] = "results retrieval failed : %s" % (querier.failed_url)
+                print("leonardo.py::run_batch() : [ERROR] query %s failed : %s (%d articles)" % (name, entry['error'], len(articles)))
+
+            if not os.path.isdir(query_dir):
+                os.makedirs(query_dir)
+
+            with open(os.path.join(query_dir, 'articles.csv'), 'w') as csv_file:
+                for j, article in enumerate(articles):
+                    csv_file.write(encode(article.as_csv(header=(j == 0))) + '\n')
+
+            if store is not None:
+                entry['new'] = store.add_articles(articles)
+
+            jobs = download_articles(articles, query_dir,
+                workers=options.download_workers, host_connections=options.host_connections, transport=transport, store=store, taxonomies=taxonomies, resolver=resolver, metrics=metrics)
+            entry['downloads'] = {}
+            for job in jobs:
+                entry['downloads'][job.status] = entry['downloads'].get(job.status, 0) + 1
+
+            failed = convert_articles(query_dir, workers=options.convert_workers, force=options.force_convert, metrics=metrics)
+            entry['conversion_failures'] = len(failed)
+
+            if index is not None or tdm is not None:
+                with metrics.timer('index'), metrics.span('index'):
+                    if index is not None:
+                        index.update(query_dir)
+                    if tdm is not None:
+                        tdm.update(query_dir)
+                        tdm.save()
+
+        except Exception as e:
+            # e.g. blocked by scholar: keep going, the summary tells which
+            # queries need to be redone
+            entry['error'] = "%s : %s" % (type(e).__name__, e)
+            print("leonardo.py::run_batch() : [ERROR] query %s failed : %s" % (name, entry['error']))
+
+        entry['elapsed'] = time.time() - start
+        summary.append(entry)
+
+        with open(summary_path + '.tmp', 'w') as summary_file:
+            json.dump(summary, summary_file, indent=1, sort_keys=True)
+        os.rename(summary_path + '.tmp', summary_path)
+
+    print("leonardo.py::run_batch() : [INFO] %d queries (%d failed), %d articles, summary in %s" 
+        % (len(summary), len([e for e in summary if e['error']]), sum([e.get('articles', 0) for e in summary]), summary_path))
+
+    return querier
+
+def run(options, specs, metrics):
+    # the run, once the options are checked
+
+    # optional on-disk cache of HTTP responses
+    cache = None
+    if options.cache_dir:
+
+        ttls = {}
+        for ttl in options.cache_ttl:
+            try:
+                endpoint, seconds = ttl.split("=", 1)
+                ttls[endpoint] = int(seconds)
+            except ValueError:
+                sys.stderr.write("leonardo.py : [ERROR] invalid --cache-ttl value : %s\n" % (ttl))
+                return 1
+
+        cache = ResponseCache(options.cache_dir, max_size=(options.cache_size * 1024 * 1024), ttls=ttls)
+
+    # per-host pacing of requests
+    limiter = None
+    if not options.no_rate_limit:
+
+        rates = {}
+        for rate in options.rate:
+            try:
+                host, value = rate.split("=", 1)
+                if float(value) <= 0.0:
+                    raise ValueError(value)
+                # keep the default burst allowance of the host
+                rates[host] = (float(value), RateLimiter.RATES.get(host, RateLimiter.DEFAULT_RATE)[1])
+            except ValueError:
+                sys.stderr.write("leonardo.py : [ERROR] invalid --rate value : %s\n" % (rate))
+                return 1
+
+        limiter = RateLimiter(rates=rates, cooldown=options.cooldown)
+
+    # a single pool of keep-alive connections, shared by the querier, the 
+    # ACM scraper and the link extractor
+    transport = HTTPTransport(
+        pool_connections=options.pool_connections,
+        pool_maxsize=max(options.pool_size, options.host_connections),
+        timeout=options.timeout,
+        cache=cache,
+        limiter=limiter)
+
+    store = None
+    if options.store:
+        store = ArticleStore(options.store)
+
+    index = None
+    if options.index:
+        index = TextIndex(options.index)
+
+    if options.ccs_top and not options.acm_cache:
+        sys.stderr.write("""leonardo.py : [ERROR] --ccs-top requires --acm-cache\n""")
+        return 1
+
+    proxy = {}
+    for mapping in options.library_proxy:
+        host, _, proxy_host = mapping.partition("=")
+        if not host.strip() or not proxy_host.strip():
+            sys.stderr.write("leonardo.py : [ERROR] invalid --library-proxy value : %s\n" % (mapping))
+            return 1
+        proxy[host.strip().lower()] = proxy_host.strip()
+
+    resolver_cache = None
+    if options.resolve_cache:
+        resolver_cache = ResolverCache(options.resolve_cache)
+    resolver = Resolver(transport, cache=resolver_cache, workers=options.resolve_workers, proxy=proxy, metrics=metrics)
+
+    taxonomies = None
+    if options.acm_cache:
+        taxonomies = TaxonomyCache(options.acm_cache, refresh=options.refresh_acm)
+
+    tdm = None
+    if options.tfidf:
+        if TermDocumentMatrix is None:
+            sys.stderr.write("""leonardo.py : [ERROR] --tfidf requires numpy and scipy\n""")
+            return 1
+        tdm = TermDocumentMatrix(options.tfidf)
+
+    # make the query, get the query results (or take them from the store)
+    if specs is not None:
+        query_results = run_batch(options, specs, transport, store, index, tdm, taxonomies, resolver, metrics)
+    elif options.from_store:
+        query_results = get_querier(options, transport, metrics)
+        if query_results is not None:
+            query_results.articles = store.load(year_from=options.after, year_to=options.before, limit=options.count)
+            print("leonardo.py::main() : [INFO] loaded %d of %d stored articles" % (len(query_results.articles), store.count()))
+    else:
+        with metrics.span('query'):
+            query_results = get_articles(options, transport, metrics=metrics)
+        if query_results is not None and store is not None:
+            inserted = store.add_articles(query_results.articles)
+            print("leonardo.py::main() : [INFO] %d new articles, %d already stored" % (inserted, len(query_results.articles) - inserted))
+
+    if query_results is None:
+        transport.close()
+        return 1
+
+    # batch mode has its own outputs, see run_batch()
+    if specs is None:
+
+        # there's no query (and no global results) for stored articles
+        with_globals = (options.txt_globals and not options.from_store)
+        if options.csv:
+            csv(query_results)
+        elif options.csv_header:
+            csv(query_results, header=True)
+        elif options.citation is not None:
+            with metrics.span('citations'):
+                citation_export(query_results)
+            # keep the fetched citation data
+            if store is not None:
+                store.add_articles(query_results.articles)
+        elif options.txt or options.txt_globals or options.debug:
+            txt(query_results, with_globals=with_globals)
+
+        # download the .pdf files
+        download_articles(query_results.articles, options.output_dir,
+            workers=options.download_workers, host_connections=options.host_connections, transport=transport, store=store, taxonomies=taxonomies, resolver=resolver, metrics=metrics)
+
+        # convert .pdf files to .txt files (requires pdfminer package)
+        convert_articles(options.output_dir, workers=options.convert_workers, force=options.force_convert, metrics=metrics)
+
+        if index is not None or tdm is not None:
+            with metrics.timer('index'), metrics.span('index'):
+                if index is not None:
+                    index.update(options.output_dir)
+                if tdm is not None:
+                    tdm.update(options.output_dir)
+                    tdm.save()
+
+    if options.cookie_file:
+        query_results.save_cookies()
+
+    transport.close()
+
+    if store is not None:
+        store.close()
+
+    if index is not None:
+        index.close()
+
+    print("leonardo.py::main() : [INFO] landing pages : %d resolved, %d cached, %d without .pdf link, %d failed"
+        % (resolver.stats['resolved'], resolver.stats['cached'], resolver.stats['unresolved'], resolver.stats['failed']))
+    if resolver_cache is not None:
+        resolver_cache.close()
+
+    if taxonomies is not None and options.ccs_top:
+        print_ccs_top(taxonomies, query_results.articles, options.ccs_top)
+
+    if taxonomies is not None:
+        print("leonardo.py::main() : [INFO] taxonomy cache : %d hits, %d misses, %d stores"
+            % (taxonomies.stats['hits'], taxonomies.stats['misses'], taxonomies.stats['stores']))
+        taxonomies.close()
+
+    if cache is not None:
+        print("leonardo.py::main() : [INFO] response cache : %d hits, %d misses (%d expired), %d stores, %d evictions, %d bytes" 
+            % (cache.stats['hits'], cache.stats['misses'], cache.stats['expired'], cache.stats['stores'], cache.stats['evictions'], cache.size))
+
+    metrics.report()
+    if options.metrics_json:
+        metrics.dump_json(options.metrics_json)
+    if options.metrics_prom:
+        metrics.dump_prometheus(options.metrics_prom)
+
+    return 0
+
 def main():
     usage = """leonardo.py [options] <query string>
 text mining on Google Scholar documents. uses scholar.py (https://github.com/ckreibich/scholar.py) 
@@ -268,7 +952,7 @@ Examples:
     # group.add_option('-C', '--cluster-id', metavar='CLUSTER_ID', default=None,
     #                  help='Do not search, just use articles in given cluster ID')
     group.add_option('-c', '--count', type='int', default=None,
-                     help='Maximum number of results')
+                     help='Maximum number of results. counts larger than a single results page are fetched page by page')
 
     # additional option (compared to scholar.py): determines the starting 
     # point for the list of results (default is 0)   
@@ -292,6 +976,96 @@ Examples:
     # additional option (compared to scholar.py): self explanatory 
     group.add_option('--output-dir', metavar='OUTPUT_DIR', default=None,
                      help='the output directory for downloaded articles')
+    group.add_option('--parser', metavar='PARSER', type='choice', choices=sorted(ScholarQuerier.PARSERS.keys()), default='bs',
+                     help='results page parser, "bs" (BeautifulSoup, default) or "lxml" (faster)')
+    parser.add_option_group(group)
+
+    group = optparse.OptionGroup(parser, 'Article store',
+                                 'These options keep query results in a sqlite database across runs.')
+    group.add_option('--store', metavar='FILE', default=None,
+                     help='add query results to the article store in FILE, and skip downloads of stored articles')
+    group.add_option('--from-store', action='store_true', default=False,
+                     help='do not query, use the articles in the store instead (filtered by --after, --before and --count)')
+    parser.add_option_group(group)
+
+    group = optparse.OptionGroup(parser, 'Batch mode',
+                                 'Runs many queries in a single process, sharing settings, cookies, connections and caches.')
+    group.add_option('--batch', metavar='FILE', default=None,
+                     help='run the queries in json-lines FILE, one object per line with keys %s and an optional "name". query options on the command line act as defaults' % (', '.join(BATCH_KEYS)))
+    parser.add_option_group(group)
+
+    group = optparse.OptionGroup(parser, 'Downloads',
+                                 'These options control how .pdf files are downloaded.')
+    group.add_option('--download-workers', metavar='N', type='int', default=4,
+                     help='maximum nr. of parallel downloads. default is 4.')
+    group.add_option('--host-connections', metavar='N', type='int', default=2,
+                     help='maximum nr. of parallel downloads from the same host. default is 2.')
+    parser.add_option_group(group)
+
+    group = optparse.OptionGroup(parser, 'Landing pages',
+                                 'Results which link to landing pages instead of .pdf files are resolved with per-publisher rules (see resolver.py).')
+    group.add_option('--resolve-workers', metavar='N', type='int', default=Resolver.WORKERS,
+                     help='nr. of landing pages resolved concurrently (default %d)' % (Resolver.WORKERS))
+    group.add_option('--resolve-cache', metavar='FILE', default=None,
+                     help='keep the .pdf urls found in landing pages in FILE, and reuse them in later runs')
+    group.add_option('--library-proxy', metavar='HOST=PROXY', action='append', default=[],
+                     help='fetch landing pages of HOST through library proxy host PROXY, e.g. dl.acm.org=dl.acm.org.proxy.library.cmu.edu (for the full text of ACM articles). can be given more than once.')
+    parser.add_option_group(group)
+
+    group = optparse.OptionGroup(parser, 'ACM taxonomies')
+    group.add_option('--acm-cache', metavar='FILE', default=None,
+                     help='keep the CCS taxonomies parsed from ACM article pages in FILE, and reuse them instead of scraping the pages again')
+    group.add_option('--refresh-acm', action='store_true', default=False,
+                     help='scrape ACM article pages again, and update the taxonomies in the --acm-cache file')
+    group.add_option('--ccs-top', metavar='NODE', default=None,
+                     help='list the subcategories of CCS node NODE ("0" for the root) with the most articles among the results (requires --acm-cache)')
+    parser.add_option_group(group)
+
+    group = optparse.OptionGroup(parser, 'Conversion',
+                                 'These options control the conversion of .pdf files to .txt files.')
+    group.add_option('--convert-workers', metavar='N', type='int', default=multiprocessing.cpu_count(),
+                     help='nr. of worker processes converting .pdf files. default is the nr. of cpus (%d).' % (multiprocessing.cpu_count()))
+    group.add_option('--force-convert', action='store_true', default=False,
+                     help='convert all .pdf files, even if they are up-to-date')
+    parser.add_option_group(group)
+
+    group = optparse.OptionGroup(parser, 'Indexing')
+    group.add_option('--index', metavar='FILE', default=None,
+                     help='add the .txt files to the inverted index in FILE, once converted (search it with index.py)')
+    group.add_option('--tfidf', metavar='FILE', default=None,
+                     help='add the .txt files to the term-document matrix in FILE, once converted (see tfidf.py, requires numpy and scipy)')
+    parser.add_option_group(group)
+
+    group = optparse.OptionGroup(parser, 'Network',
+                                 'These options control the pooled, keep-alive HTTP connections.')
+    group.add_option('--pool-connections', metavar='N', type='int', default=HTTPTransport.POOL_CONNECTIONS,
+                     help='nr. of hosts to keep connection pools for. default is %d.' % (HTTPTransport.POOL_CONNECTIONS))
+    group.add_option('--pool-size', metavar='N', type='int', default=HTTPTransport.POOL_MAXSIZE,
+                     help='max. nr. of keep-alive connections per host. default is %d.' % (HTTPTransport.POOL_MAXSIZE))
+    group.add_option('--timeout', metavar='SECONDS', type='float', default=HTTPTransport.TIMEOUT,
+                     help='timeout for HTTP requests, in seconds. default is %d.' % (HTTPTransport.TIMEOUT))
+    group.add_option('--cache-dir', metavar='DIR', default=None,
+                     help='cache HTTP responses (settings, result pages, citation exports, ACM pages) in DIR.')
+    group.add_option('--cache-size', metavar='MB', type='int', default=ResponseCache.MAX_SIZE // (1024 * 1024),
+                     help='maximum size of the response cache, in MB. default is %d.' % (ResponseCache.MAX_SIZE // (1024 * 1024)))
+    group.add_option('--cache-ttl', metavar='ENDPOINT=SECONDS', action='append', default=[],
+                     help='time-to-live of cached responses for ENDPOINT (one of %s). can be repeated.' 
+                        % (", ".join([e[0] for e in ResponseCache.ENDPOINTS])))
+    group.add_option('--rate', metavar='HOST=REQUESTS/SECOND', action='append', default=[],
+                     help='sustained request rate for HOST (default for scholar.google.com is %s/s, %s/s for other hosts). can be repeated.'
+                        % (RateLimiter.RATES['scholar.google.com'][0], RateLimiter.DEFAULT_RATE[0]))
+    group.add_option('--cooldown', metavar='SECONDS', type='float', default=RateLimiter.COOLDOWN,
+                     help='pause requests to a host for this long after hitting a captcha. default is %d.' % (RateLimiter.COOLDOWN))
+    group.add_option('--no-rate-limit', action='store_true', default=False,
+                     help='do not pace requests')
+    parser.add_option_group(group)
+
+    group = optparse.OptionGroup(parser, 'Metrics',
+                                 'Operations, bytes and latencies per stage (query, settings, parse, citations, acm, resolve, download, convert, index) and per host, dumped at the end of the run.')
+    group.add_option('--metrics-json', metavar='FILE', default=None,
+                     help='write the metrics to FILE, as json')
+    group.add_option('--metrics-prom', metavar='FILE', default=None,
+                     help='write the metrics to FILE, in the prometheus text format (e.g. for the node_exporter textfile collector)')
     parser.add_option_group(group)
 
     group = optparse.OptionGroup(parser, 'Miscellaneous')
@@ -301,10 +1075,27 @@ Examples:
                      help='Enable verbose logging to stderr. Repeated options increase detail of debug output.')
     group.add_option('-v', '--version', action='store_true', default=False,
                      help='Show version information')
+    group.add_option('--profile', action='store_true', default=False,
+                     help='profile the query, download, ACM and conversion stages (cProfile, and peak rss growth), with reports in the profile/ sub-directory of the output dir. implies --convert-workers 1.')
     parser.add_option_group(group)
 
     options, _ = parser.parse_args()
 
+    specs = None
+    if options.batch:
+        if options.from_store:
+            sys.stderr.write("""leonardo.py : [ERROR] --batch and --from-store can't be combined\n""")
+            return 1
+        try:
+            specs = load_batch(options.batch)
+        except (IOError, ValueError) as e:
+            sys.stderr.write("leonardo.py : [ERROR] %s\n" % (e))
+            return 1
+
+    if options.from_store and not options.store:
+        sys.stderr.write("""leonardo.py : [ERROR] --from-store requires --store\n""")
+        return 1
+
     # Show help if we have neither keyword search nor author name
     if len(sys.argv) == 1:
         parser.print_help()
@@ -336,26 +1127,20 @@ Examples:
     #         print('Cluster ID queries do not allow additional search arguments.')
     #         return 1
 
-    # make the query, get the query results
-    query_results = get_articles(options)
-    if options.debug:
-        txt(query_results, with_globals=options.txt_globals)
-
-    # download the .pdf files
-    download_articles(query_results.articles, options.output_dir)
-
-    # convert .pdf files to .txt files (requires pdfminer package)
-    for pdf_filename in os.listdir(options.output_dir):
-
-        if not pdf_filename.endswith(".pdf"):
-            continue
+    metrics = Metrics()
 
-        text = convert_pdf_to_txt(os.path.join(options.output_dir, pdf_filename))
+    if options.profile:
+        # worker processes wouldn't report back
+        if options.convert_workers > 1:
+            print("leonardo.py::main() : [INFO] --profile : converting .pdf files in a single process")
+            options.convert_workers = 1
+        start_profiling(options.output_dir)
 
-    if options.cookie_file:
-        querier.save_cookies()
-
-    return 0
+    try:
+        return run(options, specs, metrics)
+    finally:
+        # also on errors, which are what profiles are often wanted for
+        stop_profiling()
 
 if __name__ == "__main__":
     sys.exit(main())
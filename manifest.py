@@ -0,0 +1,107 @@
+# manifest of .pdf to .txt conversions in an output directory. for each
+# .pdf file, it records the size, mtime and sha1 digest of the source, the
+# extractor settings used, the size of the resulting .txt file and the
+# outcome of the conversion. this lets us convert only the files which
+# actually changed (or failed before), instead of relying on whether a
+# .txt file happens to exist.
+
+import os
+import time
+import json
+import hashlib
+
+def file_digest(path, block_size=(1024 * 1024)):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        block = f.read(block_size)
+        while block:
+            digest.update(block)
+            block = f.read(block_size)
+
+    return digest.hexdigest()
+
+def settings_digest(settings):
+    # settings is a dict of extractor settings, which must be json
+    # serializable
+    return hashlib.sha1(json.dumps(settings, sort_keys=True).encode('utf-8')).hexdigest()
+
+class ConversionManifest(object):
+
+    FILENAME = '.leonardo_manifest.json'
+
+    # EMPTY is an OK conversion without any text (e.g. a scanned .pdf file):
+    # converting it again wouldn't get us any text either
+    (OK, EMPTY, FAILED) = ('ok', 'empty', 'failed')
+
+    def __init__(self, output_dir, settings):
+
+        self.output_dir = output_dir
+        self.settings = settings_digest(settings)
+        self.path = os.path.join(output_dir, ConversionManifest.FILENAME)
+
+        self.entries = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r') as manifest_file:
+                    self.entries = json.load(manifest_file)
+            except ValueError:
+                print("manifest.py::ConversionManifest() : [ERROR] corrupt manifest %s, starting from scratch" % (self.path))
+
+    def needs_conversion(self, pdf_path):
+
+        entry = self.entries.get(os.path.basename(pdf_path))
+
+        # never converted, converted with different settings, or failed
+        if entry is None or entry['settings'] != self.settings or entry['status'] not in (ConversionManifest.OK, ConversionManifest.EMPTY):
+            return True
+
+        # the .txt file is gone, or not the one we wrote
+        txt_path = pdf_path.replace(".pdf", ".txt")
+        if not os.path.exists(txt_path) or os.path.getsize(txt_path) != entry['txt_size']:
+            return True
+
+        stat = os.stat(pdf_path)
+        if stat.st_size == entry['size'] and stat.st_mtime == entry['mtime']:
+            return False
+
+        # the .pdf file was touched: only redo the conversion if its
+        # contents changed
+        if stat.st_size == entry['size'] and file_digest(pdf_path) == entry['sha1']:
+            entry['mtime'] = stat.st_mtime
+            return False
+
+        return True
+
+    def record(self, pdf_path, status, error=None):
+        # returns the recorded status, which is EMPTY instead of OK if the
+        # .txt file is empty
+
+        txt_path = pdf_path.replace(".pdf", ".txt")
+        txt_size = os.path.getsize(txt_path) if os.path.exists(txt_path) else 0
+        stat = os.stat(pdf_path)
+
+        if status == ConversionManifest.OK and txt_size == 0:
+            status = ConversionManifest.EMPTY
+
+        self.entries[os.path.basename(pdf_path)] = {
+            'size': stat.st_size,
+            'mtime': stat.st_mtime,
+            'sha1': file_digest(pdf_path),
+            'settings': self.settings,
+            'status': status,
+            'error': error,
+            'txt_size': txt_size,
+            'converted': time.time() }
+
+        return status
+
+    def prune(self):
+        # forget about .pdf files which no longer exist
+        for filename in list(self.entries.keys()):
+            if not os.path.exists(os.path.join(self.output_dir, filename)):
+                del self.entries[filename]
+
+    def save(self):
+        with open(self.path + '.tmp', 'w') as manifest_file:
+            json.dump(self.entries, manifest_file, indent=1, sort_keys=True)
+        os.rename(self.path + '.tmp', self.path)
@@ -0,0 +1,237 @@
+# instrumentation of leonardo.py runs. every stage of a run (query, settings,
+# parse, citations, acm, resolve, download, convert, index) records its
+# operations per host: nr. of operations and errors, bytes, and a histogram
+# of latencies. stages also record their wall-clock time, which is less than
+# the sum of their latencies when operations run concurrently (e.g.
+# downloads). the wall-clock time of the query stage includes the parsing of
+# results pages, which are parsed as they come in, and (but in batch mode,
+# which applies them once for all queries) applying the settings.
+#
+# at the end of a run, everything is dumped as json and/or as a prometheus
+# text file (e.g. for the textfile collector of node_exporter).
+#
+# the querier's requests are recorded by InstrumentedQuerier, in leonardo.py
+# (this module doesn't depend on scholar.py).
+
+import os
+import json
+import time
+import threading
+
+try:
+    # python 3
+    from urllib.parse import urlparse
+except ImportError:
+    # python 2
+    from urlparse import urlparse
+
+def url_host(url):
+    return urlparse(url).netloc.lower()
+
+class _Series(object):
+    # operations of a stage on a host
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.bytes = 0
+        self.seconds = 0.0
+        self.max = 0.0
+        # per bucket (not cumulative), the last one is +Inf
+        self.buckets = [0] * (len(Metrics.BUCKETS) + 1)
+
+    def add(self, seconds, nbytes, error):
+        self.count += 1
+        self.errors += 1 if error else 0
+        self.bytes += nbytes
+        self.seconds += seconds
+        self.max = max(self.max, seconds)
+
+        for i, bound in enumerate(Metrics.BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+                break
+        else:
+            self.buckets[-1] += 1
+
+    def merge(self, other):
+        self.count += other.count
+        self.errors += other.errors
+        self.bytes += other.bytes
+        self.seconds += other.seconds
+        self.max = max(self.max, other.max)
+        self.buckets = [a + b for a, b in zip(self.buckets, other.buckets)]
+
+    def cumulative_buckets(self):
+        # [(upper bound, nr. of operations at most that long)], as in
+        # prometheus histograms
+        totals, total = [], 0
+        for bound, count in zip(list(Metrics.BUCKETS) + ['+Inf'], self.buckets):
+            total += count
+            totals.append((bound, total))
+        return totals
+
+    def as_dict(self):
+        return {'count': self.count, 'errors': self.errors, 'bytes': self.bytes,
+            'seconds': self.seconds, 'max_seconds': self.max,
+            'mean_seconds': (self.seconds / self.count) if self.count else 0.0,
+            'buckets': [[str(bound), count] for bound, count in self.cumulative_buckets()]}
+
+class _Timer(object):
+    # times an operation, see Metrics.timer(). set nbytes before the end of
+    # the with block to record the size of the operation. an exception
+    # counts as an error.
+
+    def __init__(self, metrics, stage, host):
+        self.metrics = metrics
+        self.stage = stage
+        self.host = host
+        self.nbytes = 0
+        self.error = False
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.metrics.record(self.stage, self.host, time.time() - self.start, self.nbytes,
+            error=(self.error or exc_type is not None))
+        return False
+
+class _Span(object):
+    # wall-clock time of a stage, see Metrics.span()
+
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.metrics.add_wall_time(self.stage, time.time() - self.start)
+        return False
+
+class Metrics(object):
+
+    # upper bounds of the latency histogram buckets, in seconds
+    BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+    # prefix of the names of prometheus metrics
+    PREFIX = 'leonardo'
+
+    def __init__(self):
+        self.started = time.time()
+        # (stage, host) -> _Series
+        self.__series = {}
+        # stage -> wall-clock seconds
+        self.__wall = {}
+        self.__lock = threading.Lock()
+
+    def record(self, stage, host=None, seconds=0.0, nbytes=0, error=False):
+        with self.__lock:
+            key = (stage, host or '')
+            if key not in self.__series:
+                self.__series[key] = _Series()
+            self.__series[key].add(seconds, nbytes or 0, error)
+
+    def timer(self, stage, host=None):
+        # with metrics.timer('acm', host) as timer: ...
+        return _Timer(self, stage, host)
+
+    def span(self, stage):
+        # with metrics.span('download'): ...
+        return _Span(self, stage)
+
+    def add_wall_time(self, stage, seconds):
+        with self.__lock:
+            self.__wall[stage] = self.__wall.get(stage, 0.0) + seconds
+
+    def stages(self):
+        # {stage : {host : _Series}}
+        with self.__lock:
+            stages = {}
+            for (stage, host), series in self.__series.items():
+                stages.setdefault(stage, {})[host] = series
+            for stage in self.__wall:
+                stages.setdefault(stage, {})
+            return stages
+
+    def as_dict(self):
+        stages = {}
+        for stage, hosts in self.stages().items():
+            total = _Series()
+            for series in hosts.values():
+                total.merge(series)
+
+            stages[stage] = total.as_dict()
+            stages[stage]['wall_seconds'] = self.__wall.get(stage)
+            stages[stage]['hosts'] = dict([(host, series.as_dict()) for host, series in hosts.items()])
+
+        return {'started': self.started, 'elapsed': time.time() - self.started, 'stages': stages}
+
+    def dump_json(self, path):
+        self.__write(path, json.dumps(self.as_dict(), indent=1, sort_keys=True))
+
+    def dump_prometheus(self, path):
+        self.__write(path, self.prometheus())
+
+    def prometheus(self):
+        # the prometheus text exposition format
+        prefix = Metrics.PREFIX
+        stages = self.stages()
+        series = sorted([(stage, host, s) for stage, hosts in stages.items() for host, s in hosts.items()])
+
+        lines = []
+        for name, kind, help_text, attr in [
+                ('stage_operations_total', 'counter', 'Operations per stage and host.', 'count'),
+                ('stage_errors_total', 'counter', 'Failed operations per stage and host.', 'errors'),
+                ('stage_bytes_total', 'counter', 'Bytes fetched or processed per stage and host.', 'bytes')]:
+            lines.append("# HELP %s_%s %s" % (prefix, name, help_text))
+            lines.append("# TYPE %s_%s %s" % (prefix, name, kind))
+            for stage, host, s in series:
+                lines.append("%s_%s{%s} %d" % (prefix, name, _labels(stage=stage, host=host), getattr(s, attr)))
+
+        lines.append("# HELP %s_stage_seconds Latency of operations per stage and host." % (prefix))
+        lines.append("# TYPE %s_stage_seconds histogram" % (prefix))
+        for stage, host, s in series:
+            for bound, count in s.cumulative_buckets():
+                lines.append("%s_stage_seconds_bucket{%s} %d" % (prefix, _labels(stage=stage, host=host, le=bound), count))
+            lines.append("%s_stage_seconds_sum{%s} %s" % (prefix, _labels(stage=stage, host=host), repr(s.seconds)))
+            lines.append("%s_stage_seconds_count{%s} %d" % (prefix, _labels(stage=stage, host=host), s.count))
+
+        lines.append("# HELP %s_stage_wall_seconds Wall-clock time per stage." % (prefix))
+        lines.append("# TYPE %s_stage_wall_seconds gauge" % (prefix))
+        for stage in sorted(self.__wall):
+            lines.append("%s_stage_wall_seconds{%s} %s" % (prefix, _labels(stage=stage), repr(self.__wall[stage])))
+
+        lines.append("# HELP %s_run_seconds Duration of the run." % (prefix))
+        lines.append("# TYPE %s_run_seconds gauge" % (prefix))
+        lines.append("%s_run_seconds %s" % (prefix, repr(time.time() - self.started)))
+        lines.append("# HELP %s_run_start_timestamp_seconds Start of the run, in seconds since the epoch." % (prefix))
+        lines.append("# TYPE %s_run_start_timestamp_seconds gauge" % (prefix))
+        lines.append("%s_run_start_timestamp_seconds %s" % (prefix, repr(self.started)))
+
+        return '\n'.join(lines) + '\n'
+
+    def report(self):
+        # one line per stage, slowest first
+        stages = self.as_dict()['stages']
+        for stage in sorted(stages, key=lambda stage: -(stages[stage]['wall_seconds'] or stages[stage]['seconds'])):
+            s = stages[stage]
+            wall = ("%.2f sec" % (s['wall_seconds'])) if s['wall_seconds'] is not None else "-"
+            print("metrics.py::Metrics.report() : [INFO] %-10s %5d ops (%d errors), %10d bytes, %8.2f sec total, %6.3f sec mean, %6.3f sec max, %s wall"
+                % (stage, s['count'], s['errors'], s['bytes'], s['seconds'], s['mean_seconds'], s['max_seconds'], wall))
+
+    def __write(self, path, text):
+        # readers (e.g. a metrics collector) never see a half-written file
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as out:
+            out.write(text)
+        os.rename(tmp_path, path)
+
+def _labels(**labels):
+    # prometheus label set, with escaped values
+    return ','.join(['%s="%s"' % (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in sorted(labels.items())])
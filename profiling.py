@@ -0,0 +1,154 @@
+# per-stage profiling of leonardo.py runs (see --profile). the functions of
+# the pipeline stages are decorated with @profiled(stage): while profiling
+# is on, their calls run under a cProfile profiler of their own. calls add
+# up over the run, e.g. the convert_pdf_to_txt report covers all the .pdf
+# files converted.
+#
+# memory is measured as the growth of the peak resident set size of the
+# process (ru_maxrss) during the calls of a stage: that's what a stage costs
+# on top of what the run needed before it, whichever python it runs on.
+# memory that gets freed and reused doesn't show up, and the calls of a
+# stage only grow the peak until they need less than an earlier stage did.
+#
+# a stage called from within another one (e.g. parse_acm_article, within
+# download_articles) shows up in its own profile, not in the outer one's
+# (its memory growth does count for both, though).
+# only the thread (and process) which started profiling is profiled: time
+# spent in worker threads, such as downloads, shows up as waits for them.
+#
+# for every stage, save() writes <stage>.pstats (see the pstats module) and
+# a readable <stage>.txt report, with the top functions and the memory
+# growth, to the 'profile' sub-directory of the output dir.
+
+import os
+import sys
+import time
+import pstats
+import cProfile
+import functools
+import threading
+
+try:
+    # unix only
+    import resource
+except ImportError:
+    resource = None
+
+def max_rss():
+    # peak resident set size of the process so far, in bytes (0 if unknown)
+    if resource is None:
+        return 0
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes, except on mac os
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+class _Stage(object):
+
+    def __init__(self, name):
+        self.name = name
+        self.profile = cProfile.Profile()
+        self.calls = 0
+        self.seconds = 0.0
+        # growth of the peak rss during the calls, and the peak rss after
+        # the last one, in bytes
+        self.rss_growth = 0
+        self.max_rss = 0
+
+class StageProfiler(object):
+
+    # nr. of functions listed in reports
+    TOP_FUNCTIONS = 40
+
+    def __init__(self, output_dir):
+        self.output_dir = os.path.join(output_dir, 'profile')
+        self.stages = {}
+
+        # stages being run, innermost last
+        self.__stack = []
+        self.__thread = threading.current_thread()
+        self.__pid = os.getpid()
+
+    def run(self, name, func, args, kwargs):
+        # calls func(*args, **kwargs) as part of stage name
+        if threading.current_thread() is not self.__thread or os.getpid() != self.__pid \
+                or name in [s.name for s in self.__stack]:
+            return func(*args, **kwargs)
+
+        if name not in self.stages:
+            self.stages[name] = _Stage(name)
+        stage = self.stages[name]
+
+        # the outer stage (if any) pauses until we're done
+        if self.__stack:
+            self.__stack[-1].profile.disable()
+        self.__stack.append(stage)
+
+        start, start_rss = time.time(), max_rss()
+        stage.profile.enable()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            stage.profile.disable()
+            stage.calls += 1
+            stage.seconds += time.time() - start
+            stage.max_rss = max_rss()
+            stage.rss_growth += stage.max_rss - start_rss
+
+            self.__stack.pop()
+            if self.__stack:
+                self.__stack[-1].profile.enable()
+
+    def save(self):
+        if not os.path.isdir(self.output_dir):
+            os.makedirs(self.output_dir)
+
+        for name in sorted(self.stages):
+            stage = self.stages[name]
+
+            pstats_path = os.path.join(self.output_dir, name + '.pstats')
+            stage.profile.dump_stats(pstats_path)
+
+            report_path = os.path.join(self.output_dir, name + '.txt')
+            with open(report_path, 'w') as report:
+                report.write("%s : %d calls, %.2f sec\n\n" % (name, stage.calls, stage.seconds))
+
+                stats = pstats.Stats(pstats_path, stream=report)
+                stats.sort_stats('cumulative').print_stats(StageProfiler.TOP_FUNCTIONS)
+
+                if resource is not None:
+                    report.write("peak rss growth : %d bytes, peak rss after the last call : %d bytes\n"
+                        % (stage.rss_growth, stage.max_rss))
+                else:
+                    report.write("no memory usage (requires the resource module)\n")
+
+            print("profiling.py::StageProfiler.save() : [INFO] %s : %d calls, %.2f sec, %d KB rss growth -> %s"
+                % (name, stage.calls, stage.seconds, stage.rss_growth / 1024, report_path))
+
+# the active StageProfiler, if any
+PROFILER = None
+
+def start_profiling(output_dir):
+    global PROFILER
+    PROFILER = StageProfiler(output_dir)
+    if resource is None:
+        print("profiling.py::start_profiling() : [INFO] resource module not available, profiling cpu time only")
+    return PROFILER
+
+def stop_profiling():
+    # saves the reports of the active profiler, if any
+    global PROFILER
+    profiler, PROFILER = PROFILER, None
+    if profiler is not None:
+        profiler.save()
+
+def profiled(stage):
+    # decorator, which makes calls to a function part of stage while
+    # profiling is on
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if PROFILER is None:
+                return func(*args, **kwargs)
+            return PROFILER.run(stage, func, args, kwargs)
+        return wrapper
+    return decorator
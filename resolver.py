@@ -0,0 +1,315 @@
+# resolution of article landing pages (publisher pages, preprint servers,
+# etc.) to the urls of their .pdf files, by way of a registry of per-publisher
+# rules. a rule may derive the .pdf url from the landing page url alone
+# (e.g. arxiv.org/abs/... -> arxiv.org/pdf/...), or point at a page to fetch
+# (e.g. through a library proxy) and extract the .pdf url from it. pages
+# which no specific rule resolves go through the generic rules: the
+# citation_pdf_url meta tag most publishers set for google scholar, and
+# links to .pdf files.
+#
+# landing pages are resolved concurrently, and results (including misses)
+# are kept in a persistent cache, so that later runs skip the pages they
+# already went through.
+#
+# every Resolver has rules of its own: pass a list to add or replace rules,
+# e.g. Resolver(transport, rules=[MyRule()] + default_rules()). library
+# proxies (e.g. {'dl.acm.org': 'dl.acm.org.proxy.library.cmu.edu'}) are
+# only used when given.
+
+import re
+import sys
+import time
+import sqlite3
+import threading
+
+try:
+    # python 3
+    from urllib.parse import urlparse, urljoin
+except ImportError:
+    # python 2
+    from urlparse import urlparse, urljoin
+
+from lxml import html
+
+class Rule(object):
+    # base class of extraction rules. a rule applies to the urls of the
+    # given hosts (and their subdomains), or to any url if hosts is empty.
+
+    name = 'rule'
+    hosts = []
+
+    def matches(self, url):
+        if not self.hosts:
+            return True
+        host = urlparse(url).netloc.lower()
+        return any([host == h or host.endswith('.' + h) for h in self.hosts])
+
+    def rewrite(self, url):
+        # the .pdf url, if it can be derived from url alone
+        return None
+
+    def page_url(self, url):
+        # the page to fetch for extract()
+        return url
+
+    def extract(self, url, doc):
+        # the .pdf url in the page at url, parsed into an lxml document
+        return None
+
+def _first(doc, xpath, url):
+    # first result of xpath, as an absolute url
+    values = doc.xpath(xpath)
+    if not values:
+        return None
+    return urljoin(url, values[0].strip())
+
+class ArxivRule(Rule):
+
+    name = 'arxiv'
+    hosts = ['arxiv.org']
+
+    ABS_RE = re.compile(r'/abs/(.+?)/?$')
+
+    def rewrite(self, url):
+        parsed = urlparse(url)
+        match = ArxivRule.ABS_RE.search(parsed.path)
+        if match is None:
+            return None
+        return "%s://%s/pdf/%s" % (parsed.scheme or 'http', parsed.netloc, match.group(1))
+
+class AcmRule(Rule):
+
+    name = 'acm'
+    hosts = ['dl.acm.org']
+
+    def __init__(self, proxy=None):
+        # proxy maps hosts to the library proxy hosts to go through (for
+        # the full text)
+        self.proxy = dict(proxy or {})
+
+    def page_url(self, url):
+        host = urlparse(url).netloc.lower()
+        if host in self.proxy:
+            url = url.replace(host, self.proxy[host], 1)
+        return url
+
+    def extract(self, url, doc):
+        return _first(doc, "//a[@name='FullTextPDF']/@href | //a[contains(@href, 'ft_gateway.cfm')]/@href", url)
+
+class IeeeRule(Rule):
+
+    name = 'ieee'
+    hosts = ['ieeexplore.ieee.org']
+
+    ARNUMBER_RE = re.compile(r'(?:/document/|arnumber=)(\d+)')
+
+    def page_url(self, url):
+        # the 'stamp' page frames the .pdf file
+        match = IeeeRule.ARNUMBER_RE.search(url)
+        if match is None:
+            return url
+        return "http://ieeexplore.ieee.org/stamp/stamp.jsp?tp=&arnumber=%s" % (match.group(1))
+
+    def extract(self, url, doc):
+        return _first(doc, "//iframe[contains(@src, '.pdf') or contains(@src, 'getPDF')]/@src", url)
+
+class SpringerRule(Rule):
+
+    name = 'springer'
+    hosts = ['link.springer.com']
+
+    DOI_RE = re.compile(r'/(?:article|chapter)/(10\.[^?#]+)')
+
+    def rewrite(self, url):
+        parsed = urlparse(url)
+        match = SpringerRule.DOI_RE.search(parsed.path)
+        if match is None:
+            return None
+        return "%s://%s/content/pdf/%s.pdf" % (parsed.scheme or 'http', parsed.netloc, match.group(1))
+
+class CitationMetaRule(Rule):
+
+    name = 'citation_pdf_url'
+
+    def extract(self, url, doc):
+        return _first(doc, "//meta[@name='citation_pdf_url']/@content", url)
+
+class PdfLinkRule(Rule):
+
+    name = 'pdf_link'
+
+    PDF_RE = re.compile(r'\.pdf(?:[?#]|$)', re.IGNORECASE)
+
+    def extract(self, url, doc):
+        for href in doc.xpath("//a/@href"):
+            if PdfLinkRule.PDF_RE.search(href.strip()):
+                return urljoin(url, href.strip())
+        return None
+
+# publisher rules are tried in order on the urls they match. the generic
+# ones are tried last, on the page fetched for the publisher rule (if any).
+def default_rules(proxy=None):
+    # proxy maps hosts to library proxy hosts, see AcmRule
+    return [ArxivRule(), AcmRule(proxy), IeeeRule(), SpringerRule()]
+
+GENERIC_RULES = (CitationMetaRule(), PdfLinkRule())
+
+class ResolverCache(object):
+    # landing page url -> .pdf url. misses (pages without a .pdf link) are
+    # cached too, but only for MISS_TTL seconds.
+
+    MISS_TTL = 7 * 24 * 60 * 60
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS resolved (
+            url         TEXT PRIMARY KEY,
+            pdf_url     TEXT,
+            rule        TEXT,
+            resolved    REAL
+        );
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript(ResolverCache.SCHEMA)
+        self.__lock = threading.Lock()
+
+    def get(self, url):
+        # (found, pdf url). found is False if url isn't cached (or its
+        # cached miss expired).
+        with self.__lock:
+            row = self.db.execute("SELECT pdf_url, resolved FROM resolved WHERE url = ?", (url,)).fetchone()
+
+        if row is None or (row[0] is None and time.time() - row[1] > ResolverCache.MISS_TTL):
+            return False, None
+        return True, row[0]
+
+    def put(self, url, pdf_url, rule=None):
+        with self.__lock:
+            with self.db:
+                self.db.execute("INSERT OR REPLACE INTO resolved (url, pdf_url, rule, resolved) VALUES (?, ?, ?, ?)",
+                    (url, pdf_url, rule, time.time()))
+
+    def close(self):
+        self.db.close()
+
+class Resolver(object):
+
+    WORKERS = 4
+
+    def __init__(self, transport, cache=None, workers=None, rules=None, generic_rules=None, proxy=None, metrics=None):
+        # proxy (library proxies, see AcmRule) only applies to the default
+        # rules, rules passed in are used as they are
+        self.transport = transport
+        self.cache = cache
+        # optional Metrics instance (see metrics.py)
+        self.metrics = metrics
+        self.workers = max(1, workers or Resolver.WORKERS)
+        self.rules = default_rules(proxy) if rules is None else list(rules)
+        self.generic_rules = list(GENERIC_RULES if generic_rules is None else generic_rules)
+
+        self.stats = {'cached': 0, 'resolved': 0, 'unresolved': 0, 'failed': 0}
+        self.__lock = threading.Lock()
+
+    def page_url(self, url):
+        # the page resolve() fetches for the landing page at url (e.g.
+        # through a library proxy)
+        rule = self.__rule(url)
+        return url if rule is None else rule.page_url(url)
+
+    def resolve(self, url, pages=None):
+        # the .pdf url of the landing page at url, or None. pages holds
+        # pages fetched already, keyed by page_url().
+
+        # with and without a library proxy, results differ
+        key = self.page_url(url)
+        if self.cache is not None:
+            found, pdf_url = self.cache.get(key)
+            if found:
+                self.__count('cached')
+                return pdf_url
+
+        start = time.time()
+        try:
+            pdf_url, rule = self.__resolve(url, pages or {})
+        except:
+            # e.g. a timeout, or a 403 from a paywall: don't cache, it may
+            # work next time
+            self.__count('failed')
+            if self.metrics is not None:
+                self.metrics.record('resolve', urlparse(url).netloc.lower(), time.time() - start, error=True)
+            print("resolver.py::Resolver.resolve() : [ERROR] %s : %s" % (url, sys.exc_info()[1]))
+            return None
+
+        self.__count('resolved' if pdf_url else 'unresolved')
+        if self.metrics is not None:
+            self.metrics.record('resolve', urlparse(url).netloc.lower(), time.time() - start)
+        print("resolver.py::Resolver.resolve() : [INFO] %s -> %s (%s)" % (url, pdf_url, rule))
+
+        if self.cache is not None:
+            self.cache.put(key, pdf_url, rule)
+
+        return pdf_url
+
+    def resolve_all(self, urls, pages=None):
+        # resolves urls concurrently, returns {url : .pdf url or None}. see
+        # resolve() for pages.
+        queue = list(set(urls))
+        results = {}
+        lock = threading.Lock()
+
+        def work():
+            while True:
+                with lock:
+                    if len(queue) == 0:
+                        return
+                    url = queue.pop()
+                pdf_url = self.resolve(url, pages)
+                with lock:
+                    results[url] = pdf_url
+
+        threads = [threading.Thread(target=work) for _ in range(min(self.workers, len(queue)))]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        return results
+
+    def __rule(self, url):
+        # the first publisher rule matching url, if any
+        for rule in self.rules:
+            if rule.matches(url):
+                return rule
+        return None
+
+    def __resolve(self, url, pages):
+        # returns (.pdf url, name of the rule which found it)
+        rule = self.__rule(url)
+        page_url = url
+        if rule is not None:
+            pdf_url = rule.rewrite(url)
+            if pdf_url is not None:
+                return pdf_url, rule.name
+            page_url = rule.page_url(url)
+
+        if page_url in pages:
+            page = pages[page_url]
+        else:
+            response = self.transport.open(page_url)
+            page_url = response.geturl()
+            page = response.read()
+        doc = html.fromstring(page)
+
+        for r in ([rule] if rule is not None else []) + self.generic_rules:
+            pdf_url = r.extract(page_url, doc)
+            if pdf_url is not None:
+                return pdf_url, r.name
+
+        return None, None
+
+    def __count(self, key):
+        with self.__lock:
+            self.stats[key] += 1
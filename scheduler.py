@@ -0,0 +1,178 @@
+# rate limiting of http requests, per host. each host gets a token bucket
+# (a sustained request rate plus a burst allowance), and requests wait for
+# a token before going out. on top of that:
+#
+#   - throttling responses (429, 503) put the host in exponential backoff,
+#     honoring any Retry-After header
+#   - captcha / 'unusual traffic' pages put the host in a longer cool-down
+#     state, during which all requests to it wait, instead of burning more
+#     requests (and getting the block extended). only google hosts are
+#     checked for those: publisher pages often come with a recaptcha widget
+#     (e.g. on login forms) which doesn't mean we're blocked.
+#
+# all waits include random jitter, so that concurrent requesters don't go
+# out in lock step.
+
+import re
+import time
+import random
+import threading
+
+try:
+    # python 3
+    from urllib.parse import urlparse
+except ImportError:
+    # python 2
+    from urlparse import urlparse
+
+class RateLimitError(Exception):
+    pass
+
+class HostBudget(object):
+
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.time()
+        self.failures = 0
+        self.backoff_until = 0.0
+        self.cooldown_until = 0.0
+
+    def refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+class RateLimiter(object):
+
+    (OK, THROTTLED, BLOCKED) = ('ok', 'throttled', 'blocked')
+
+    # (requests per second, burst) per host. google scholar is the one
+    # that blocks us, so it gets a conservative budget.
+    RATES = {
+        'scholar.google.com': (0.2, 2),
+        'dl.acm.org': (1.0, 2),
+    }
+    DEFAULT_RATE = (5.0, 5)
+
+    # backoff after throttling responses: BACKOFF * 2^(failures - 1), in
+    # seconds, capped at MAX_BACKOFF
+    BACKOFF = 5.0
+    MAX_BACKOFF = 300.0
+    # pause after hitting a captcha, in seconds
+    COOLDOWN = 30 * 60.0
+    # max. random jitter added to waits, in seconds
+    JITTER = 1.0
+
+    # hosts whose captcha pages mean we're blocked: scholar itself, the
+    # hosts serving its cached copies, and those of the 'sorry' pages
+    GOOGLE_HOST = re.compile(r'^(?:scholar|ipv4|ipv6|www)\.google\.[a-z.]+$|\.googleusercontent\.com$')
+
+    # tell-tale signs of google's 'unusual traffic' / captcha pages
+    BLOCKED_URL = re.compile(r'/sorry/|captcha', re.IGNORECASE)
+    BLOCKED_BODY = re.compile(br'detected unusual traffic|id="gs_captcha|class="g-recaptcha', re.IGNORECASE)
+
+    def __init__(self, rates=None, jitter=None, cooldown=None):
+
+        self.rates = dict(RateLimiter.RATES)
+        self.rates.update(rates or {})
+        self.jitter = RateLimiter.JITTER if jitter is None else jitter
+        self.cooldown = RateLimiter.COOLDOWN if cooldown is None else cooldown
+
+        self.__budgets = {}
+        self.__lock = threading.Lock()
+
+    def acquire(self, host):
+        # blocks until a request to host may go out
+        wait = self.reserve(host)
+        while wait > 0.0:
+            time.sleep(wait)
+            wait = self.reserve(host)
+
+    def reserve(self, host):
+        # non-blocking version of acquire(): takes a token and returns 0 if a
+        # request to host may go out now, otherwise returns how long to 
+        # wait (jitter included) before trying again
+        with self.__lock:
+            budget = self.__budget(host)
+            now = time.time()
+
+            if now < budget.cooldown_until:
+                wait = budget.cooldown_until - now
+            elif now < budget.backoff_until:
+                wait = budget.backoff_until - now
+            else:
+                budget.refill(now)
+                if budget.tokens >= 1.0:
+                    budget.tokens -= 1.0
+                    return 0.0
+                wait = (1.0 - budget.tokens) / budget.rate
+
+        if wait > 60.0:
+            print("scheduler.py::RateLimiter.reserve() : [INFO] %s paused for %d sec" % (host, wait))
+
+        return wait + random.uniform(0, self.jitter)
+
+    def report(self, host, response, inspect_body=True):
+        # updates the budget of host according to a requests.Response, and
+        # tells whether it was fine, throttled or blocked
+        verdict = self.check(response, inspect_body, host)
+
+        with self.__lock:
+            budget = self.__budget(host)
+            now = time.time()
+
+            if verdict == RateLimiter.OK:
+                budget.failures = 0
+                return verdict
+
+            budget.failures += 1
+
+            if verdict == RateLimiter.BLOCKED:
+                budget.cooldown_until = now + self.cooldown
+                print("scheduler.py::RateLimiter.report() : [ERROR] blocked by %s, cooling down for %d sec" % (host, self.cooldown))
+            else:
+                delay = min(RateLimiter.MAX_BACKOFF, RateLimiter.BACKOFF * (2 ** (budget.failures - 1)))
+                retry_after = response.headers.get('Retry-After', '')
+                if retry_after.isdigit():
+                    delay = max(delay, float(retry_after))
+                budget.backoff_until = now + delay
+                print("scheduler.py::RateLimiter.report() : [INFO] throttled by %s (%d), backing off for %d sec" % (host, response.status_code, delay))
+
+        return verdict
+
+    @staticmethod
+    def check(response, inspect_body=True, host=None):
+        # host is the one the request went to, response.url may be where it
+        # got redirected to. needs no limiter, e.g. for HTTPTransport.open()
+        # without one.
+
+        url = urlparse(response.url)
+        if RateLimiter.is_google(url.netloc) or (host is not None and RateLimiter.is_google(host)):
+
+            # google redirects blocked requests to a captcha page, which may
+            # come with a 429 or 503, so check for those first
+            if RateLimiter.BLOCKED_URL.search(url.path):
+                return RateLimiter.BLOCKED
+
+            # only look at html bodies (and never at streamed ones, which we
+            # would consume here)
+            content_type = response.headers.get('Content-Type', '')
+            if inspect_body and content_type.startswith('text/html') and RateLimiter.BLOCKED_BODY.search(response.content):
+                return RateLimiter.BLOCKED
+
+        if response.status_code in (429, 503):
+            return RateLimiter.THROTTLED
+
+        return RateLimiter.OK
+
+    @staticmethod
+    def is_google(host):
+        return RateLimiter.GOOGLE_HOST.search(host.lower().split(':', 1)[0]) is not None
+
+    def __budget(self, host):
+        if host not in self.__budgets:
+            rate, burst = self.rates.get(host, RateLimiter.DEFAULT_RATE)
+            self.__budgets[host] = HostBudget(rate, burst)
+
+        return self.__budgets[host]
@@ -1,8 +1,9 @@
 #! /usr/bin/env python
 """
 This module provides classes for querying Google Scholar and parsing
-returned results. It currently *only* processes the first results
-page. It is not a recursive crawler.
+returned results. send_query() processes a single results page,
+iter_articles() walks consecutive pages of a query. It is not a
+recursive crawler.
 """
 # ChangeLog
 # ---------
@@ -159,6 +160,7 @@ import optparse
 import os
 import sys
 import re
+import threading
 
 try:
     # Try importing for Python 3
@@ -183,6 +185,12 @@ except ImportError:
         print('We need BeautifulSoup, sorry...')
         sys.exit(1)
 
+# lxml is optional -- we only need it for ScholarArticleParserLxml
+try:
+    import lxml.html
+except ImportError:
+    lxml = None
+
 # Support unicode in both Python 2 and 3. In Python 3, unicode is str.
 if sys.version_info[0] == 3:
     unicode = str # pylint: disable-msg=W0622
@@ -223,6 +231,10 @@ class ScholarConf(object):
     # cookie use across sessions.
     COOKIE_JAR_FILE = None
 
+    # Number of concurrent requests when retrieving citation export
+    # data in bulk (see ScholarQuerier.get_citations()).
+    CITATION_WORKERS = 4
+
 class ScholarUtils(object):
     """A wrapper for various utensils that come in handy."""
 
@@ -252,78 +264,149 @@ class ScholarArticle(object):
     """
     A class representing articles listed on Google Scholar.  The class
     provides basic dictionary-like behavior.
+
+    To keep large numbers of articles cheap, the labels and ordering of
+    the standard attributes live in a schema shared by all instances,
+    and each instance only holds a list of values. Custom attributes
+    (keys not in the schema) are kept per instance, in the order they
+    were added.
     """
+    # The standard attributes, in output order: (1) the key, (2) a
+    # user-suitable label for the item, and (3) the default value.
+    SCHEMA = [
+        ('title',         'Title',          None),
+        ('url',           'URL',            None),
+        ('year',          'Year',           None),
+        ('num_citations', 'Citations',      0),
+        ('num_versions',  'Versions',       0),
+        ('cluster_id',    'Cluster ID',     None),
+        ('url_pdf',       'PDF link',       None),
+        ('url_citations', 'Citations list', None),
+        ('url_versions',  'Versions list',  None),
+        ('url_citation',  'Citation link',  None),
+        ('excerpt',       'Excerpt',        None),
+    ]
+    _INDEX = dict([(item[0], idx) for idx, item in enumerate(SCHEMA)])
+    _DEFAULTS = [item[2] for item in SCHEMA]
+
+    # Precomputed export formats for articles with just the standard
+    # attributes, so exports need not look at labels or ordering:
+    _KEYS = [item[0] for item in SCHEMA]
+    _MAX_LABEL_LEN = max([len(item[1]) for item in SCHEMA])
+    _TXT_FORMATS = [fmt % item[1] + ' %s' for fmt, item
+                    in zip(['%%%ds' % _MAX_LABEL_LEN] * len(SCHEMA), SCHEMA)]
+
+    # Placeholder for standard attributes that got deleted
+    _DELETED = object()
+
+    __slots__ = ('_values', '_custom', 'citation_data')
+
     def __init__(self):
-        # The triplets for each keyword correspond to (1) the actual
-        # value, (2) a user-suitable label for the item, and (3) an
-        # ordering index:
-        self.attrs = {
-            'title':         [None, 'Title',          0],
-            'url':           [None, 'URL',            1],
-            'year':          [None, 'Year',           2],
-            'num_citations': [0,    'Citations',      3],
-            'num_versions':  [0,    'Versions',       4],
-            'cluster_id':    [None, 'Cluster ID',     5],
-            'url_pdf':       [None, 'PDF link',       6],
-            'url_citations': [None, 'Citations list', 7],
-            'url_versions':  [None, 'Versions list',  8],
-            'url_citation':  [None, 'Citation link',  9],
-            'excerpt':       [None, 'Excerpt',       10],
-        }
+        self._values = list(self._DEFAULTS)
+
+        # Custom attributes, as [key, value] pairs. This stays None
+        # until an attribute is added or deleted, i.e. for as long as
+        # the article has just the standard attributes.
+        self._custom = None
 
         # The citation data in one of the standard export formats,
         # e.g. BibTeX.
         self.citation_data = None
 
     def __getitem__(self, key):
-        if key in self.attrs:
-            return self.attrs[key][0]
+        idx = self._INDEX.get(key)
+        if idx is not None:
+            val = self._values[idx]
+            return None if val is self._DELETED else val
+        for item in self._custom or []:
+            if item[0] == key:
+                return item[1]
         return None
 
     def __len__(self):
-        return len(self.attrs)
+        return len(self.fields())
 
     def __setitem__(self, key, item):
-        if key in self.attrs:
-            self.attrs[key][0] = item
-        else:
-            self.attrs[key] = [item, key, len(self.attrs)]
+        idx = self._INDEX.get(key)
+        if idx is not None:
+            self._values[idx] = item
+            return
+        if self._custom is None:
+            self._custom = []
+        for pair in self._custom:
+            if pair[0] == key:
+                pair[1] = item
+                return
+        self._custom.append([key, item])
 
     def __delitem__(self, key):
-        if key in self.attrs:
-            del self.attrs[key]
+        idx = self._INDEX.get(key)
+        if idx is not None:
+            self._values[idx] = self._DELETED
+            if self._custom is None:
+                self._custom = []
+        elif self._custom is not None:
+            self._custom = [pair for pair in self._custom if pair[0] != key]
+
+    @property
+    def attrs(self):
+        """
+        The attributes in their former layout, a dict mapping keys to
+        [value, label, ordering index] triplets. This is a copy:
+        changing it does not change the article.
+        """
+        return dict([(key, [val, label, idx]) for idx, (key, label, val)
+                     in enumerate(self.fields())])
+
+    def fields(self):
+        """
+        Returns (key, label, value) triplets for all attributes, in
+        output order.
+        """
+        res = [(item[0], item[1], val) for item, val
+               in zip(self.SCHEMA, self._values) if val is not self._DELETED]
+        for key, val in self._custom or []:
+            res.append((key, key, val))
+        return res
 
     def set_citation_data(self, citation_data):
         self.citation_data = citation_data
 
     def as_txt(self):
-        # Get items sorted in specified order:
-        items = sorted(list(self.attrs.values()), key=lambda item: item[2])
+        if self._custom is None:
+            return '\n'.join([fmt % (val,) for fmt, val
+                              in zip(self._TXT_FORMATS, self._values)
+                              if val is not None])
+
+        items = self.fields()
         # Find largest label length:
         max_label_len = max([len(str(item[1])) for item in items])
         fmt = '%%%ds %%s' % max_label_len
         res = []
         for item in items:
-            if item[0] is not None:
-                res.append(fmt % (item[1], item[0]))
+            if item[2] is not None:
+                res.append(fmt % (item[1], item[2]))
         return '\n'.join(res)
 
     def as_csv(self, header=False, sep='|'):
-        # Get keys sorted in specified order:
-        keys = [pair[0] for pair in \
-                sorted([(key, val[2]) for key, val in list(self.attrs.items())],
-                       key=lambda pair: pair[1])]
+        if self._custom is None:
+            keys, values = self._KEYS, self._values
+        else:
+            items = self.fields()
+            keys = [item[0] for item in items]
+            values = [item[2] for item in items]
         res = []
         if header:
             res.append(sep.join(keys))
-        res.append(sep.join([unicode(self.attrs[key][0]) for key in keys]))
+        res.append(sep.join([unicode(val) for val in values]))
         return '\n'.join(res)
 
     def as_citation(self):
         """
         Reports the article in a standard citation format. This works only
         if you have configured the querier to retrieve a particular
-        citation export format. (See ScholarSettings.)
+        citation export format (see ScholarSettings), and retrieved the
+        data via ScholarQuerier.get_citation_data() or get_citations().
         """
         return self.citation_data or ''
 
@@ -464,7 +547,7 @@ class ScholarArticleParser(object):
         has a class attribute.
         """
         res = tag.get('class') or []
-        if type(res) != list:
+        if not isinstance(res, list):
             # BeautifulSoup 3 can return e.g. 'gs_md_wp gs_ttss',
             # so split -- conveniently produces a list in any case
             res = res.split()
@@ -594,6 +677,143 @@ class ScholarArticleParser120726(ScholarArticleParser):
                         self.article['excerpt'] = raw_text
 
 
+class ScholarArticleParserLxml(ScholarArticleParser120726):
+    """
+    A faster alternative to ScholarArticleParser120726 for the same
+    results page layout. It builds an lxml tree and uses XPath
+    instead of BeautifulSoup, and produces identical article
+    attributes. (Like BeautifulSoup 4, it decodes HTML entities in
+    text; BeautifulSoup 3 leaves them as-is.) It needs the lxml module.
+    """
+    # XPath predicate for elements having a given class
+    HAS_CLASS = 'contains(concat(" ", normalize-space(@class), " "), " %s ")'
+
+    def parse(self, html):
+        if lxml is None:
+            raise Error('the lxml parser requires the lxml module')
+
+        root = lxml.html.fromstring(html)
+
+        self._parse_globals_lxml(root)
+
+        for div in root.xpath('//div[%s]' % (self.HAS_CLASS % 'gs_r')):
+            self._parse_article(div)
+            self._clean_article()
+            if self.article['title']:
+                self.handle_article(self.article)
+
+    def _parse_globals_lxml(self, root):
+        tags = root.xpath('//div[@id="gs_ab_md"]')
+        if len(tags) > 0:
+            raw_text = tags[0].xpath('.//text()')
+            if len(raw_text) > 0:
+                try:
+                    num_results = raw_text[0].split()[1]
+                    num_results = num_results.replace(',', '')
+                    num_results = int(num_results)
+                    self.handle_num_results(num_results)
+                except (IndexError, ValueError):
+                    pass
+
+    def _parse_article(self, div):
+        self.article = ScholarArticle()
+
+        for tag in div.iterchildren('*'):
+            ttss = self._find(tag, 'div', 'gs_ttss')
+            if ttss is not None:
+                self._parse_links(ttss)
+
+            if tag.tag != 'div' or not self._has_class(tag, 'gs_ri'):
+                continue
+
+            # See ScholarArticleParser120726 for the two title formats.
+            h3 = self._find(tag, 'h3')
+            if h3 is None:
+                continue
+            atag = self._find(h3, 'a')
+            if atag is not None and atag.get('href') is not None:
+                self.article['title'] = ''.join(atag.itertext())
+                self.article['url'] = self._path2url(atag.get('href'))
+                if self.article['url'].endswith('.pdf'):
+                    self.article['url_pdf'] = self.article['url']
+            else:
+                # Skip the contents of spans, e.g. [CITATION]
+                self.article['title'] = self._text_without(h3, 'span')
+
+            gs_a = self._find(tag, 'div', 'gs_a')
+            if gs_a is not None:
+                year = self.year_re.findall(gs_a.text_content())
+                self.article['year'] = year[0] if len(year) > 0 else None
+
+            gs_fl = self._find(tag, 'div', 'gs_fl')
+            if gs_fl is not None:
+                self._parse_links(gs_fl)
+
+            gs_rs = self._find(tag, 'div', 'gs_rs')
+            if gs_rs is not None:
+                raw_text = gs_rs.xpath('.//text()')
+                if len(raw_text) > 0:
+                    self.article['excerpt'] = ''.join(raw_text).replace('\n', '')
+
+    def _parse_links(self, span):
+        for tag in span.iterchildren('a'):
+            href = tag.get('href')
+            if href is None:
+                continue
+            text = tag.text_content()
+
+            if href.startswith('/scholar?cites'):
+                if text.startswith('Cited by'):
+                    self.article['num_citations'] = \
+                        self._as_int(text.split()[-1])
+
+                self.article['url_citations'] = \
+                    self._strip_url_arg('num', self._path2url(href))
+
+                args = self.article['url_citations'].split('?', 1)[1]
+                for arg in args.split('&'):
+                    if arg.startswith('cites='):
+                        self.article['cluster_id'] = arg[6:]
+
+            if href.startswith('/scholar?cluster'):
+                if text.startswith('All '):
+                    self.article['num_versions'] = \
+                        self._as_int(text.split()[1])
+                self.article['url_versions'] = \
+                    self._strip_url_arg('num', self._path2url(href))
+
+            if text.startswith('Import'):
+                self.article['url_citation'] = self._path2url(href)
+
+    def _find(self, elem, name, klass=None):
+        """
+        Returns the first descendant of elem with the given tag name
+        and class, or None -- like BeautifulSoup's Tag.find().
+        """
+        path = './/' + name
+        if klass is not None:
+            path += '[%s]' % (self.HAS_CLASS % klass)
+        res = elem.xpath(path)
+        return res[0] if len(res) > 0 else None
+
+    @staticmethod
+    def _has_class(elem, klass):
+        return klass in (elem.get('class') or '').split()
+
+    @staticmethod
+    def _text_without(elem, name):
+        """
+        Returns the text of elem, skipping the contents (but not the
+        tails) of descendants with the given tag name.
+        """
+        res = [elem.text or '']
+        for child in elem.iterchildren('*'):
+            if child.tag != name:
+                res.append(ScholarArticleParserLxml._text_without(child, name))
+            res.append(child.tail or '')
+        return ''.join(res)
+
+
 class ScholarQuery(object):
     """
     The base class for any kind of results query we send to Scholar.
@@ -875,13 +1095,37 @@ class ScholarSettings(object):
         return self._is_configured
 
 
+class ScholarPageFetch(threading.Thread):
+    """
+    Retrieves a single results page in the background, so the querier
+    can parse one page while the next one is in flight. Use result()
+    to wait for the HTML (None if retrieval failed).
+    """
+    def __init__(self, querier, url):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.querier = querier
+        self.url = url
+        self.html = None
+
+    def run(self):
+        self.html = self.querier._get_http_response(url=self.url,
+                                                    log_msg='dump of query response HTML',
+                                                    err_msg='results retrieval failed')
+
+    def result(self):
+        self.join()
+        return self.html
+
+
 class ScholarQuerier(object):
 
     """
     ScholarQuerier instances can conduct a search on Google Scholar
     with subsequent parsing of the resulting HTML content.  The
     articles found are collected in the articles member, a list of
-    ScholarArticle instances.
+    ScholarArticle instances. Requests go through a urllib opener,
+    unless a transport object providing open(url) is given.
     """
 
     # Default URLs for visiting and submitting Settings pane, as of 3/14
@@ -914,9 +1158,18 @@ class ScholarQuerier(object):
         def handle_article(self, art):
             self.querier.add_article(art)
 
-    def __init__(self):
+    class LxmlParser(ScholarArticleParserLxml, Parser):
+        pass
+
+    # Available results page parsers, see the parser argument below.
+    PARSERS = {'bs': Parser, 'lxml': LxmlParser}
+
+    def __init__(self, transport=None, parser='bs'):
         self.articles = []
         self.query = None
+        # URL of the results page the last query failed to retrieve, if
+        # any. Its articles (and those of later pages) are missing.
+        self.failed_url = None
         self.cjar = MozillaCookieJar()
 
         # If we have a cookie file, load it:
@@ -933,6 +1186,21 @@ class ScholarQuerier(object):
         self.opener = build_opener(HTTPCookieProcessor(self.cjar))
         self.settings = None # Last settings object, if any
 
+        if parser not in self.PARSERS:
+            raise FormatError('parser must be one of %s' % ', '.join(sorted(self.PARSERS)))
+        self.parser_class = self.PARSERS[parser]
+
+        # Citation export data retrieved so far, keyed by cluster ID, so
+        # articles showing up in several queries are fetched only once.
+        self.citations = {}
+
+        # An optional pooled transport (see transport.py in leonardo)
+        # replaces the urllib opener. It shares our cookie jar, so
+        # cookies still get loaded from and saved to COOKIE_JAR_FILE.
+        self.transport = transport
+        if self.transport is not None:
+            self.transport.set_cookie_jar(self.cjar)
+
     def apply_settings(self, settings):
         """
         Applies settings as provided by a ScholarSettings instance.
@@ -952,6 +1220,24 @@ class ScholarQuerier(object):
         if html is None:
             return False
 
+        url = self._get_settings_url(html, settings)
+        if url is None:
+            return False
+
+        html = self._get_http_response(url=url,
+                                       log_msg='dump of settings result HTML',
+                                       err_msg='applying setttings failed')
+        if html is None:
+            return False
+
+        ScholarUtils.log('info', 'settings applied')
+        return True
+
+    def _get_settings_url(self, html, settings):
+        """
+        Helper method, composes the URL that uploads settings from the
+        HTML of the Settings pane. Returns None if parsing fails.
+        """
         # Now parse the required stuff out of the form. We require the
         # "scisig" token to make the upload of our settings acceptable
         # to Google.
@@ -960,12 +1246,12 @@ class ScholarQuerier(object):
         tag = soup.find(name='form', attrs={'id': 'gs_settings_form'})
         if tag is None:
             ScholarUtils.log('info', 'parsing settings failed: no form')
-            return False
+            return None
 
         tag = tag.find('input', attrs={'type':'hidden', 'name':'scisig'})
         if tag is None:
             ScholarUtils.log('info', 'parsing settings failed: scisig')
-            return False
+            return None
 
         urlargs = {'scisig': tag['value'],
                    'num': settings.per_page_results,
@@ -976,14 +1262,7 @@ class ScholarQuerier(object):
             urlargs['scis'] = 'yes'
             urlargs['scisf'] = '&scisf=%d' % settings.citform
 
-        html = self._get_http_response(url=self.SET_SETTINGS_URL % urlargs,
-                                       log_msg='dump of settings result HTML',
-                                       err_msg='applying setttings failed')
-        if html is None:
-            return False
-
-        ScholarUtils.log('info', 'settings applied')
-        return True
+        return self.SET_SETTINGS_URL % urlargs
 
     def send_query(self, query):
         """
@@ -992,15 +1271,74 @@ class ScholarQuerier(object):
         """
         self.clear_articles()
         self.query = query
+        self.failed_url = None
 
         html = self._get_http_response(url=query.get_url(),
                                        log_msg='dump of query response HTML',
                                        err_msg='results retrieval failed')
         if html is None:
+            self.failed_url = query.get_url()
             return
 
         self.parse(html)
 
+    def iter_articles(self, query, max_results=None):
+        """
+        Generator that walks the result pages of a query by advancing
+        its offset, yielding ScholarArticle instances as each page gets
+        parsed. While one page is parsed, the next one is already being
+        retrieved. Iteration stops once max_results articles have been
+        yielded, once the number of results reported by Scholar is
+        exhausted, or when a page yields no articles (or can't be
+        retrieved, see failed_url). As with
+        send_query(), all articles also end up in the articles member.
+        """
+        self.clear_articles()
+        self.query = query
+        self.failed_url = None
+
+        page_size = query.num_results or ScholarConf.MAX_PAGE_RESULTS
+        start = query.offset or 0
+        url = query.get_url()
+        fetch = ScholarPageFetch(self, url)
+        fetch.start()
+
+        while fetch is not None:
+            html = fetch.result()
+            if html is None:
+                self.failed_url = fetch.url
+                return
+
+            # Prefetch the next page, unless we already know we won't
+            # need it. Scholar's total is only known after the first
+            # page, in which case we may discard one prefetched page.
+            fetch = None
+            offset = query.offset + page_size
+            if (max_results is None or offset - start < max_results) and \
+               (not query['num_results'] or offset < query['num_results']):
+                query.set_offset(offset)
+                next_url = query.get_url()
+                # Queries without an offset argument (e.g. cluster
+                # queries) always return the same page:
+                if next_url != url:
+                    url = next_url
+                    fetch = ScholarPageFetch(self, url)
+                    fetch.start()
+
+            num_articles = len(self.articles)
+            self.parse(html)
+            page = self.articles[num_articles:]
+            if len(page) == 0:
+                return
+
+            if max_results is not None and len(self.articles) >= max_results:
+                del self.articles[max_results:]
+                page = page[:max_results - num_articles]
+                fetch = None
+
+            for art in page:
+                yield art
+
     def get_citation_data(self, article):
         """
         Given an article, retrieves citation link. Note, this requires that
@@ -1011,6 +1349,9 @@ class ScholarQuerier(object):
             return False
         if article.citation_data is not None:
             return True
+        if article['cluster_id'] in self.citations:
+            article.set_citation_data(self.citations[article['cluster_id']])
+            return True
 
         ScholarUtils.log('info', 'retrieving citation export data')
         data = self._get_http_response(url=article['url_citation'],
@@ -1019,18 +1360,68 @@ class ScholarQuerier(object):
         if data is None:
             return False
 
+        if article['cluster_id'] is not None:
+            self.citations[article['cluster_id']] = data
         article.set_citation_data(data)
         return True
 
+    def get_citations(self, articles=None, workers=None):
+        """
+        Retrieves citation export data for several articles (by default,
+        all articles of the last query), using up to workers concurrent
+        requests. Citation data is not retrieved while parsing results,
+        so exporters call this when they actually need it. Returns the
+        number of articles that have citation data.
+        """
+        if articles is None:
+            articles = self.articles
+        if workers is None:
+            workers = ScholarConf.CITATION_WORKERS
+
+        pending = [art for art in articles
+                   if art.citation_data is None and art['url_citation'] is not None]
+
+        # Articles sharing a cluster ID need only one request; the
+        # others pick up the data from the cache afterwards.
+        queue, seen = [], set()
+        for art in pending:
+            if art['cluster_id'] is None or art['cluster_id'] not in seen:
+                queue.append(art)
+                seen.add(art['cluster_id'])
+
+        lock = threading.Lock()
+
+        def work():
+            while True:
+                with lock:
+                    if len(queue) == 0:
+                        return
+                    art = queue.pop(0)
+                self.get_citation_data(art)
+
+        threads = [threading.Thread(target=work)
+                   for _ in range(min(max(1, workers), len(queue)))]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        for art in pending:
+            if art.citation_data is None and art['cluster_id'] in self.citations:
+                art.set_citation_data(self.citations[art['cluster_id']])
+
+        return len([art for art in articles if art.citation_data is not None])
+
     def parse(self, html):
         """
         This method allows parsing of provided HTML content.
         """
-        parser = self.Parser(self)
+        parser = self.parser_class(self)
         parser.parse(html)
 
     def add_article(self, art):
-        self.get_citation_data(art)
+        # Citation data gets retrieved lazily, see get_citations().
         self.articles.append(art)
 
     def clear_articles(self):
@@ -1064,8 +1455,11 @@ class ScholarQuerier(object):
         try:
             ScholarUtils.log('info', 'requesting %s' % unquote(url))
 
-            req = Request(url=url, headers={'User-Agent': ScholarConf.USER_AGENT})
-            hdl = self.opener.open(req)
+            if self.transport is not None:
+                hdl = self.transport.open(url)
+            else:
+                req = Request(url=url, headers={'User-Agent': ScholarConf.USER_AGENT})
+                hdl = self.opener.open(req)
             html = hdl.read()
 
             ScholarUtils.log('debug', log_msg)
@@ -1078,7 +1472,7 @@ class ScholarQuerier(object):
 
             return html
         except Exception as err:
-            ScholarUtils.log('info', err_msg + ': %s' % err)
+            ScholarUtils.log('warn', err_msg + ': %s' % err)
             return None
 
 
@@ -1088,8 +1482,7 @@ def txt(querier, with_globals):
         # the maximum length -- makes for nicer alignment.
         max_label_len = 0
         if len(querier.articles) > 0:
-            items = sorted(list(querier.articles[0].attrs.values()),
-                           key=lambda item: item[2])
+            items = querier.articles[0].fields()
             max_label_len = max([len(str(item[1])) for item in items])
 
         # Get items sorted in specified order:
@@ -1115,6 +1508,7 @@ def csv(querier, header=False, sep='|'):
         header = False
 
 def citation_export(querier):
+    querier.get_citations()
     articles = querier.articles
     for art in articles:
         print(art.as_citation() + '\n')
@@ -1187,6 +1581,8 @@ scholar.py -c 5 -a "albert einstein" -t --none "quantum theory" --after 1970"""
     group = optparse.OptionGroup(parser, 'Miscellaneous')
     group.add_option('--cookie-file', metavar='FILE', default=None,
                      help='File to use for cookie storage. If given, will read any existing cookies if found at startup, and save resulting cookies in the end.')
+    group.add_option('--parser', metavar='PARSER', default='bs',
+                     help='Results page parser, "bs" (BeautifulSoup, default) or "lxml" (faster, requires lxml)')
     group.add_option('-d', '--debug', action='count', default=0,
                      help='Enable verbose logging to stderr. Repeated options increase detail of debug output.')
     group.add_option('-v', '--version', action='store_true', default=False,
@@ -1221,7 +1617,11 @@ scholar.py -c 5 -a "albert einstein" -t --none "quantum theory" --after 1970"""
             print('Cluster ID queries do not allow additional search arguments.')
             return 1
 
-    querier = ScholarQuerier()
+    if options.parser not in ScholarQuerier.PARSERS:
+        print('Invalid parser, must be one of "bs" or "lxml".')
+        return 1
+
+    querier = ScholarQuerier(parser=options.parser)
     settings = ScholarSettings()
 
     if options.citation == 'bt':
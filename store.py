@@ -0,0 +1,183 @@
+# persistent store of scholar articles, backed by sqlite. articles found by
+# any run are upserted into the store, so that later runs can tell which
+# papers they already know about (and already downloaded), and so that
+# exporters can work off the store instead of a fresh query.
+#
+# an incoming article matches a stored one if they share the cluster id,
+# the url, or the normalized title (and year, if both have one).
+
+import re
+import json
+import time
+import sqlite3
+
+from scholar import ScholarArticle
+
+def normalize_title(title):
+    # lowercase, alphanumeric words only, single spaces
+    if title is None:
+        return None
+    return ' '.join(re.findall(r'\w+', title.lower(), re.UNICODE))
+
+class ArticleStore(object):
+
+    # the standard ScholarArticle attributes, stored in columns of their own
+    COLUMNS = [item[0] for item in ScholarArticle.SCHEMA]
+
+    # columns which are only ever filled in, never overwritten: an article
+    # matched by url or title may come with the cluster id of another
+    # version of it
+    KEEP_STORED = ['cluster_id']
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS articles (
+            id              INTEGER PRIMARY KEY,
+            title           TEXT,
+            title_norm      TEXT,
+            url             TEXT,
+            year            INTEGER,
+            num_citations   INTEGER,
+            num_versions    INTEGER,
+            cluster_id      TEXT,
+            url_pdf         TEXT,
+            url_citations   TEXT,
+            url_versions    TEXT,
+            url_citation    TEXT,
+            excerpt         TEXT,
+            custom          TEXT,
+            citation_data   TEXT,
+            pdf_path        TEXT,
+            first_seen      REAL,
+            last_seen       REAL
+        );
+        CREATE UNIQUE INDEX IF NOT EXISTS articles_cluster_id ON articles (cluster_id) WHERE cluster_id IS NOT NULL;
+        CREATE INDEX IF NOT EXISTS articles_title_norm ON articles (title_norm);
+        CREATE INDEX IF NOT EXISTS articles_year ON articles (year);
+        CREATE INDEX IF NOT EXISTS articles_url ON articles (url);
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        self.db.executescript(ArticleStore.SCHEMA)
+
+    def find(self, article):
+        # returns the id of the stored article matching article, or None
+        queries = []
+        if article['cluster_id'] is not None:
+            queries.append(("SELECT id FROM articles WHERE cluster_id = ?", (article['cluster_id'],)))
+        if article['url'] is not None:
+            queries.append(("SELECT id FROM articles WHERE url = ?", (article['url'],)))
+        if article['title']:
+            queries.append(("SELECT id FROM articles WHERE title_norm = ? AND (year IS NULL OR ? IS NULL OR year = ?)",
+                (normalize_title(article['title']), article['year'], article['year'])))
+
+        for query, args in queries:
+            row = self.db.execute(query, args).fetchone()
+            if row is not None:
+                return row['id']
+
+        return None
+
+    def add_articles(self, articles):
+        # upserts articles in a single transaction. attributes which are
+        # None never overwrite stored values. returns the nr. of articles
+        # which were new.
+        inserted = 0
+        now = time.time()
+
+        with self.db:
+            for article in articles:
+                values = self.__values(article)
+
+                article_id = self.find(article)
+                if article_id is None:
+                    values['first_seen'] = now
+                    values['last_seen'] = now
+                    self.db.execute("INSERT INTO articles (%s) VALUES (%s)"
+                        % (", ".join(values.keys()), ", ".join(["?"] * len(values))), list(values.values()))
+                    inserted += 1
+                else:
+                    values['last_seen'] = now
+                    # find() matches by cluster id first, so a cluster id
+                    # filled in here isn't one of another stored article
+                    self.__update(article_id, values)
+
+        return inserted
+
+    def load(self, year_from=None, year_to=None, downloaded=None, limit=None):
+        # returns stored articles as ScholarArticle instances, most recently
+        # seen first
+        where, args = [], []
+        if year_from is not None:
+            where.append("year >= ?")
+            args.append(int(year_from))
+        if year_to is not None:
+            where.append("year <= ?")
+            args.append(int(year_to))
+        if downloaded is not None:
+            where.append("pdf_path IS %s NULL" % ("NOT" if downloaded else ""))
+
+        query = "SELECT * FROM articles"
+        if where:
+            query += " WHERE " + " AND ".join(where)
+        query += " ORDER BY last_seen DESC, id"
+        if limit is not None:
+            query += " LIMIT %d" % (int(limit))
+
+        return [self.__article(row) for row in self.db.execute(query, args)]
+
+    def pdf_path(self, article):
+        # returns the file the article was downloaded to, if any
+        article_id = self.find(article)
+        if article_id is None:
+            return None
+
+        return self.db.execute("SELECT pdf_path FROM articles WHERE id = ?", (article_id,)).fetchone()['pdf_path']
+
+    def set_pdf_paths(self, downloads):
+        # downloads is a list of (article, filename) pairs
+        with self.db:
+            for article, filename in downloads:
+                article_id = self.find(article)
+                if article_id is not None:
+                    self.db.execute("UPDATE articles SET pdf_path = ? WHERE id = ?", (filename, article_id))
+
+    def count(self):
+        return self.db.execute("SELECT COUNT(*) FROM articles").fetchone()[0]
+
+    def close(self):
+        self.db.close()
+
+    def __update(self, article_id, values):
+        # None never overwrites a stored value, nothing overwrites one of
+        # KEEP_STORED
+        keys = list(values.keys())
+        self.db.execute("UPDATE articles SET %s WHERE id = ?"
+            % (", ".join([("%s = COALESCE(%s, ?)" if k in ArticleStore.KEEP_STORED else "%s = COALESCE(?, %s)") % (k, k) for k in keys])),
+            [values[k] for k in keys] + [article_id])
+
+    def __values(self, article):
+        values = dict([(key, article[key]) for key in ArticleStore.COLUMNS])
+        values['title_norm'] = normalize_title(article['title'])
+        values['citation_data'] = article.citation_data
+
+        custom = [(key, value) for key, _, value in article.fields() if key not in ArticleStore.COLUMNS]
+        values['custom'] = json.dumps(custom, default=str) if custom else None
+
+        return values
+
+    def __article(self, row):
+        article = ScholarArticle()
+        for key in ArticleStore.COLUMNS:
+            article[key] = row[key]
+        # scholar reports years as strings
+        if article['year'] is not None:
+            article['year'] = str(article['year'])
+
+        for key, value in json.loads(row['custom'] or '[]'):
+            article[key] = value
+        article.set_citation_data(row['citation_data'])
+
+        return article
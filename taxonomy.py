@@ -0,0 +1,224 @@
+# persistent cache of the ACM CCS taxonomy trees parsed from ACM article
+# pages, backed by sqlite. trees are keyed by the id of the article (the
+# id=... argument of citation.cfm urls, which is the same for the library
+# proxy), and stored as zlib-compressed json (see Tree.to_list()), so that
+# later runs neither fetch nor parse the page again.
+#
+# all cached trees are also merged into a single ccs taxonomy, which keeps
+# the articles classified under each node. since an article's tree holds the
+# whole path from the root to each of its index terms, the articles of a node
+# are those of its entire subtree. the merged taxonomy is updated whenever a
+# tree is stored, and answers aggregate queries (e.g. the subcategories of a
+# node with the most articles of a result set) without touching the trees.
+
+import re
+import sys
+import json
+import time
+import zlib
+import sqlite3
+import optparse
+
+from tree import Tree
+
+ACM_ID_RE = re.compile(r'citation\.cfm\?(?:.*&)?id=([0-9.]+)')
+
+def acm_id(url):
+    # the article id in an ACM article url, or None
+    match = ACM_ID_RE.search(url)
+    return match.group(1) if match else None
+
+class TaxonomyCache(object):
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS taxonomies (
+            acm_id      TEXT PRIMARY KEY,
+            url         TEXT,
+            tree        BLOB,
+            fetched     REAL
+        );
+        CREATE TABLE IF NOT EXISTS ccs_nodes (
+            id          TEXT PRIMARY KEY,
+            parent      TEXT,
+            category    TEXT
+        );
+        CREATE INDEX IF NOT EXISTS ccs_nodes_parent ON ccs_nodes (parent);
+        CREATE TABLE IF NOT EXISTS ccs_articles (
+            node_id     TEXT,
+            acm_id      TEXT,
+            PRIMARY KEY (node_id, acm_id)
+        );
+        CREATE INDEX IF NOT EXISTS ccs_articles_acm_id ON ccs_articles (acm_id);
+    """
+
+    ROOT = "0"
+
+    def __init__(self, path, refresh=False):
+        # with refresh, get() always misses, so that all taxonomies seen in
+        # this run get scraped (and stored) again
+        self.path = path
+        self.refresh = refresh
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript(TaxonomyCache.SCHEMA)
+
+        self.stats = {'hits': 0, 'misses': 0, 'stores': 0}
+
+        # caches written before the merged taxonomy existed
+        if self.count() > 0 and self.db.execute("SELECT COUNT(*) FROM ccs_articles").fetchone()[0] == 0:
+            self.rebuild()
+
+    def get(self, url):
+        # the cached Tree of the article at url, or None
+        key = acm_id(url)
+        row = None
+        if key is not None and not self.refresh:
+            row = self.db.execute("SELECT tree FROM taxonomies WHERE acm_id = ?", (key,)).fetchone()
+
+        if row is None:
+            self.stats['misses'] += 1
+            return None
+
+        self.stats['hits'] += 1
+        return Tree.from_list(json.loads(zlib.decompress(bytes(row[0])).decode('utf-8')))
+
+    def put(self, url, tree, root="0"):
+        key = acm_id(url)
+        if key is None:
+            return False
+
+        items = tree.to_list(root)
+        blob = zlib.compress(json.dumps(items, separators=(',', ':')).encode('utf-8'))
+        with self.db:
+            self.db.execute("INSERT OR REPLACE INTO taxonomies (acm_id, url, tree, fetched) VALUES (?, ?, ?, ?)",
+                (key, url, sqlite3.Binary(blob), time.time()))
+            self.__merge(key, items)
+
+        self.stats['stores'] += 1
+        return True
+
+    def count(self):
+        return self.db.execute("SELECT COUNT(*) FROM taxonomies").fetchone()[0]
+
+    def rebuild(self):
+        # merges all stored trees again, from scratch
+        with self.db:
+            self.db.execute("DELETE FROM ccs_articles")
+            self.db.execute("DELETE FROM ccs_nodes")
+            for key, blob in self.db.execute("SELECT acm_id, tree FROM taxonomies").fetchall():
+                self.__merge(key, json.loads(zlib.decompress(bytes(blob)).decode('utf-8')))
+
+    def node_count(self, node, acm_ids=None):
+        # nr. of articles classified under node (among acm_ids, if given)
+        with self.__result_set(acm_ids) as where:
+            return self.db.execute("SELECT COUNT(*) FROM ccs_articles a WHERE a.node_id = ?" + where, (node,)).fetchone()[0]
+
+    def node_articles(self, node):
+        return [row[0] for row in self.db.execute("SELECT acm_id FROM ccs_articles WHERE node_id = ? ORDER BY acm_id", (node,))]
+
+    def top_subcategories(self, node=None, acm_ids=None, k=10):
+        # returns up to k (node, category, nr. of articles) triples for the
+        # children of node (the root, by default) with the most articles
+        # (among acm_ids, if given)
+        with self.__result_set(acm_ids) as where:
+            return self.db.execute("""
+                SELECT n.id, n.category, COUNT(a.acm_id) AS articles 
+                FROM ccs_nodes n JOIN ccs_articles a ON a.node_id = n.id 
+                WHERE n.parent = ?""" + where + """
+                GROUP BY n.id ORDER BY articles DESC, n.id LIMIT ?""", (node or TaxonomyCache.ROOT, k)).fetchall()
+
+    def merged_tree(self):
+        # the merged taxonomy as a Tree
+        tree = Tree()
+        tree.add_node(TaxonomyCache.ROOT)
+        children = {}
+        for node, parent, category in self.db.execute("SELECT id, parent, category FROM ccs_nodes WHERE parent IS NOT NULL ORDER BY id"):
+            children.setdefault(parent, []).append((node, category))
+
+        # parents before children
+        stack = [TaxonomyCache.ROOT]
+        while stack:
+            parent = stack.pop()
+            for node, category in children.get(parent, []):
+                tree.add_node(node, parent, category)
+                stack.append(node)
+
+        return tree
+
+    def close(self):
+        self.db.close()
+
+    def __merge(self, key, items):
+        # (re-)classifies article key under the nodes of its tree, given in
+        # Tree.to_list() form
+        self.db.execute("DELETE FROM ccs_articles WHERE acm_id = ?", (key,))
+        self.db.executemany("INSERT OR IGNORE INTO ccs_nodes (id, parent, category) VALUES (?, ?, ?)", items)
+        self.db.executemany("UPDATE ccs_nodes SET category = ? WHERE id = ? AND (category IS NULL OR category = '')",
+            [(category, node) for node, _, category in items if category])
+        self.db.executemany("INSERT OR IGNORE INTO ccs_articles (node_id, acm_id) VALUES (?, ?)",
+            [(node, key) for node, _, _ in items if node != TaxonomyCache.ROOT])
+
+    def __result_set(self, acm_ids):
+        # context manager, which yields the sql condition that restricts
+        # ccs_articles (as a) to acm_ids, by way of a temporary table (so
+        # that result sets can be of any size)
+        return _ResultSet(self.db, acm_ids)
+
+class _ResultSet(object):
+
+    def __init__(self, db, acm_ids):
+        self.db = db
+        self.acm_ids = acm_ids
+
+    def __enter__(self):
+        if self.acm_ids is None:
+            return ""
+
+        self.db.execute("CREATE TEMP TABLE IF NOT EXISTS result_set (acm_id TEXT PRIMARY KEY)")
+        self.db.execute("DELETE FROM result_set")
+        self.db.executemany("INSERT OR IGNORE INTO result_set (acm_id) VALUES (?)", [(key,) for key in self.acm_ids])
+        return " AND a.acm_id IN (SELECT acm_id FROM result_set)"
+
+    def __exit__(self, *args):
+        if self.acm_ids is not None:
+            self.db.execute("DELETE FROM result_set")
+            self.db.commit()
+        return False
+
+def main():
+    usage = """taxonomy.py [options] [acm url or id ...]
+lists the subcategories of a node of the merged ccs taxonomy (the root, by
+default) with the most articles, among the given articles or all cached ones."""
+
+    fmt = optparse.IndentedHelpFormatter(max_help_position=50, width=100)
+    parser = optparse.OptionParser(usage=usage, formatter=fmt)
+    parser.add_option('--acm-cache', metavar='FILE', default=None,
+                      help='taxonomy cache file (see leonardo.py --acm-cache)')
+    parser.add_option('--node', metavar='ID', default=None,
+                      help='list the subcategories of node ID')
+    parser.add_option('-k', '--top', metavar='K', type='int', default=10,
+                      help='nr. of subcategories listed (default 10)')
+    parser.add_option('--rebuild', action='store_true', default=False,
+                      help='merge all cached taxonomies again, from scratch')
+
+    options, args = parser.parse_args()
+
+    if not options.acm_cache:
+        parser.print_help()
+        return 1
+
+    taxonomies = TaxonomyCache(options.acm_cache)
+    if options.rebuild:
+        taxonomies.rebuild()
+
+    acm_ids = None
+    if args:
+        acm_ids = [acm_id(arg) or arg for arg in args]
+
+    for node, category, articles in taxonomies.top_subcategories(options.node, acm_ids, k=options.top):
+        print("%6d %s %s" % (articles, node, category))
+
+    taxonomies.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+# local stand-in for google scholar, and for the hosts of the .pdf files of
+# its results, e.g. to run aioscholar.py against:
+#
+#   python tests/standin.py --port 8777 &
+#   python3 aioscholar.py -A honeycomb --site http://127.0.0.1:8777 --output-dir pdfs
+#
+# every query has the same TOTAL results, served num (default 10) per page
+# from start. the results link to .pdf files (/pdf/<nr>.pdf) and citation
+# data (/scholar.bib?q=info:<nr>) on the stand-in itself, /paywall/<nr>.pdf
+# is a login page instead, and /short/<nr>.pdf drops the connection half way
+# through the file. range requests for .pdf files are answered as a file
+# server would, If-Range included. fail() scripts error responses for some
+# of the requests.
+
+import re
+import sys
+import threading
+import optparse
+
+try:
+    # python 3
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+    from socketserver import ThreadingMixIn
+    from urllib.parse import urlparse, parse_qs
+except ImportError:
+    # python 2
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+    from SocketServer import ThreadingMixIn
+    from urlparse import urlparse, parse_qs
+
+# nr. of results of every query
+TOTAL = 35
+
+PDF = b'%PDF-1.4\n1 0 obj << /Type /Catalog >> endobj\ntrailer << /Root 1 0 R >>\n%%EOF\n'
+# of every .pdf file
+ETAG = '"standin-1"'
+
+def result(site, nr):
+    return ('<div class="gs_r"><div class="gs_ggs gs_fl"><div class="gs_ttss"><a href="%(site)s/pdf/%(nr)d.pdf">[PDF] stand-in</a></div></div>\n'
+        '<div class="gs_ri"><h3 class="gs_rt"><a href="%(site)s/pdf/%(nr)d.pdf">Honeycomb: creating intrusion detection signatures %(nr)d</a></h3>\n'
+        '<div class="gs_a">C Kreibich, J Crowcroft - ACM SIGCOMM, 2004 - dl.acm.org</div>\n'
+        '<div class="gs_rs">Abstract %(nr)d</div>\n'
+        '<div class="gs_fl"><a href="/scholar?cites=%(cluster)d&amp;as_sdt=2005&amp;sciodt=0,5&amp;hl=en">Cited by %(nr)d</a> '
+        '<a href="/scholar?cluster=%(cluster)d&amp;hl=en&amp;as_sdt=0,5">All 2 versions</a> '
+        '<a href="/scholar.bib?q=info:%(nr)d:scholar.google.com/&amp;output=citation">Import into BibTeX</a></div>\n'
+        '</div></div>\n') % {'site': site, 'nr': nr, 'cluster': 1000 + nr}
+
+def results_page(site, start, num):
+    return ('<html><body><div id="gs_ab_md">About %d results (<b>0.05</b> sec)</div>\n' % (TOTAL)
+        + ''.join([result(site, nr) for nr in range(start, min(start + num, TOTAL))])
+        + '</body></html>\n')
+
+class StandInServer(ThreadingMixIn, HTTPServer):
+
+    daemon_threads = True
+
+    def __init__(self, port=0):
+        HTTPServer.__init__(self, ('127.0.0.1', port), _Handler)
+        self.site = 'http://127.0.0.1:%d' % (self.server_address[1])
+        # request paths, in the order they came in
+        self.requests = []
+        # [(pattern, [status, ...])], see fail()
+        self.failures = []
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def fail(self, pattern, statuses):
+        # answers the next len(statuses) requests whose path (with the query
+        # string) matches regex pattern with these statuses, in turn
+        with self.lock:
+            self.failures.append((re.compile(pattern), list(statuses)))
+
+    def scripted_status(self, path):
+        with self.lock:
+            self.requests.append(path)
+            for pattern, statuses in self.failures:
+                if statuses and pattern.search(path):
+                    return statuses.pop(0)
+        return None
+
+    def start(self):
+        # serves from a background thread, returns the url of the stand-in
+        self.thread = threading.Thread(target=self.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        return self.site
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self.thread is not None:
+            self.thread.join()
+
+class _Handler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        status = self.server.scripted_status(self.path)
+        if status is not None:
+            self.reply(status, b'', 'text/html', {'Retry-After': '0'})
+            return
+
+        url = urlparse(self.path)
+        args = dict([(name, values[0]) for name, values in parse_qs(url.query).items()])
+
+        if url.path == '/scholar':
+            html = results_page(self.server.site, int(args.get('start', 0)), int(args.get('num', 10)))
+            self.reply(200, html.encode('utf-8'), 'text/html')
+        elif url.path == '/scholar.bib':
+            nr = args.get('q', 'info:0').split(':')[1]
+            self.reply(200, ('@article{standin%s,\n  title={Honeycomb %s}\n}\n' % (nr, nr)).encode('utf-8'), 'text/plain')
+        elif url.path.startswith('/pdf/'):
+            self.reply_range(PDF, 'application/pdf')
+        elif url.path.startswith('/short/'):
+            # truncated, except for range requests for the rest of the file
+            self.reply_range(PDF, 'application/pdf', truncate=True)
+        elif url.path.startswith('/paywall/'):
+            # a login page instead of the .pdf file
+            self.reply(200, b'<html><body>sign in</body></html>', 'text/html')
+        else:
+            self.reply(404, b'', 'text/html')
+
+    def reply_range(self, body, content_type, truncate=False):
+        match = re.match(r'bytes=(\d+)-$', self.headers.get('Range', ''))
+        if self.headers.get('If-Range', ETAG) != ETAG:
+            # the file changed since: all of it
+            match = None
+
+        if match is None:
+            # Content-Length says all of it, even if truncated
+            self.reply(200, body[:len(body) // 2] if truncate else body, content_type,
+                {'ETag': ETAG, 'Content-Length': str(len(body))})
+            if truncate:
+                self.close_connection = True
+        elif int(match.group(1)) >= len(body):
+            self.reply(416, b'', 'text/html', {'Content-Range': 'bytes */%d' % (len(body))})
+        else:
+            start = int(match.group(1))
+            self.reply(206, body[start:], content_type,
+                {'ETag': ETAG, 'Content-Range': 'bytes %d-%d/%d' % (start, len(body) - 1, len(body))})
+
+    def reply(self, status, body, content_type, headers=None):
+        headers = dict(headers or {})
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', headers.pop('Content-Length', str(len(body))))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, fmt, *args):
+        pass
+
+def main():
+    parser = optparse.OptionParser(usage="standin.py [options]")
+    parser.add_option('--port', metavar='PORT', type='int', default=8777,
+                      help='port to listen on (default 8777)')
+    options, _ = parser.parse_args()
+
+    server = StandInServer(options.port)
+    print("standin.py::main() : [INFO] serving on %s" % (server.site))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
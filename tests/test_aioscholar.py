@@ -0,0 +1,162 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+try:
+    if sys.version_info < (3, 7):
+        raise ImportError("aioscholar.py requires python 3.7+")
+    import lxml
+    import asyncio
+    import aiohttp
+    import aioscholar
+    import scheduler
+    from tests.standin import StandInServer, TOTAL, PDF, ETAG
+except ImportError:
+    aioscholar = None
+
+from scholar import SearchScholarQuery
+
+@unittest.skipIf(aioscholar is None, "requires python 3.7+, aiohttp and lxml")
+class StandInTestCase(unittest.TestCase):
+    # runs the async code against a local stand-in server (tests/standin.py)
+
+    def setUp(self):
+        self.server = StandInServer()
+        self.site = self.server.start()
+        self.loop = asyncio.new_event_loop()
+        self.dir = tempfile.mkdtemp()
+
+        # no backoff after throttling responses
+        self.backoff = scheduler.RateLimiter.BACKOFF
+        scheduler.RateLimiter.BACKOFF = 0.0
+
+        self.session = self.call_soon(aiohttp.ClientSession)
+
+    def tearDown(self):
+        scheduler.RateLimiter.BACKOFF = self.backoff
+        self.loop.run_until_complete(self.session.close())
+        self.loop.close()
+        self.server.stop()
+        shutil.rmtree(self.dir)
+
+    def call_soon(self, func):
+        # returns func(), called from within the running loop (as sessions
+        # and queriers must be created)
+        future = self.loop.create_future()
+        self.loop.call_soon(lambda: future.set_result(func()))
+        return self.loop.run_until_complete(future)
+
+    def querier(self, limiter=None):
+        return self.call_soon(lambda: aioscholar.AsyncScholarQuerier(self.session, parser='lxml', site=self.site, limiter=limiter))
+
+    def query(self):
+        query = SearchScholarQuery()
+        query.set_words('honeycomb')
+        query.set_num_page_results(10)
+        return query
+
+    def numbers(self, articles):
+        return sorted([int(art['title'].split()[-1]) for art in articles])
+
+class AsyncScholarQuerierTest(StandInTestCase):
+
+    def test_query_articles(self):
+        articles = self.loop.run_until_complete(self.querier().query_articles(self.query()))
+        self.assertEqual(self.numbers(articles), list(range(TOTAL)))
+
+    def test_query_articles_max_results(self):
+        articles = self.loop.run_until_complete(self.querier().query_articles(self.query(), max_results=15))
+        self.assertEqual(self.numbers(articles), list(range(15)))
+
+    def test_failed_page_keeps_others(self):
+        self.server.fail(r'&start=10(&|$)', [500])
+        articles = self.loop.run_until_complete(self.querier().query_articles(self.query()))
+        self.assertEqual(self.numbers(articles), list(range(10)) + list(range(20, TOTAL)))
+
+    def test_throttled_page_retried(self):
+        self.server.fail(r'&start=20(&|$)', [429])
+        querier = self.querier(scheduler.RateLimiter(jitter=0.0))
+        articles = self.loop.run_until_complete(querier.query_articles(self.query()))
+        self.assertEqual(self.numbers(articles), list(range(TOTAL)))
+
+    def test_failed_citations_keep_others(self):
+        self.server.fail(r'info:3:', [500])
+        self.server.fail(r'info:5:', [429] * aioscholar.MAX_ATTEMPTS)
+
+        querier = self.querier(scheduler.RateLimiter(jitter=0.0))
+        articles = self.loop.run_until_complete(querier.query_articles(self.query(), max_results=10))
+        self.assertEqual(self.loop.run_until_complete(querier.get_citations(articles)), 8)
+
+        missing = [art for art in articles if art.citation_data is None]
+        self.assertEqual(self.numbers(missing), [3, 5])
+
+    def test_blocked_citation(self):
+        class BlockingLimiter(scheduler.RateLimiter):
+            def check(self, response, inspect_body=True, host=None):
+                if 'info:4:' in response.url:
+                    return scheduler.RateLimiter.BLOCKED
+                return scheduler.RateLimiter.check(response, inspect_body, host)
+
+        querier = self.querier(BlockingLimiter(jitter=0.0, cooldown=0.0))
+        articles = self.loop.run_until_complete(querier.query_articles(self.query(), max_results=10))
+        self.assertEqual(self.loop.run_until_complete(querier.get_citations(articles)), 9)
+
+class AsyncDownloadPoolTest(StandInTestCase):
+
+    def pool(self, limiter=None):
+        return self.call_soon(lambda: aioscholar.AsyncDownloadPool(self.session, retries=2, limiter=limiter))
+
+    def test_download(self):
+        pool = self.pool()
+        for nr in range(5):
+            pool.add(self.site + '/pdf/%d.pdf' % (nr), os.path.join(self.dir, '%d.pdf' % (nr)))
+
+        jobs = self.loop.run_until_complete(pool.run())
+        self.assertEqual([job.status for job in jobs], ['done'] * 5)
+        self.assertEqual(sorted(os.listdir(self.dir)), ['%d.pdf' % (nr) for nr in range(5)])
+
+    def test_failures_keep_others(self):
+        # throttled once (retried after the backoff), failing for good, and
+        # not a .pdf file
+        self.server.fail(r'^/pdf/1\.pdf$', [429])
+        self.server.fail(r'^/pdf/2\.pdf$', [500] * 3)
+        pool = self.pool(scheduler.RateLimiter(jitter=0.0))
+        for nr in range(5):
+            path = '/paywall/%d.pdf' if nr == 3 else '/pdf/%d.pdf'
+            pool.add(self.site + path % (nr), os.path.join(self.dir, '%d.pdf' % (nr)))
+
+        jobs = self.loop.run_until_complete(pool.run())
+        self.assertEqual([job.status for job in jobs], ['done', 'done', 'failed', 'failed', 'done'])
+        self.assertEqual(self.server.requests.count('/pdf/1.pdf'), 2)
+        self.assertEqual(self.server.requests.count('/pdf/2.pdf'), 3)
+        self.assertEqual(self.server.requests.count('/paywall/3.pdf'), 1)
+        self.assertFalse(os.path.exists(os.path.join(self.dir, '2.pdf')))
+
+    def test_partial_files(self):
+        # resumed, complete already (416), stale (416, retried from scratch)
+        # and a login page
+        partials = {0: PDF[:10], 1: PDF, 2: PDF + b'trailing junk', 3: PDF[:10]}
+        for nr, data in partials.items():
+            with open(os.path.join(self.dir, '%d.pdf.part' % (nr)), 'wb') as part_file:
+                part_file.write(data)
+            with open(os.path.join(self.dir, '%d.pdf.part.validator' % (nr)), 'w') as validator_file:
+                validator_file.write(ETAG)
+
+        pool = self.pool()
+        for nr in range(4):
+            path = '/paywall/%d.pdf' if nr == 3 else '/pdf/%d.pdf'
+            pool.add(self.site + path % (nr), os.path.join(self.dir, '%d.pdf' % (nr)))
+
+        jobs = self.loop.run_until_complete(pool.run())
+        self.assertEqual([job.status for job in jobs], ['done', 'done', 'done', 'failed'])
+        self.assertEqual([job.size for job in jobs[:3]], [len(PDF) - 10, 0, len(PDF)])
+        self.assertEqual(self.server.requests.count('/pdf/2.pdf'), 2)
+        self.assertEqual(sorted(os.listdir(self.dir)), ['0.pdf', '1.pdf', '2.pdf'])
+        for nr in range(3):
+            with open(os.path.join(self.dir, '%d.pdf' % (nr)), 'rb') as pdf_file:
+                self.assertEqual(pdf_file.read(), PDF)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+import os
+import json
+import shutil
+import optparse
+import tempfile
+import unittest
+
+try:
+    import leonardo
+except ImportError:
+    # python 2 only, and needs all of its dependencies
+    leonardo = None
+
+PAGE = ('<html><body><div id="gs_ab_md">About 1 results (<b>0.05</b> sec)</div>'
+    '<div class="gs_r"><div class="gs_ri"><h3 class="gs_rt"><span class="gs_ctu"><span class="gs_ct1">[CITATION]</span>'
+    '<span class="gs_ct2">[C]</span></span> Honeycomb</h3><div class="gs_a">C Kreibich - 2004</div></div></div>'
+    '</body></html>')
+
+class FakeResponse(object):
+
+    def __init__(self, url, body):
+        self.url = url
+        self.body = body
+
+    def read(self):
+        return self.body
+
+    def geturl(self):
+        return self.url
+
+    def getcode(self):
+        return 200
+
+    def info(self):
+        return {}
+
+class FakeTransport(object):
+    # answers results page requests with PAGE, except for queries matching
+    # one of the failing words
+
+    def __init__(self, failing=()):
+        self.failing = failing
+        self.cache = None
+
+    def set_cookie_jar(self, cjar):
+        pass
+
+    def open(self, url):
+        if [word for word in self.failing if word in url]:
+            raise IOError("connection reset")
+        return FakeResponse(url, PAGE.encode('utf-8'))
+
+@unittest.skipIf(leonardo is None, "requires leonardo.py (python 2)")
+class LoadBatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'batch.jsonl')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def load(self, *lines):
+        with open(self.path, 'w') as batch_file:
+            batch_file.write('\n'.join(lines) + '\n')
+        return leonardo.load_batch(self.path)
+
+    def assertInvalid(self, message, *lines):
+        try:
+            self.load(*lines)
+        except ValueError as e:
+            self.assertTrue(message in str(e), str(e))
+        else:
+            self.fail("no ValueError for %r" % (lines,))
+
+    def test_specs(self):
+        specs = self.load(
+            '# honeypots',
+            '{"name": "honeypots", "allw": "honeypot", "count": 50, "after": 2004, "before": "2010", "no_patents": true}',
+            '',
+            '{"phrase": "intrusion detection", "offset": 0, "pub": null}')
+        self.assertEqual(len(specs), 2)
+        self.assertEqual(specs[0]['count'], 50)
+        self.assertEqual(specs[1]['phrase'], 'intrusion detection')
+
+    def test_invalid_json(self):
+        self.assertInvalid(':1 : invalid json', '{"allw": ')
+        self.assertInvalid(':1 : query spec must be a json object', '["honeypot"]')
+        self.assertInvalid(':2 : unknown query spec keys : words', '{"allw": "a"}', '{"words": "b"}')
+
+    def test_numbers(self):
+        # "50" would compare greater than MAX_PAGE_RESULTS under python 2
+        self.assertInvalid(':1 : count must be an integer', '{"allw": "a", "count": "50"}')
+        self.assertInvalid(':1 : count must be an integer', '{"allw": "a", "count": 2.5}')
+        self.assertInvalid(':1 : count must be an integer', '{"allw": "a", "count": true}')
+        self.assertInvalid(':1 : count must be positive', '{"allw": "a", "count": 0}')
+        self.assertInvalid(':1 : offset must be non-negative', '{"allw": "a", "offset": -10}')
+        self.assertInvalid(':1 : after must be an integer', '{"allw": "a", "after": "2004-01"}')
+        self.assertInvalid(':1 : before must be an integer', '{"allw": "a", "before": [2010]}')
+
+    def test_flags_and_strings(self):
+        self.assertInvalid(':1 : no_patents must be true or false', '{"allw": "a", "no_patents": 1}')
+        self.assertInvalid(':1 : allw must be a non-empty string', '{"allw": 42}')
+        self.assertInvalid(':1 : author must be a non-empty string', '{"author": " "}')
+        self.assertInvalid(':1 : name must be a non-empty string', '{"name": 7, "allw": "a"}')
+
+    def test_duplicate_names(self):
+        self.assertInvalid(':3 : name maps to the same output dir (honeypots) as the query on line 1',
+            '{"name": "honeypots", "allw": "a"}', '{"name": "malware", "allw": "b"}', '{"name": "honeypots", "allw": "c"}')
+        # different names, same dir
+        self.assertInvalid(':2 : name maps to the same output dir (honey_pots) as the query on line 1',
+            '{"name": "Honey pots", "allw": "a"}', '{"name": "honey-pots!", "allw": "b"}'.replace('-', ' '))
+        # a name which is the default of another query
+        self.assertInvalid(':2 : name maps to the same output dir (query001) as the query on line 1',
+            '{"allw": "a"}', '{"name": "query001", "allw": "b"}')
+        self.assertInvalid(':1 : name has no letters or digits', '{"name": "???", "allw": "a"}')
+
+@unittest.skipIf(leonardo is None, "requires leonardo.py (python 2)")
+class RunBatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.options = optparse.Values({'output_dir': self.dir, 'parser': 'bs', 'citation': None,
+            'author': None, 'allw': None, 'some': None, 'none': None, 'phrase': None, 'title_only': False,
+            'pub': None, 'after': None, 'before': None, 'no_patents': False, 'no_citations': False,
+            'count': None, 'offset': None, 'download_workers': 1, 'host_connections': 1,
+            'convert_workers': 1, 'force_convert': False})
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_failed_query_is_an_error(self):
+        specs = [{'name': 'honeypots', 'allw': 'honeypot'}, {'name': 'broken', 'allw': 'unreachable'}]
+        leonardo.run_batch(self.options, specs, FakeTransport(failing=['unreachable']))
+
+        with open(os.path.join(self.dir, 'batch_summary.json')) as summary_file:
+            summary = json.load(summary_file)
+
+        self.assertEqual([entry['name'] for entry in summary], ['honeypots', 'broken'])
+        self.assertEqual(summary[0]['error'], None)
+        self.assertEqual(summary[0]['articles'], 1)
+        self.assertTrue(summary[1]['error'].startswith('results retrieval failed : '), summary[1]['error'])
+        self.assertTrue('unreachable' in summary[1]['error'])
+        self.assertEqual(summary[1]['articles'], 0)
+
+if __name__ == '__main__':
+    unittest.main()
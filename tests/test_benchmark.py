@@ -0,0 +1,36 @@
+import os
+import unittest
+
+try:
+    import benchmark
+except ImportError:
+    # python 2 only, and needs all of leonardo.py's dependencies
+    benchmark = None
+
+def _sum(data):
+    return sum(data)
+
+def _raise(data):
+    raise ValueError("no results in %d bytes" % (len(data)))
+
+def _exit(data):
+    # dies without sending anything back
+    os._exit(3)
+
+@unittest.skipIf(benchmark is None, "requires benchmark.py (python 2)")
+class RunCaseTest(unittest.TestCase):
+
+    def test_result(self):
+        error, best, median, peak = benchmark._run_case(_sum, list(range(1000)), 3)
+        self.assertEqual(error, None)
+        self.assertTrue(0.0 <= best <= median)
+        self.assertTrue(peak >= 0.0)
+
+    def test_exception(self):
+        self.assertEqual(benchmark._run_case(_raise, 'page', 3), ("ValueError : no results in 4 bytes", None, None, None))
+
+    def test_child_died(self):
+        self.assertEqual(benchmark._run_case(_exit, 'page', 3), ("no result, exit code 3", None, None, None))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import cache
+from cache import ResponseCache, canonical_url
+
+class FakeClock(object):
+
+    def __init__(self, now=1000000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+class CanonicalUrlTest(unittest.TestCase):
+
+    def test_equivalent_urls(self):
+        self.assertEqual(canonical_url('HTTP://Scholar.Google.com:80/scholar?b=2&a=1#top'),
+                         canonical_url('http://scholar.google.com/scholar?a=1&b=2'))
+        self.assertEqual(canonical_url('https://dl.acm.org'), 'https://dl.acm.org/')
+
+    def test_different_urls(self):
+        self.assertNotEqual(canonical_url('http://dl.acm.org:8080/x'), canonical_url('http://dl.acm.org/x'))
+        self.assertNotEqual(canonical_url('http://dl.acm.org/x?a=1'), canonical_url('http://dl.acm.org/x?a=2'))
+
+class ResponseCacheTest(unittest.TestCase):
+
+    RESULTS_URL = 'http://scholar.google.com/scholar?as_q=honeycomb&num=20'
+    ACM_URL = 'http://dl.acm.org/citation.cfm?id=1'
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.clock = FakeClock()
+        self.time = cache.time
+        cache.time = self.clock
+
+    def tearDown(self):
+        cache.time = self.time
+        shutil.rmtree(self.dir)
+
+    def test_hit_and_miss(self):
+        c = ResponseCache(self.dir)
+        self.assertEqual(c.get(self.RESULTS_URL), None)
+        self.assertTrue(c.put(self.RESULTS_URL, b'results'))
+        self.assertEqual(c.get(self.RESULTS_URL), b'results')
+        self.assertEqual((c.stats['hits'], c.stats['misses'], c.stats['stores']), (1, 1, 1))
+
+    def test_uncacheable_endpoints(self):
+        c = ResponseCache(self.dir)
+        for url in ['http://scholar.google.com/scholar_settings?sciifh=1',
+                    'http://scholar.google.com/scholar_setprefs?scisig=x',
+                    'http://example.org/paper.pdf']:
+            self.assertFalse(c.put(url, b'body'), url)
+            self.assertEqual(c.get(url), None)
+
+    def test_ttl(self):
+        c = ResponseCache(self.dir, ttls={'results': 60})
+        c.put(self.RESULTS_URL, b'results')
+        self.clock.now += 59
+        self.assertEqual(c.get(self.RESULTS_URL), b'results')
+        self.clock.now += 2
+        self.assertEqual(c.get(self.RESULTS_URL), None)
+        self.assertEqual(c.stats['expired'], 1)
+
+    def test_lru_eviction(self):
+        c = ResponseCache(self.dir, max_size=25)
+        for i in range(3):
+            c.put(self.ACM_URL + str(i), b'0123456789')
+            self.clock.now += 1
+        # the first entry got evicted to make room for the third
+        self.assertEqual(c.get(self.ACM_URL + '0'), None)
+        self.assertEqual(c.stats['evictions'], 1)
+
+        # accessing an entry makes it the most recently used
+        self.clock.now += 1
+        self.assertEqual(c.get(self.ACM_URL + '1'), b'0123456789')
+        self.clock.now += 1
+        c.put(self.ACM_URL + '3', b'0123456789')
+        self.assertEqual(c.get(self.ACM_URL + '2'), None)
+        self.assertEqual(c.get(self.ACM_URL + '1'), b'0123456789')
+        self.assertTrue(c.size <= 25)
+
+    def test_too_large(self):
+        c = ResponseCache(self.dir, max_size=5)
+        self.assertFalse(c.put(self.ACM_URL, b'0123456789'))
+
+    def test_settings_variant(self):
+        c = ResponseCache(self.dir)
+        c.set_variant('citform=0')
+        c.put(self.RESULTS_URL, b'without citation links')
+        c.put(self.ACM_URL, b'acm page')
+
+        c.set_variant('citform=4')
+        self.assertEqual(c.get(self.RESULTS_URL), None)
+        # other endpoints don't depend on the settings
+        self.assertEqual(c.get(self.ACM_URL), b'acm page')
+        c.put(self.RESULTS_URL, b'with citation links')
+
+        c.set_variant('citform=0')
+        self.assertEqual(c.get(self.RESULTS_URL), b'without citation links')
+
+    def test_invalidate(self):
+        c = ResponseCache(self.dir)
+        c.put(self.ACM_URL, b'acm page')
+        c.invalidate(self.ACM_URL)
+        self.assertEqual(c.get(self.ACM_URL), None)
+
+    def test_index_saved_on_close(self):
+        c = ResponseCache(self.dir)
+        c.put(self.ACM_URL, b'acm page')
+        c.close()
+        self.assertEqual(ResponseCache(self.dir).get(self.ACM_URL), b'acm page')
+
+    def test_index_saved_periodically(self):
+        c = ResponseCache(self.dir)
+        for i in range(ResponseCache.SAVE_EVERY):
+            c.put(self.ACM_URL + str(i), b'acm page')
+        # no close()
+        self.assertEqual(ResponseCache(self.dir).get(self.ACM_URL + '0'), b'acm page')
+
+    def test_corrupt_index(self):
+        with open(os.path.join(self.dir, 'index.json'), 'w') as index_file:
+            index_file.write('{not json')
+        self.assertEqual(ResponseCache(self.dir).get(self.ACM_URL), None)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from index import TextIndex, tokenize
+
+class TextIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.txt_dir = os.path.join(self.dir, 'txt')
+        os.mkdir(self.txt_dir)
+        self.index = TextIndex(os.path.join(self.dir, 'index.db'))
+
+    def tearDown(self):
+        self.index.close()
+        shutil.rmtree(self.dir)
+
+    def write(self, name, text, mtime=1000000.0):
+        path = os.path.join(self.txt_dir, name)
+        with open(path, 'wb') as txt_file:
+            txt_file.write(text.encode('utf-8'))
+        os.utime(path, (mtime, mtime))
+
+    def search(self, query):
+        return [(os.path.basename(path), count) for path, count in self.index.search(query)]
+
+    def df(self, term):
+        row = self.index.db.execute("SELECT df FROM terms WHERE term = ?", (term,)).fetchone()
+        return row[0] if row else None
+
+    def check_df(self):
+        # the stored document frequencies, against those of the postings
+        stored = dict(self.index.db.execute("SELECT id, df FROM terms").fetchall())
+        counted = dict(self.index.db.execute("SELECT term_id, COUNT(*) FROM postings GROUP BY term_id").fetchall())
+        for term_id, df in stored.items():
+            self.assertEqual(df, counted.get(term_id, 0), term_id)
+
+    def test_tokenize(self):
+        self.assertEqual(tokenize("The quick-brown Fox, 2004."), ['the', 'quick', 'brown', 'fox', '2004'])
+
+    def test_incremental_update(self):
+        self.write('a.txt', "the quick brown fox")
+        self.write('b.txt', "the lazy dog")
+        self.write('c.txt', "a brown dog")
+        self.write('notes.md', "brown")
+        self.assertEqual(self.index.update(self.txt_dir), (3, 0))
+        self.assertEqual(self.index.count(), 3)
+        self.assertEqual((self.df('brown'), self.df('dog'), self.df('the')), (2, 2, 2))
+
+        # unchanged files are skipped
+        self.assertEqual(self.index.update(self.txt_dir), (0, 0))
+        self.assertEqual(self.df('brown'), 2)
+
+        # changed (size or mtime) ones re-indexed, deleted ones removed
+        self.write('a.txt', "the quick red fox")
+        self.write('b.txt', "the lazy cat", mtime=1000060.0)
+        os.remove(os.path.join(self.txt_dir, 'c.txt'))
+        self.assertEqual(self.index.update(self.txt_dir), (2, 1))
+        self.assertEqual(self.index.count(), 2)
+        self.assertEqual((self.df('brown'), self.df('dog'), self.df('red'), self.df('the')), (0, 0, 1, 2))
+        self.check_df()
+
+        self.assertEqual(self.search('brown'), [])
+        self.assertEqual(self.search('cat'), [('b.txt', 1)])
+
+    def test_other_dirs_kept(self):
+        other_dir = os.path.join(self.dir, 'other')
+        os.mkdir(other_dir)
+        with open(os.path.join(other_dir, 'd.txt'), 'wb') as txt_file:
+            txt_file.write(b"brown bear")
+        self.write('a.txt', "brown fox")
+
+        self.index.update(other_dir)
+        self.assertEqual(self.index.update(self.txt_dir), (1, 0))
+        self.assertEqual(sorted(self.search('brown')), [('a.txt', 1), ('d.txt', 1)])
+
+    def test_phrases(self):
+        self.write('a.txt', "the quick brown fox jumps over the brown fox")
+        self.write('b.txt', "a fox brown and brown bear")
+        self.index.update(self.txt_dir)
+
+        self.assertEqual(self.search('"brown fox"'), [('a.txt', 2)])
+        self.assertEqual(self.search('"fox brown"'), [('b.txt', 1)])
+        self.assertEqual(self.search('"quick brown fox"'), [('a.txt', 1)])
+        self.assertEqual(self.search('"brown quick"'), [])
+        self.assertEqual(self.search('"brown bear"'), [('b.txt', 1)])
+
+    def test_all_parts_must_match(self):
+        self.write('a.txt', "honeypot signatures for worms")
+        self.write('b.txt', "honeypot networks")
+        self.write('c.txt', "worm signatures")
+        self.index.update(self.txt_dir)
+
+        self.assertEqual(self.search('honeypot'), [('a.txt', 1), ('b.txt', 1)])
+        self.assertEqual(self.search('honeypot signatures'), [('a.txt', 2)])
+        self.assertEqual(self.search('honeypot "worm signatures"'), [])
+        self.assertEqual(self.search('honeypot missing'), [])
+        self.assertEqual(self.search('" "'), [])
+
+    def test_ranking(self):
+        # by the nr. of matches of all parts, then in order of indexing
+        self.write('a.txt', "honeypot")
+        self.write('b.txt', "honeypot honeypot honeypot")
+        self.write('c.txt', "honeypot honeypot")
+        self.write('d.txt', "honeypot honeypot")
+        self.index.update(self.txt_dir)
+
+        self.assertEqual(self.search('honeypot'), [('b.txt', 3), ('c.txt', 2), ('d.txt', 2), ('a.txt', 1)])
+        self.assertEqual([os.path.basename(path) for path, _ in self.index.search('honeypot', limit=2)], ['b.txt', 'c.txt'])
+
+if __name__ == '__main__':
+    unittest.main()
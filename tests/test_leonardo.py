@@ -0,0 +1,250 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+try:
+    import leonardo
+    from metrics import Metrics
+    from scholar import ScholarArticle
+except ImportError:
+    # python 2 only, and needs all of its dependencies
+    leonardo = None
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'fixtures')
+
+PDF = b'%PDF-1.4\n1 0 obj << /Type /Catalog >> endobj\ntrailer << /Root 1 0 R >>\n%%EOF\n'
+
+def text_pdf(pages):
+    # a .pdf file with one line of text on each page
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>",
+        "<< /Type /Pages /Kids [%s] /Count %d >>" % (" ".join(["%d 0 R" % (4 + 2 * i) for i in range(len(pages))]), len(pages)),
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    for i, text in enumerate(pages):
+        stream = "BT /F1 24 Tf 72 720 Td (%s) Tj ET" % (text)
+        objects.append("<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents %d 0 R "
+            "/Resources << /Font << /F1 3 0 R >> >> >>" % (5 + 2 * i))
+        objects.append("<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+
+    pdf = "%PDF-1.4\n"
+    offsets = []
+    for i, obj in enumerate(objects):
+        offsets.append(len(pdf))
+        pdf += "%d 0 obj\n%s\nendobj\n" % (i + 1, obj)
+    xref = len(pdf)
+    pdf += "xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    pdf += "".join(["%010d 00000 n \n" % (offset) for offset in offsets])
+    pdf += "trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return pdf.encode('ascii')
+
+# an ACM page without the CCS script
+ACM_PAGE = b'<html><body><a name="FullTextPDF" href="ft_gateway.cfm?id=1&amp;type=pdf">PDF</a></body></html>'
+
+class FakeResponse(object):
+
+    def __init__(self, url, body, content_type):
+        self.url = url
+        self.body = body
+        self.status_code = 200
+        self.headers = {'Content-Type': content_type, 'Content-Length': str(len(body))}
+
+    def read(self):
+        return self.body
+
+    def geturl(self):
+        return self.url
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size):
+        yield self.body
+
+    def close(self):
+        pass
+
+class FakeTransport(object):
+    # pages and .pdf files by url, a 403 for everything else
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.cache = None
+        self.requests = []
+
+    def open(self, url, headers=None):
+        self.requests.append(url)
+        if url not in self.pages:
+            raise IOError("HTTP Error 403: Forbidden")
+        return FakeResponse(url, self.pages[url], 'text/html')
+
+    def get(self, url, headers=None, stream=False):
+        self.requests.append(url)
+        if url not in self.pages:
+            raise IOError("HTTP Error 403: Forbidden")
+        return FakeResponse(url, self.pages[url], 'application/pdf')
+
+def article(title, url):
+    art = ScholarArticle()
+    art['title'] = title
+    art['url'] = url
+    return art
+
+@unittest.skipIf(leonardo is None, "requires leonardo.py (python 2)")
+class DownloadArticlesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_acm_failures_keep_others(self):
+        # no CCS script, and a 403 (e.g. from the library proxy)
+        transport = FakeTransport({
+            'http://dl.acm.org/citation.cfm?id=1': ACM_PAGE,
+            'http://dl.acm.org/ft_gateway.cfm?id=1&type=pdf': PDF,
+            'http://a.org/honeyd.pdf': PDF})
+        articles = [article("Honeycomb", 'http://dl.acm.org/citation.cfm?id=1'),
+            article("Honeynets", 'http://dl.acm.org/citation.cfm?id=2'),
+            article("Honeyd", 'http://a.org/honeyd.pdf')]
+        metrics = Metrics()
+
+        jobs = leonardo.download_articles(articles, self.dir, workers=1, transport=transport, metrics=metrics)
+
+        self.assertEqual(sorted([(os.path.basename(job.filename), job.status) for job in jobs]),
+            [('honeycomb.pdf', 'done'), ('honeyd.pdf', 'done')])
+        self.assertEqual(sorted(os.listdir(self.dir)), ['honeycomb.pdf', 'honeyd.pdf'])
+
+        # the ACM page was fetched once, for the taxonomy and the resolver
+        self.assertEqual(transport.requests.count('http://dl.acm.org/citation.cfm?id=1'), 1)
+        acm = metrics.as_dict()['stages']['acm']
+        self.assertEqual((acm['count'], acm['errors']), (2, 2))
+
+@unittest.skipIf(leonardo is None, "requires leonardo.py (python 2)")
+class ConvertPdfTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'honeyd.pdf')
+        with open(self.path, 'wb') as pdf_file:
+            pdf_file.write(text_pdf(["page %s" % (name) for name in ["one", "two", "three", "four", "five"]]))
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def pages(self, **kwargs):
+        return [(pageno, text.strip()) for pageno, text in leonardo.iter_pdf_pages(self.path, **kwargs)]
+
+    def test_all_pages(self):
+        self.assertEqual(self.pages(), [(0, "page one"), (1, "page two"), (2, "page three"), (3, "page four"), (4, "page five")])
+
+    def test_pagenos(self):
+        self.assertEqual(self.pages(pagenos=set([1, 3])), [(1, "page two"), (3, "page four")])
+        self.assertEqual(self.pages(pagenos=set([3]), maxpages=5), [(3, "page four")])
+        self.assertEqual(self.pages(pagenos=set([9])), [])
+
+    def test_maxpages(self):
+        self.assertEqual(self.pages(maxpages=2), [(0, "page one"), (1, "page two")])
+        # pages extracted, not pages read
+        self.assertEqual(self.pages(pagenos=set([2, 3, 4]), maxpages=2), [(2, "page three"), (3, "page four")])
+
+    def test_stop(self):
+        seen = []
+        def stop(pageno, text):
+            seen.append(pageno)
+            return "three" in text
+        self.assertEqual(self.pages(stop=stop), [(0, "page one"), (1, "page two"), (2, "page three")])
+        self.assertEqual(seen, [0, 1, 2])
+
+    def test_convert(self):
+        self.assertEqual(leonardo.convert_pdf_to_txt(self.path, maxpages=2), 0)
+        self.assertEqual(sorted(os.listdir(self.dir)), ['honeyd.pdf', 'honeyd.txt'])
+        with open(os.path.join(self.dir, 'honeyd.txt')) as txt_file:
+            self.assertEqual(txt_file.read().split(), ["page", "one", "page", "two"])
+
+    def test_convert_failure(self):
+        # a truncated file : no .txt file, and the temporary one removed
+        with open(self.path, 'wb') as pdf_file:
+            pdf_file.write(PDF[:20])
+        self.assertEqual(leonardo.convert_pdf_to_txt(self.path), -1)
+        self.assertEqual(os.listdir(self.dir), ['honeyd.pdf'])
+
+        # fails half way through, e.g. on a page pdfminer can't read
+        with open(self.path, 'wb') as pdf_file:
+            pdf_file.write(text_pdf(["page one", "page two"]))
+        def stop(pageno, text):
+            raise ValueError("unreadable page")
+        self.assertEqual(leonardo.convert_pdf_to_txt(self.path, stop=stop), -1)
+        self.assertEqual(os.listdir(self.dir), ['honeyd.pdf'])
+
+def ccs_script(*values):
+    # the CCS script of an ACM page, with the given 'f' values (as they are
+    # written in the script, quotes included)
+    return ("// CCS&nbsp;for&nbsp;this&nbsp;Article\nvar ccs = [\n"
+        + ",\n".join(["  { f: %s, w: 0, c: [] }" % (value) for value in values])
+        + "\n];\nccs_tree(\"ccs_tree\", ccs);\n")
+
+def ccs_page(script):
+    return '<html><body><div><script type="text/javascript">\n%s</script></div></body></html>' % (script)
+
+SECURITY = r"""'<a href="ccs.cfm?id=10002978&lid=0.10002978">Security and privacy<\/a>'"""
+NETWORK_SECURITY = r"""'<a href="ccs.cfm?id=10003014&lid=0.10002978.10003014">Network security<\/a>'"""
+
+@unittest.skipIf(leonardo is None, "requires leonardo.py (python 2)")
+class AcmCcsLinksTest(unittest.TestCase):
+
+    def fixtures(self):
+        acm_dir = os.path.join(FIXTURES_DIR, 'acm')
+        for name in sorted(os.listdir(acm_dir)):
+            with open(os.path.join(acm_dir, name), 'rb') as page_file:
+                yield name, page_file.read().decode('utf-8')
+
+    def assertFallback(self, script):
+        # the fast path gives up, and the js2xml fallback gets them all
+        self.assertEqual(leonardo.acm_ccs_links_regex(script), None)
+        self.assertNotEqual(leonardo.acm_ccs_links_js2xml(script), [])
+        self.assertEqual(leonardo.parse_acm_taxonomy(ccs_page(script)).to_list("0"),
+            leonardo.parse_acm_taxonomy(ccs_page(script), fast=False).to_list("0"))
+
+    def test_fixtures(self):
+        for name, page in self.fixtures():
+            script = leonardo.acm_ccs_script(page)
+            links = leonardo.acm_ccs_links_regex(script)
+            self.assertTrue(links, name)
+            self.assertEqual(links, leonardo.acm_ccs_links_js2xml(script), name)
+            self.assertEqual(leonardo.parse_acm_taxonomy(page).to_list("0"),
+                leonardo.parse_acm_taxonomy(page, fast=False).to_list("0"), name)
+
+    def test_quotes(self):
+        # double quoted, with escaped quotes inside
+        double = r'''"<a href=\"ccs.cfm?id=10002978&lid=0.10002978\">Security and privacy<\/a>"'''
+        script = ccs_script(double, NETWORK_SECURITY)
+        links = leonardo.acm_ccs_links_regex(script)
+        self.assertEqual(links[0], ('Security and privacy', 'ccs.cfm?id=10002978&lid=0.10002978'))
+        self.assertEqual(links, leonardo.acm_ccs_links_js2xml(script))
+
+    def test_no_links(self):
+        self.assertEqual(leonardo.acm_ccs_links_regex(ccs_script()), None)
+
+    def test_escapes(self):
+        self.assertFallback(ccs_script(SECURITY.replace('Security and', r'Security\x20and'), NETWORK_SECURITY))
+        self.assertFallback(ccs_script(SECURITY, NETWORK_SECURITY.replace('Network security', r'Network\nsecurity')))
+        self.assertFallback(ccs_script(SECURITY.replace('&lid', r'\u0026lid'), NETWORK_SECURITY))
+
+    def test_entities(self):
+        self.assertFallback(ccs_script(SECURITY.replace('Security and', 'Security &amp;'), NETWORK_SECURITY))
+        self.assertFallback(ccs_script(SECURITY.replace('&lid', '&#38;lid'), NETWORK_SECURITY))
+
+    def test_markup_in_names(self):
+        self.assertFallback(ccs_script(SECURITY.replace('Security and', '<b>Security<\\/b> and'), NETWORK_SECURITY))
+
+    def test_partial_scripts(self):
+        # a link the properties regex can't see all of, or one outside of
+        # an 'f' property
+        split = SECURITY.replace('">', '">\' + \'')
+        self.assertFallback(ccs_script(split, NETWORK_SECURITY))
+        script = ccs_script(SECURITY, NETWORK_SECURITY).replace('w: 0', 'w: 0, g: \'<a href="ccs.cfm?id=1&lid=0.1">x<\\/a>\'', 1)
+        self.assertEqual(leonardo.acm_ccs_links_regex(script), None)
+
+if __name__ == '__main__':
+    unittest.main()
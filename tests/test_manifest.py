@@ -0,0 +1,91 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from manifest import ConversionManifest
+
+SETTINGS = {'codec': 'utf-8', 'caching': True}
+
+class ConversionManifestTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.pdf = os.path.join(self.dir, 'paper.pdf')
+        self.txt = os.path.join(self.dir, 'paper.txt')
+        self.write(self.pdf, b'%PDF-1.4 original')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, path, data):
+        with open(path, 'wb') as f:
+            f.write(data)
+
+    def convert(self, manifest, text=b'some text'):
+        self.write(self.txt, text)
+        return manifest.record(self.pdf, ConversionManifest.OK)
+
+    def reload(self, manifest, settings=SETTINGS):
+        manifest.save()
+        return ConversionManifest(self.dir, settings)
+
+    def test_new_file(self):
+        self.assertTrue(ConversionManifest(self.dir, SETTINGS).needs_conversion(self.pdf))
+
+    def test_up_to_date(self):
+        manifest = ConversionManifest(self.dir, SETTINGS)
+        self.assertEqual(self.convert(manifest), ConversionManifest.OK)
+        self.assertFalse(self.reload(manifest).needs_conversion(self.pdf))
+
+    def test_empty_text_is_not_reconverted(self):
+        manifest = ConversionManifest(self.dir, SETTINGS)
+        self.assertEqual(self.convert(manifest, b''), ConversionManifest.EMPTY)
+        self.assertFalse(self.reload(manifest).needs_conversion(self.pdf))
+
+    def test_failed(self):
+        manifest = ConversionManifest(self.dir, SETTINGS)
+        manifest.record(self.pdf, ConversionManifest.FAILED, 'boom')
+        self.assertTrue(self.reload(manifest).needs_conversion(self.pdf))
+
+    def test_settings_changed(self):
+        manifest = ConversionManifest(self.dir, SETTINGS)
+        self.convert(manifest)
+        self.assertTrue(self.reload(manifest, dict(SETTINGS, codec='latin-1')).needs_conversion(self.pdf))
+
+    def test_txt_missing_or_changed(self):
+        manifest = ConversionManifest(self.dir, SETTINGS)
+        self.convert(manifest)
+        self.write(self.txt, b'short')
+        self.assertTrue(manifest.needs_conversion(self.pdf))
+        os.remove(self.txt)
+        self.assertTrue(manifest.needs_conversion(self.pdf))
+
+    def test_pdf_touched_but_unchanged(self):
+        manifest = ConversionManifest(self.dir, SETTINGS)
+        self.convert(manifest)
+        stat = os.stat(self.pdf)
+        os.utime(self.pdf, (stat.st_atime, stat.st_mtime + 10))
+        self.assertFalse(manifest.needs_conversion(self.pdf))
+
+    def test_pdf_changed(self):
+        manifest = ConversionManifest(self.dir, SETTINGS)
+        self.convert(manifest)
+        stat = os.stat(self.pdf)
+        self.write(self.pdf, b'%PDF-1.4 modified')
+        os.utime(self.pdf, (stat.st_atime, stat.st_mtime + 10))
+        self.assertTrue(manifest.needs_conversion(self.pdf))
+
+    def test_prune(self):
+        manifest = ConversionManifest(self.dir, SETTINGS)
+        self.convert(manifest)
+        os.remove(self.pdf)
+        manifest.prune()
+        self.assertEqual(manifest.entries, {})
+
+    def test_corrupt_manifest(self):
+        self.write(os.path.join(self.dir, ConversionManifest.FILENAME), b'{not json')
+        self.assertTrue(ConversionManifest(self.dir, SETTINGS).needs_conversion(self.pdf))
+
+if __name__ == '__main__':
+    unittest.main()
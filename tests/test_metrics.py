@@ -0,0 +1,146 @@
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+import subprocess
+
+import metrics
+from metrics import Metrics, url_host
+
+class FakeClock(object):
+
+    def __init__(self, now=1000000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+class MetricsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.clock = FakeClock()
+        self.time = metrics.time
+        metrics.time = self.clock
+
+    def tearDown(self):
+        metrics.time = self.time
+        shutil.rmtree(self.dir)
+
+    def run_stages(self):
+        m = Metrics()
+        m.record('download', 'a.org', 0.02, 1000)
+        m.record('download', 'a.org', 0.7, 3000)
+        m.record('download', 'b.org', 200.0, 0, error=True)
+
+        with m.span('download'):
+            self.clock.now += 201.0
+
+        with m.timer('acm', 'dl.acm.org') as timer:
+            timer.nbytes = 512
+            self.clock.now += 0.3
+
+        try:
+            with m.timer('acm', 'dl.acm.org'):
+                raise IOError("timed out")
+        except IOError:
+            pass
+
+        self.clock.now += 0.7
+        return m
+
+    def families(self, text):
+        # {metric name: [(labels, value)]}, of the sample lines
+        samples = {}
+        for line in text.splitlines():
+            if line.startswith('#'):
+                continue
+            name_labels, value = line.rsplit(' ', 1)
+            name, _, labels = name_labels.partition('{')
+            samples.setdefault(name, []).append((labels.rstrip('}'), value))
+        return samples
+
+    def test_url_host(self):
+        self.assertEqual(url_host('http://DL.acm.org:8080/citation.cfm?id=1'), 'dl.acm.org:8080')
+
+    def test_as_dict(self):
+        stages = self.run_stages().as_dict()['stages']
+
+        download = stages['download']
+        self.assertEqual((download['count'], download['errors'], download['bytes']), (3, 1, 4000))
+        self.assertEqual(download['wall_seconds'], 201.0)
+        self.assertEqual(download['max_seconds'], 200.0)
+        self.assertEqual(download['hosts']['a.org']['count'], 2)
+
+        acm = stages['acm']
+        self.assertEqual((acm['count'], acm['errors'], acm['bytes']), (2, 1, 512))
+        self.assertEqual(acm['wall_seconds'], None)
+
+    def test_prometheus(self):
+        text = self.run_stages().prometheus()
+        self.assertTrue(text.endswith('\n'))
+
+        lines = text.splitlines()
+        for name, kind in [('stage_operations_total', 'counter'), ('stage_errors_total', 'counter'),
+                ('stage_bytes_total', 'counter'), ('stage_seconds', 'histogram'),
+                ('stage_wall_seconds', 'gauge'), ('run_seconds', 'gauge'), ('run_start_timestamp_seconds', 'gauge')]:
+            self.assertEqual(lines.count('# TYPE leonardo_%s %s' % (name, kind)), 1, name)
+            self.assertEqual(len([l for l in lines if l.startswith('# HELP leonardo_%s ' % (name))]), 1, name)
+
+        samples = self.families(text)
+        self.assertTrue(('host="a.org",stage="download"', '2') in samples['leonardo_stage_operations_total'])
+        self.assertTrue(('host="b.org",stage="download"', '1') in samples['leonardo_stage_errors_total'])
+        self.assertTrue(('host="dl.acm.org",stage="acm"', '512') in samples['leonardo_stage_bytes_total'])
+        self.assertEqual(samples['leonardo_stage_wall_seconds'], [('stage="download"', '201.0')])
+        self.assertEqual(samples['leonardo_run_seconds'], [('', '202.0')])
+        self.assertEqual(samples['leonardo_run_start_timestamp_seconds'], [('', '1000000.0')])
+
+    def test_prometheus_histogram(self):
+        samples = self.families(self.run_stages().prometheus())
+
+        # cumulative, one bucket per bound plus +Inf, all ascending
+        buckets = [(labels, int(value)) for labels, value in samples['leonardo_stage_seconds_bucket']
+            if labels.startswith('host="a.org",')]
+        self.assertEqual(len(buckets), len(Metrics.BUCKETS) + 1)
+        self.assertEqual(buckets[0], ('host="a.org",le="0.01",stage="download"', 0))
+        self.assertEqual(buckets[1], ('host="a.org",le="0.025",stage="download"', 1))
+        self.assertEqual(buckets[-1], ('host="a.org",le="+Inf",stage="download"', 2))
+        counts = [count for _, count in buckets]
+        self.assertEqual(counts, sorted(counts))
+
+        # past the last bound
+        self.assertTrue(('host="b.org",le="120.0",stage="download"', '0') in samples['leonardo_stage_seconds_bucket'])
+        self.assertTrue(('host="b.org",le="+Inf",stage="download"', '1') in samples['leonardo_stage_seconds_bucket'])
+
+        self.assertTrue(('host="a.org",stage="download"', '2') in samples['leonardo_stage_seconds_count'])
+        sums = dict(samples['leonardo_stage_seconds_sum'])
+        self.assertAlmostEqual(float(sums['host="a.org",stage="download"']), 0.72)
+
+    def test_prometheus_labels_escaped(self):
+        m = Metrics()
+        m.record('query', 'bad"host\\\n')
+        self.assertTrue('host="bad\\"host\\\\\\n"' in m.prometheus())
+
+    def test_dumps(self):
+        m = self.run_stages()
+        json_path = os.path.join(self.dir, 'metrics.json')
+        prom_path = os.path.join(self.dir, 'metrics.prom')
+        m.dump_json(json_path)
+        m.dump_prometheus(prom_path)
+
+        with open(json_path) as json_file:
+            self.assertEqual(json.load(json_file)['stages']['download']['count'], 3)
+        with open(prom_path) as prom_file:
+            self.assertEqual(prom_file.read(), m.prometheus())
+        self.assertEqual(sorted(os.listdir(self.dir)), ['metrics.json', 'metrics.prom'])
+
+    def test_no_scholar_import(self):
+        # metrics.py must not need scholar.py (nor bs4)
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        output = subprocess.check_output([sys.executable, '-c', "import sys, metrics; print('scholar' in sys.modules)"], cwd=root)
+        self.assertEqual(output.strip(), b'False')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,145 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from resolver import Resolver, ResolverCache, Rule, AcmRule, default_rules
+
+ACM_PAGE = b'<html><body><a name="FullTextPDF" href="ft_gateway.cfm?id=972384&amp;type=pdf">PDF</a></body></html>'
+META_PAGE = b'<html><head><meta name="citation_pdf_url" content="/content/paper.pdf"></head><body></body></html>'
+LINK_PAGE = b'<html><body><a href="/about">about</a> <a href="files/paper.PDF?download=1">full text</a></body></html>'
+
+class FakeResponse(object):
+
+    def __init__(self, url, body):
+        self.url = url
+        self.body = body
+
+    def geturl(self):
+        return self.url
+
+    def read(self):
+        return self.body
+
+class FakeTransport(object):
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.requests = []
+
+    def open(self, url):
+        self.requests.append(url)
+        if url not in self.pages:
+            raise IOError("HTTP Error 403: Forbidden")
+        return FakeResponse(url, self.pages[url])
+
+class ExampleRule(Rule):
+
+    name = 'example'
+    hosts = ['example.org']
+
+    def rewrite(self, url):
+        return url + '.pdf'
+
+class ResolverTest(unittest.TestCase):
+
+    def test_rewrite_rules(self):
+        transport = FakeTransport({})
+        resolver = Resolver(transport)
+        self.assertEqual(resolver.resolve('http://arxiv.org/abs/1234.5678'), 'http://arxiv.org/pdf/1234.5678')
+        self.assertEqual(resolver.resolve('http://link.springer.com/chapter/10.1007/11663812_9'),
+            'http://link.springer.com/content/pdf/10.1007/11663812_9.pdf')
+        self.assertEqual(transport.requests, [])
+
+    def test_generic_rules(self):
+        transport = FakeTransport({'http://a.org/paper': META_PAGE, 'http://b.org/paper': LINK_PAGE})
+        resolver = Resolver(transport)
+        self.assertEqual(resolver.resolve('http://a.org/paper'), 'http://a.org/content/paper.pdf')
+        self.assertEqual(resolver.resolve('http://b.org/paper'), 'http://b.org/files/paper.PDF?download=1')
+
+    def test_failures(self):
+        resolver = Resolver(FakeTransport({'http://a.org/empty': b'<html></html>'}))
+        self.assertEqual(resolver.resolve_all(['http://a.org/empty', 'http://a.org/forbidden']),
+            {'http://a.org/empty': None, 'http://a.org/forbidden': None})
+        self.assertEqual(resolver.stats['unresolved'], 1)
+        self.assertEqual(resolver.stats['failed'], 1)
+
+    def test_no_library_proxy_by_default(self):
+        url = 'http://dl.acm.org/citation.cfm?id=972384'
+        transport = FakeTransport({url: ACM_PAGE})
+        resolver = Resolver(transport)
+
+        self.assertEqual(resolver.page_url(url), url)
+        self.assertEqual(resolver.resolve(url), 'http://dl.acm.org/ft_gateway.cfm?id=972384&type=pdf')
+        self.assertEqual(transport.requests, [url])
+
+    def test_library_proxy(self):
+        url = 'http://dl.acm.org/citation.cfm?id=972384'
+        proxied = 'http://dl.acm.org.proxy.library.cmu.edu/citation.cfm?id=972384'
+        transport = FakeTransport({proxied: ACM_PAGE})
+        resolver = Resolver(transport, proxy={'dl.acm.org': 'dl.acm.org.proxy.library.cmu.edu'})
+
+        self.assertEqual(resolver.page_url(url), proxied)
+        self.assertEqual(resolver.resolve(url), 'http://dl.acm.org.proxy.library.cmu.edu/ft_gateway.cfm?id=972384&type=pdf')
+        self.assertEqual(transport.requests, [proxied])
+
+        # resolvers don't share proxies
+        self.assertEqual(Resolver(transport).page_url(url), url)
+
+    def test_fetched_pages_reused(self):
+        url = 'http://dl.acm.org/citation.cfm?id=972384'
+        transport = FakeTransport({})
+        resolver = Resolver(transport)
+
+        self.assertEqual(resolver.resolve_all([url], pages={url: ACM_PAGE}),
+            {url: 'http://dl.acm.org/ft_gateway.cfm?id=972384&type=pdf'})
+        self.assertEqual(transport.requests, [])
+
+    def test_rules_passed_in(self):
+        transport = FakeTransport({})
+        resolver = Resolver(transport, rules=[ExampleRule()] + default_rules())
+        self.assertEqual(resolver.resolve('http://example.org/paper'), 'http://example.org/paper.pdf')
+        self.assertEqual(resolver.resolve('http://arxiv.org/abs/1234.5678'), 'http://arxiv.org/pdf/1234.5678')
+
+        # other resolvers don't get them
+        self.assertEqual(Resolver(transport).resolve('http://example.org/paper'), None)
+
+    def test_acm_rule_copies_proxy(self):
+        proxy = {'dl.acm.org': 'proxy.example.edu'}
+        rule = AcmRule(proxy)
+        proxy.clear()
+        self.assertEqual(rule.page_url('http://dl.acm.org/citation.cfm?id=1'), 'http://proxy.example.edu/citation.cfm?id=1')
+
+class ResolverCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.cache = ResolverCache(os.path.join(self.dir, 'resolved.db'))
+
+    def tearDown(self):
+        self.cache.close()
+        shutil.rmtree(self.dir)
+
+    def test_cached(self):
+        url = 'http://a.org/paper'
+        transport = FakeTransport({url: META_PAGE})
+
+        Resolver(transport, cache=self.cache).resolve(url)
+        resolver = Resolver(transport, cache=self.cache)
+        self.assertEqual(resolver.resolve(url), 'http://a.org/content/paper.pdf')
+        self.assertEqual(resolver.stats['cached'], 1)
+        self.assertEqual(transport.requests, [url])
+
+    def test_keyed_by_proxy(self):
+        # a miss without the proxy doesn't stick to runs with it
+        url = 'http://dl.acm.org/citation.cfm?id=972384'
+        proxied = 'http://proxy.example.edu/citation.cfm?id=972384'
+        transport = FakeTransport({url: b'<html></html>', proxied: ACM_PAGE})
+
+        self.assertEqual(Resolver(transport, cache=self.cache).resolve(url), None)
+        resolver = Resolver(transport, cache=self.cache, proxy={'dl.acm.org': 'proxy.example.edu'})
+        self.assertEqual(resolver.resolve(url), 'http://proxy.example.edu/ft_gateway.cfm?id=972384&type=pdf')
+        self.assertEqual(resolver.stats['cached'], 0)
+
+if __name__ == '__main__':
+    unittest.main()
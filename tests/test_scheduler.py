@@ -0,0 +1,95 @@
+import time
+import unittest
+
+from scheduler import RateLimiter
+
+class FakeResponse(object):
+
+    def __init__(self, url, status_code=200, body=b'', content_type='text/html; charset=utf-8', headers=None):
+        self.url = url
+        self.status_code = status_code
+        self.content = body
+        self.headers = {'Content-Type': content_type}
+        self.headers.update(headers or {})
+
+class RateLimiterCheckTest(unittest.TestCase):
+
+    def setUp(self):
+        self.limiter = RateLimiter(jitter=0.0)
+
+    def test_ok(self):
+        response = FakeResponse('https://scholar.google.com/scholar?q=x', body=b'<html>results</html>')
+        self.assertEqual(self.limiter.check(response), RateLimiter.OK)
+
+    def test_google_sorry_page(self):
+        response = FakeResponse('https://ipv4.google.com/sorry/index?continue=x', status_code=503)
+        self.assertEqual(self.limiter.check(response, host='scholar.google.com'), RateLimiter.BLOCKED)
+
+    def test_google_captcha_body(self):
+        for body in [b'Our systems have detected unusual traffic', b'<div id="gs_captcha_ccl">', b'<div class="g-recaptcha">']:
+            response = FakeResponse('https://scholar.google.de/scholar?q=x', body=body)
+            self.assertEqual(self.limiter.check(response), RateLimiter.BLOCKED)
+
+    def test_googleusercontent(self):
+        response = FakeResponse('http://scholar.googleusercontent.com/scholar.bib?q=x', body=b'<div class="g-recaptcha">')
+        self.assertEqual(self.limiter.check(response), RateLimiter.BLOCKED)
+
+    def test_publisher_recaptcha_widget(self):
+        # e.g. a login form on a publisher page
+        response = FakeResponse('http://dl.acm.org/citation.cfm?id=1', body=b'<form><div class="g-recaptcha"></div></form>')
+        self.assertEqual(self.limiter.check(response, host='dl.acm.org'), RateLimiter.OK)
+
+    def test_publisher_captcha_path(self):
+        response = FakeResponse('http://example.org/papers/captcha-solving.pdf', content_type='application/pdf')
+        self.assertEqual(self.limiter.check(response, host='example.org'), RateLimiter.OK)
+
+    def test_not_google(self):
+        for host in ['google.com.example.org', 'notscholar.google.com.evil.org', 'example.org']:
+            self.assertFalse(RateLimiter.is_google(host), host)
+        for host in ['scholar.google.com', 'scholar.google.co.uk', 'ipv4.google.com', 'scholar.googleusercontent.com', 'scholar.google.com:443']:
+            self.assertTrue(RateLimiter.is_google(host), host)
+
+    def test_throttled(self):
+        for url in ['http://dl.acm.org/citation.cfm?id=1', 'https://scholar.google.com/scholar?q=x']:
+            for status in (429, 503):
+                self.assertEqual(self.limiter.check(FakeResponse(url, status_code=status)), RateLimiter.THROTTLED)
+
+    def test_streamed_body_not_inspected(self):
+        response = FakeResponse('https://scholar.google.com/scholar?q=x', body=b'detected unusual traffic')
+        self.assertEqual(self.limiter.check(response, inspect_body=False), RateLimiter.OK)
+
+class RateLimiterBudgetTest(unittest.TestCase):
+
+    def test_burst_then_wait(self):
+        limiter = RateLimiter(rates={'example.org': (2.0, 2)}, jitter=0.0)
+        self.assertEqual(limiter.reserve('example.org'), 0.0)
+        self.assertEqual(limiter.reserve('example.org'), 0.0)
+        wait = limiter.reserve('example.org')
+        self.assertTrue(0.0 < wait <= 0.5, wait)
+
+    def test_backoff_and_retry_after(self):
+        limiter = RateLimiter(jitter=0.0)
+        response = FakeResponse('http://example.org/x', status_code=429, headers={'Retry-After': '120'})
+        self.assertEqual(limiter.report('example.org', response), RateLimiter.THROTTLED)
+        self.assertTrue(110.0 < limiter.reserve('example.org') <= 120.0)
+
+        # a good response resets the failures, not the pending backoff
+        self.assertEqual(limiter.report('example.org', FakeResponse('http://example.org/y')), RateLimiter.OK)
+        self.assertTrue(limiter.reserve('example.org') > 0.0)
+
+    def test_cooldown(self):
+        limiter = RateLimiter(jitter=0.0, cooldown=600.0)
+        response = FakeResponse('https://scholar.google.com/scholar?q=x', body=b'detected unusual traffic')
+        self.assertEqual(limiter.report('scholar.google.com', response), RateLimiter.BLOCKED)
+        self.assertTrue(590.0 < limiter.reserve('scholar.google.com') <= 600.0)
+        # other hosts aren't affected
+        self.assertEqual(limiter.reserve('dl.acm.org'), 0.0)
+
+    def test_blocked_publisher_page_not_cooled_down(self):
+        limiter = RateLimiter(jitter=0.0, cooldown=600.0)
+        response = FakeResponse('http://ieeexplore.ieee.org/document/1', body=b'<div class="g-recaptcha">')
+        self.assertEqual(limiter.report('ieeexplore.ieee.org', response), RateLimiter.OK)
+        self.assertEqual(limiter.reserve('ieeexplore.ieee.org'), 0.0)
+
+if __name__ == '__main__':
+    unittest.main()
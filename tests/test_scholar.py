@@ -0,0 +1,73 @@
+import os
+import unittest
+
+try:
+    from html import unescape
+except ImportError:
+    from HTMLParser import HTMLParser
+    unescape = HTMLParser().unescape
+
+try:
+    import lxml
+except ImportError:
+    lxml = None
+
+from scholar import ScholarArticle, ScholarQuerier, SearchScholarQuery
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'fixtures')
+
+def results_page(nr_results):
+    # a results page with links, .pdf links and [CITATION] titles, with and
+    # without citations, versions and excerpts
+    results = []
+    for i in range(nr_results):
+        if i % 3 == 2:
+            h3 = ('<h3 class="gs_rt"><span class="gs_ctu"><span class="gs_ct1">[CITATION]</span>'
+                  '<span class="gs_ct2">[C]</span></span> <b>Honeypot</b> citation %d</h3>' % (i))
+        else:
+            h3 = ('<h3 class="gs_rt"><a href="http://example.org/article%d%s"><b>Honeypot</b> article %d</a></h3>'
+                  % (i, ".pdf" if i % 3 == 0 else "", i))
+
+        pdf = '<div class="gs_ggs gs_fl"><div class="gs_ttss"><a href="http://example.org/%d.pdf">[PDF] example.org</a></div></div>' % (i)
+        links = '<a href="/scholar?q=related:x%d:scholar.google.com/">Related articles</a> ' % (i)
+        if i % 4 != 3:
+            links += ('<a href="/scholar?cites=%d&amp;as_sdt=2005&amp;hl=en">Cited by %d</a> '
+                '<a href="/scholar?cluster=%d&amp;hl=en">All %d versions</a> ' % (100000 + i, i * 7, 100000 + i, 1 + (i % 9)))
+
+        results.append('<div class="gs_r">%s<div class="gs_ri">%s'
+            '<div class="gs_a">A Author, B Author - Some Conference, %d - example.org</div>'
+            '%s<div class="gs_fl">%s<a href="/scholar.bib?q=info:x%d:scholar.google.com/&amp;output=citation">Import into BibTeX</a></div>'
+            '</div></div>' % (pdf if i % 2 else '', h3, 1990 + (i % 25),
+                '<div class="gs_rs">An excerpt\nwith <b>highlighted</b> words %d</div>' % (i) if i % 5 else '', links, i))
+
+    return ('<html><body><div id="gs_ab_md">About 1,%03d results (<b>0.05</b> sec)</div>%s</body></html>'
+        % (nr_results, ''.join(results))).encode('utf-8')
+
+def unescaped(articles):
+    # BeautifulSoup 3 leaves HTML entities in text as-is
+    return [[unescape(value) if isinstance(value, type(u'')) else value for value in art] for art in articles]
+
+def parse(parser, page):
+    querier = ScholarQuerier(parser=parser)
+    querier.query = SearchScholarQuery()
+    querier.parse(page)
+    return querier.query['num_results'], [[art[key] for key, _, _ in ScholarArticle.SCHEMA] for art in querier.articles]
+
+@unittest.skipIf(lxml is None, "requires lxml")
+class LxmlParserTest(unittest.TestCase):
+
+    def assertSameArticles(self, page, nr_articles):
+        num_results, articles = parse('lxml', page)
+        self.assertEqual(len(articles), nr_articles)
+        bs_num_results, bs_articles = parse('bs', page)
+        self.assertEqual((num_results, articles), (bs_num_results, unescaped(bs_articles)))
+
+    def test_fixture(self):
+        with open(os.path.join(FIXTURES_DIR, 'scholar', 'honeypots.html'), 'rb') as page_file:
+            self.assertSameArticles(page_file.read(), 10)
+
+    def test_synthetic_page(self):
+        self.assertSameArticles(results_page(60), 60)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from scholar import ScholarArticle
+from store import ArticleStore, normalize_title
+
+def article(title, url=None, cluster_id=None, year=None, num_citations=None):
+    art = ScholarArticle()
+    art['title'] = title
+    art['url'] = url
+    art['cluster_id'] = cluster_id
+    art['year'] = year
+    art['num_citations'] = num_citations
+    return art
+
+class ArticleStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.store = ArticleStore(os.path.join(self.dir, 'articles.db'))
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.dir)
+
+    def stored(self):
+        return dict([(art['title'], art) for art in self.store.load()])
+
+    def test_normalize_title(self):
+        self.assertEqual(normalize_title("Honeycomb: Creating  Intrusion-Detection Signatures"),
+            "honeycomb creating intrusion detection signatures")
+        self.assertEqual(normalize_title(None), None)
+
+    def test_insert_and_dedupe(self):
+        self.assertEqual(self.store.add_articles([article("Honeycomb", cluster_id="1"), article("Honeyd", url="http://a.org/honeyd")]), 2)
+        # same cluster id, same url, same title (any year)
+        self.assertEqual(self.store.add_articles([article("Honeycomb", url="http://b.org/hc", cluster_id="1"),
+            article("Honeyd", url="http://a.org/honeyd"), article("honeycomb!", year="2004")]), 0)
+        self.assertEqual(self.store.count(), 2)
+
+    def test_none_never_overwrites(self):
+        self.store.add_articles([article("Honeycomb", cluster_id="1", year="2004", num_citations=10)])
+        self.store.add_articles([article("Honeycomb", cluster_id="1", num_citations=12)])
+
+        stored = self.stored()["Honeycomb"]
+        self.assertEqual(stored['year'], "2004")
+        self.assertEqual(stored['num_citations'], 12)
+
+    def test_cluster_id_never_overwritten(self):
+        # matched by url, with the cluster id of another version
+        self.store.add_articles([article("Honeycomb", url="http://a.org/hc", cluster_id="1")])
+        self.assertEqual(self.store.add_articles([article("Honeycomb", url="http://a.org/hc", cluster_id="2", num_citations=5)]), 0)
+
+        stored = self.stored()["Honeycomb"]
+        self.assertEqual(stored['cluster_id'], "1")
+        self.assertEqual(stored['num_citations'], 5)
+
+    def test_cluster_id_filled_in(self):
+        self.store.add_articles([article("Honeycomb", url="http://a.org/hc")])
+        self.store.add_articles([article("Honeycomb", url="http://a.org/hc", cluster_id="1")])
+        self.assertEqual(self.stored()["Honeycomb"]['cluster_id'], "1")
+
+    def test_cluster_id_matches_first(self):
+        self.store.add_articles([article("Honeycomb", cluster_id="1"), article("Honeyd", url="http://a.org/honeyd")])
+        # the url is Honeyd's, the cluster id Honeycomb's
+        self.assertEqual(self.store.add_articles([article("Honeycomb", url="http://a.org/honeyd", cluster_id="1", num_citations=3)]), 0)
+
+        stored = self.stored()
+        self.assertEqual(stored["Honeycomb"]['num_citations'], 3)
+        self.assertEqual(stored["Honeyd"]['cluster_id'], None)
+
+    def test_load_filters(self):
+        self.store.add_articles([article("A", year="2001"), article("B", year="2005"), article("C")])
+        self.assertEqual(sorted(self.stored()), ["A", "B", "C"])
+        self.assertEqual([art['title'] for art in self.store.load(year_from=2003)], ["B"])
+        self.assertEqual(len(self.store.load(limit=2)), 2)
+
+    def test_pdf_paths(self):
+        honeycomb = article("Honeycomb", cluster_id="1")
+        self.store.add_articles([honeycomb])
+        self.assertEqual(self.store.pdf_path(honeycomb), None)
+
+        self.store.set_pdf_paths([(honeycomb, "/tmp/honeycomb.pdf")])
+        self.assertEqual(self.store.pdf_path(article("Honeycomb, again", cluster_id="1")), "/tmp/honeycomb.pdf")
+
+if __name__ == '__main__':
+    unittest.main()
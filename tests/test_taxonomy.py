@@ -0,0 +1,192 @@
+import os
+import json
+import zlib
+import shutil
+import tempfile
+import unittest
+
+from tree import Tree
+from taxonomy import TaxonomyCache, acm_id
+
+ACM_URL = 'http://dl.acm.org/citation.cfm?id=%s'
+PROXY_URL = 'http://dl.acm.org.proxy.library.cmu.edu/citation.cfm?doid=972374.972384&id=%s&preflayout=flat'
+
+def ccs_tree(*paths):
+    # a Tree from the root ("0") down each path of (id, category) pairs, as
+    # parse_acm_taxonomy() builds them
+    tree = Tree()
+    tree.add_node("0")
+    for path in paths:
+        parent = "0"
+        for node, category in path:
+            if node not in tree.nodes:
+                tree.add_node(node, parent, category)
+            parent = node
+    return tree
+
+SECURITY = ("10002978", "Security and privacy")
+INTRUSION = ("10002997", "Intrusion/anomaly detection and malware mitigation")
+MALWARE = ("10002998", "Malware and its mitigation")
+NETWORKS = ("10003033", "Networks")
+PROTOCOLS = ("10003039", "Network protocols")
+
+class TaxonomyCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'taxonomies.db')
+        self.cache = TaxonomyCache(self.path)
+
+    def tearDown(self):
+        self.cache.close()
+        shutil.rmtree(self.dir)
+
+    def test_acm_id(self):
+        self.assertEqual(acm_id(ACM_URL % '972384'), '972384')
+        self.assertEqual(acm_id(PROXY_URL % '972384'), '972384')
+        self.assertEqual(acm_id(ACM_URL % '1251375.1251386'), '1251375.1251386')
+        self.assertEqual(acm_id('http://dl.acm.org/ft_gateway.cfm?id=972384&type=pdf'), None)
+        self.assertEqual(acm_id('http://example.org/paper?id=1'), None)
+
+    def test_round_trip(self):
+        tree = ccs_tree([SECURITY, INTRUSION, MALWARE], [NETWORKS, PROTOCOLS])
+        self.assertTrue(self.cache.put(ACM_URL % '972384', tree))
+
+        cached = self.cache.get(ACM_URL % '972384')
+        self.assertEqual(cached.to_list("0"), tree.to_list("0"))
+        self.assertEqual(cached.parent(MALWARE[0]), INTRUSION[0])
+        self.assertEqual(cached[PROTOCOLS[0]].category, PROTOCOLS[1])
+
+        # stored as zlib-compressed json
+        blob = self.cache.db.execute("SELECT tree FROM taxonomies WHERE acm_id = '972384'").fetchone()[0]
+        self.assertEqual(json.loads(zlib.decompress(bytes(blob)).decode('utf-8')), tree.to_list("0"))
+
+    def test_keyed_by_article_id(self):
+        self.cache.put(ACM_URL % '972384', ccs_tree([SECURITY]))
+
+        # through the library proxy, or with other arguments
+        self.assertNotEqual(self.cache.get(PROXY_URL % '972384'), None)
+        self.assertEqual(self.cache.get(PROXY_URL % '972385'), None)
+
+        # no id, nothing to key it by
+        self.assertFalse(self.cache.put('http://example.org/paper', ccs_tree([SECURITY])))
+        self.assertEqual(self.cache.get('http://example.org/paper'), None)
+        self.assertEqual(self.cache.count(), 1)
+
+    def test_stored_between_runs(self):
+        self.cache.put(ACM_URL % '972384', ccs_tree([SECURITY]))
+        self.cache.close()
+
+        self.cache = TaxonomyCache(self.path)
+        self.assertEqual(self.cache.get(ACM_URL % '972384').to_list("0"), ccs_tree([SECURITY]).to_list("0"))
+
+    def test_refresh(self):
+        self.cache.put(ACM_URL % '972384', ccs_tree([SECURITY]))
+        self.cache.close()
+
+        # always misses, but stores
+        self.cache = TaxonomyCache(self.path, refresh=True)
+        self.assertEqual(self.cache.get(ACM_URL % '972384'), None)
+        self.cache.put(ACM_URL % '972384', ccs_tree([NETWORKS]))
+        self.assertEqual(self.cache.get(ACM_URL % '972384'), None)
+        self.assertEqual(self.cache.stats, {'hits': 0, 'misses': 2, 'stores': 1})
+
+        self.cache.refresh = False
+        self.assertEqual(self.cache.get(ACM_URL % '972384').to_list("0"), ccs_tree([NETWORKS]).to_list("0"))
+
+    def test_stats(self):
+        self.assertEqual(self.cache.get(ACM_URL % '972384'), None)
+        self.cache.put(ACM_URL % '972384', ccs_tree([SECURITY]))
+        self.cache.put('http://example.org/paper', ccs_tree([SECURITY]))
+        self.cache.get(ACM_URL % '972384')
+        self.cache.get(PROXY_URL % '972384')
+        self.cache.get('http://example.org/paper')
+
+        self.assertEqual(self.cache.stats, {'hits': 2, 'misses': 2, 'stores': 1})
+
+class MergedTaxonomyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'taxonomies.db')
+        self.cache = TaxonomyCache(self.path)
+
+        # 1 and 2 on malware, 3 on intrusion detection and networks, 4 on
+        # networks only
+        self.cache.put(ACM_URL % '1', ccs_tree([SECURITY, INTRUSION, MALWARE]))
+        self.cache.put(ACM_URL % '2', ccs_tree([SECURITY, INTRUSION, MALWARE]))
+        self.cache.put(ACM_URL % '3', ccs_tree([SECURITY, INTRUSION], [NETWORKS, PROTOCOLS]))
+        self.cache.put(ACM_URL % '4', ccs_tree([NETWORKS]))
+
+    def tearDown(self):
+        self.cache.close()
+        shutil.rmtree(self.dir)
+
+    def counts(self):
+        return dict([(node, self.cache.node_count(node)) for node, _ in [SECURITY, INTRUSION, MALWARE, NETWORKS, PROTOCOLS]])
+
+    def test_node_counts(self):
+        # the articles of a node are those of its subtree
+        self.assertEqual(self.counts(), {SECURITY[0]: 3, INTRUSION[0]: 3, MALWARE[0]: 2, NETWORKS[0]: 2, PROTOCOLS[0]: 1})
+        self.assertEqual(self.cache.node_articles(NETWORKS[0]), ['3', '4'])
+        self.assertEqual(self.cache.node_articles("0"), [])
+
+    def test_put_again_replaces(self):
+        # the same article, through the proxy and classified differently
+        self.cache.put(PROXY_URL % '1', ccs_tree([NETWORKS, PROTOCOLS]))
+        self.cache.put(PROXY_URL % '1', ccs_tree([NETWORKS, PROTOCOLS]))
+
+        self.assertEqual(self.counts(), {SECURITY[0]: 2, INTRUSION[0]: 2, MALWARE[0]: 1, NETWORKS[0]: 3, PROTOCOLS[0]: 2})
+        self.assertEqual(self.cache.count(), 4)
+
+    def test_top_subcategories(self):
+        self.assertEqual(self.cache.top_subcategories(), [(SECURITY[0], SECURITY[1], 3), (NETWORKS[0], NETWORKS[1], 2)])
+        self.assertEqual(self.cache.top_subcategories(k=1), [(SECURITY[0], SECURITY[1], 3)])
+        self.assertEqual(self.cache.top_subcategories(INTRUSION[0]), [(MALWARE[0], MALWARE[1], 2)])
+        self.assertEqual(self.cache.top_subcategories(MALWARE[0]), [])
+
+    def test_result_set(self):
+        # ties in id order, unknown ids ignored
+        self.assertEqual(self.cache.top_subcategories(acm_ids=['3', '4', '99']),
+            [(NETWORKS[0], NETWORKS[1], 2), (SECURITY[0], SECURITY[1], 1)])
+        self.assertEqual(self.cache.node_count(MALWARE[0], acm_ids=['2', '3']), 1)
+        self.assertEqual(self.cache.node_count(MALWARE[0], acm_ids=[]), 0)
+
+        # more ids than sqlite takes as query parameters
+        acm_ids = [str(i) for i in range(1, 5000)]
+        self.assertEqual(self.cache.node_count(SECURITY[0], acm_ids=acm_ids), 3)
+
+        # the result set doesn't stick
+        self.assertEqual(self.cache.node_count(MALWARE[0]), 2)
+
+    def test_category_filled_in(self):
+        self.cache.put(ACM_URL % '5', ccs_tree([SECURITY, ("10002999", "")]))
+        self.cache.put(ACM_URL % '6', ccs_tree([SECURITY, ("10002999", "Intrusion detection systems")]))
+        self.assertEqual(self.cache.merged_tree()["10002999"].category, "Intrusion detection systems")
+
+    def test_merged_tree(self):
+        tree = self.cache.merged_tree()
+        self.assertEqual(sorted(tree.nodes), sorted(["0", SECURITY[0], INTRUSION[0], MALWARE[0], NETWORKS[0], PROTOCOLS[0]]))
+        self.assertEqual(tree.parent(MALWARE[0]), INTRUSION[0])
+        self.assertEqual(tree[PROTOCOLS[0]].category, PROTOCOLS[1])
+        self.assertTrue(tree.is_ancestor(SECURITY[0], MALWARE[0]))
+        self.assertFalse(tree.is_ancestor(NETWORKS[0], MALWARE[0]))
+        self.assertEqual(tree.subtree_size("0"), 6)
+
+    def test_rebuild(self):
+        counts = self.counts()
+        self.cache.rebuild()
+        self.assertEqual(self.counts(), counts)
+
+        # a cache written before the merged taxonomy existed
+        with self.cache.db:
+            self.cache.db.execute("DELETE FROM ccs_articles")
+            self.cache.db.execute("DELETE FROM ccs_nodes")
+        self.cache.close()
+
+        self.cache = TaxonomyCache(self.path)
+        self.assertEqual(self.counts(), counts)
+        self.assertEqual(sorted(self.cache.merged_tree().nodes), sorted(["0", SECURITY[0], INTRUSION[0], MALWARE[0], NETWORKS[0], PROTOCOLS[0]]))
+
+if __name__ == '__main__':
+    unittest.main()
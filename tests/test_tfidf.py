@@ -0,0 +1,109 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+try:
+    import numpy as np
+    from tfidf import TermDocumentMatrix
+except ImportError:
+    # needs numpy and scipy
+    TermDocumentMatrix = None
+
+@unittest.skipIf(TermDocumentMatrix is None, "requires numpy and scipy")
+class TermDocumentMatrixTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.txt_dir = os.path.join(self.dir, 'txt')
+        os.mkdir(self.txt_dir)
+        self.path = os.path.join(self.dir, 'tfidf.npz')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, name, text, mtime=1000000.0):
+        path = os.path.join(self.txt_dir, name)
+        with open(path, 'wb') as txt_file:
+            txt_file.write(text.encode('utf-8'))
+        os.utime(path, (mtime, mtime))
+
+    def names(self, tdm):
+        return [os.path.basename(document) for document in tdm.documents]
+
+    def test_update(self):
+        self.write('honeycomb.txt', "honeypot signatures honeypot")
+        self.write('honeyd.txt', "virtual honeypot framework")
+        self.write('notes.md', "not a document")
+
+        tdm = TermDocumentMatrix(self.path)
+        self.assertEqual(tdm.update(self.txt_dir), (2, 0))
+        self.assertEqual(self.names(tdm), ['honeycomb.txt', 'honeyd.txt'])
+        self.assertEqual(tdm.update(self.txt_dir), (0, 0))
+        self.assertEqual(tdm.matrix.shape, (2, len(tdm.terms)))
+
+    def test_changed_files_replaced(self):
+        self.write('honeycomb.txt', "honeypot signatures")
+        self.write('honeyd.txt', "virtual honeypot")
+        self.write('malware.txt', "worm signatures")
+        tdm = TermDocumentMatrix(self.path)
+        tdm.update(self.txt_dir)
+        tdm.save()
+
+        # a new size with the same mtime, or the other way around
+        self.write('honeycomb.txt', "honeypot signatures worm")
+        self.write('honeyd.txt', "virtual honeynet", mtime=1000060.0)
+        tdm = TermDocumentMatrix(self.path)
+        self.assertEqual(tdm.update(self.txt_dir), (2, 0))
+        self.assertEqual(self.names(tdm), ['honeycomb.txt', 'honeyd.txt', 'malware.txt'])
+        self.assertEqual(tdm.matrix.toarray()[:, tdm.vocabulary['worm']].tolist(), [1, 0, 1])
+        self.assertEqual(tdm.matrix.toarray()[:, tdm.vocabulary['honeypot']].tolist(), [1, 0, 0])
+
+    def test_saved_without_sizes(self):
+        self.write('honeycomb.txt', "honeypot signatures")
+        tdm = TermDocumentMatrix(self.path)
+        tdm.update(self.txt_dir)
+        tdm.save()
+
+        # as saved before sizes were kept : read again once
+        with np.load(self.path) as data:
+            arrays = dict([(name, data[name]) for name in data.files if name != 'sizes'])
+        np.savez(self.path, **arrays)
+
+        tdm = TermDocumentMatrix(self.path)
+        self.assertEqual(tdm.update(self.txt_dir), (1, 0))
+        tdm.save()
+        self.assertEqual(TermDocumentMatrix(self.path).update(self.txt_dir), (0, 0))
+
+    def test_deleted_files_pruned(self):
+        self.write('honeycomb.txt', "honeypot signatures honeypot")
+        self.write('honeyd.txt', "virtual honeypot framework")
+        self.write('malware.txt', "worm signatures")
+
+        tdm = TermDocumentMatrix(self.path)
+        tdm.update(self.txt_dir)
+        tdm.save()
+
+        os.remove(os.path.join(self.txt_dir, 'honeyd.txt'))
+        tdm = TermDocumentMatrix(self.path)
+        self.assertEqual(tdm.update(self.txt_dir), (0, 1))
+        self.assertEqual(self.names(tdm), ['honeycomb.txt', 'malware.txt'])
+        self.assertEqual(sorted(tdm.rows.values()), [0, 1])
+
+        # the rows left keep their own counts
+        matrix = tdm.matrix.toarray()
+        self.assertEqual(matrix.shape[0], 2)
+        self.assertEqual(matrix[tdm.rows[os.path.join(self.txt_dir, 'honeycomb.txt')], tdm.vocabulary['honeypot']], 2)
+        self.assertEqual(matrix[:, tdm.vocabulary['framework']].sum(), 0)
+        self.assertFalse('framework' in [term for term, _ in tdm.top_terms(k=100)])
+
+    def test_other_dirs_kept(self):
+        self.write('honeycomb.txt', "honeypot signatures")
+        tdm = TermDocumentMatrix(self.path)
+        tdm.add_document(os.path.join(self.dir, 'elsewhere', 'honeyd.txt'), "virtual honeypot")
+
+        self.assertEqual(tdm.update(self.txt_dir), (1, 0))
+        self.assertEqual(self.names(tdm), ['honeyd.txt', 'honeycomb.txt'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import shutil
+import tempfile
+import unittest
+
+try:
+    from transport import HTTPTransport
+    from cache import ResponseCache
+except ImportError:
+    # needs requests (and scholar.py's dependencies)
+    HTTPTransport = None
+
+RESULTS_URL = 'https://scholar.google.com/scholar?as_q=honeycomb&num=20'
+CITATION_URL = 'https://scholar.googleusercontent.com/scholar.bib?q=info:abc:scholar.google.com/&output=citation'
+
+class FakeResponse(object):
+
+    def __init__(self, url, body, status_code=200, content_type='text/html; charset=utf-8'):
+        self.url = url
+        self.content = body
+        self.status_code = status_code
+        self.headers = {'Content-Type': content_type}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise IOError("HTTP Error %d" % (self.status_code))
+
+class FakeSession(object):
+    # answers every request with the body of pages[url]
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.requests = []
+
+    def get(self, url, headers=None, timeout=None, stream=False):
+        self.requests.append(url)
+        return FakeResponse(url, self.pages[url])
+
+    def close(self):
+        pass
+
+@unittest.skipIf(HTTPTransport is None, "requires requests")
+class HTTPTransportCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def transport(self, pages):
+        # no rate limiter, as with --no-rate-limit
+        transport = HTTPTransport(cache=ResponseCache(self.dir))
+        transport.session = FakeSession(pages)
+        return transport
+
+    def test_cached(self):
+        transport = self.transport({RESULTS_URL: b'<html>results</html>'})
+        for _ in range(2):
+            self.assertEqual(transport.open(RESULTS_URL).read(), b'<html>results</html>')
+        self.assertEqual(transport.session.requests, [RESULTS_URL])
+        transport.close()
+
+    def test_captcha_page_not_cached(self):
+        captcha = b'<html>Our systems have detected unusual traffic from your computer network</html>'
+        transport = self.transport({RESULTS_URL: captcha, CITATION_URL: b'<div class="g-recaptcha"></div>'})
+        for _ in range(2):
+            self.assertEqual(transport.open(RESULTS_URL).read(), captcha)
+            transport.open(CITATION_URL)
+        self.assertEqual(transport.session.requests, [RESULTS_URL, CITATION_URL] * 2)
+
+        transport.session.pages[RESULTS_URL] = b'<html>results</html>'
+        transport.open(RESULTS_URL)
+        self.assertEqual(transport.open(RESULTS_URL).read(), b'<html>results</html>')
+        self.assertEqual(transport.session.requests.count(RESULTS_URL), 3)
+        transport.close()
+
+if __name__ == '__main__':
+    unittest.main()
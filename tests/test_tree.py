@@ -0,0 +1,100 @@
+import unittest
+
+from tree import Tree
+
+def sample_tree():
+    # 0 -> (1 -> (3, 4 -> 6), 2 -> 5)
+    tree = Tree()
+    tree.add_node("0")
+    for identifier, parent in [("1", "0"), ("2", "0"), ("3", "1"), ("4", "1"), ("5", "2"), ("6", "4")]:
+        tree.add_node(identifier, parent, "category %s" % (identifier))
+    return tree
+
+class TreeTest(unittest.TestCase):
+
+    def test_depth(self):
+        tree = sample_tree()
+        self.assertEqual([tree.depth(i) for i in "0123456"], [0, 1, 1, 2, 2, 2, 3])
+        self.assertEqual(list(tree.ancestors("6")), ["4", "1", "0"])
+
+    def test_subtree_size(self):
+        tree = sample_tree()
+        self.assertEqual([tree.subtree_size(i) for i in "0123456"], [7, 4, 2, 1, 2, 1, 1])
+
+    def test_is_ancestor(self):
+        tree = sample_tree()
+        self.assertTrue(tree.is_ancestor("0", "6"))
+        self.assertTrue(tree.is_ancestor("1", "6"))
+        self.assertTrue(tree.is_ancestor("4", "4"))
+        self.assertFalse(tree.is_ancestor("2", "6"))
+        self.assertFalse(tree.is_ancestor("6", "4"))
+        self.assertFalse(tree.is_ancestor("3", "4"))
+
+        # against the walk up to the root
+        for ancestor in tree.nodes:
+            for identifier in tree.nodes:
+                self.assertEqual(tree.is_ancestor(ancestor, identifier),
+                    ancestor == identifier or ancestor in tree.ancestors(identifier), (ancestor, identifier))
+
+    def test_separate_roots(self):
+        tree = sample_tree()
+        tree.add_node("7")
+        tree.add_node("8", "7")
+        self.assertEqual((tree.depth("8"), tree.subtree_size("7")), (1, 2))
+        self.assertFalse(tree.is_ancestor("0", "8"))
+        self.assertFalse(tree.is_ancestor("7", "6"))
+
+    def test_index_rebuilt_after_add_node(self):
+        tree = sample_tree()
+        self.assertEqual(tree.subtree_size("0"), 7)
+        self.assertTrue(tree.is_ancestor("2", "5"))
+
+        tree.add_node("7", "5")
+        self.assertEqual(tree.subtree_size("0"), 8)
+        self.assertEqual(tree.subtree_size("2"), 3)
+        self.assertEqual(tree.depth("7"), 3)
+        self.assertTrue(tree.is_ancestor("2", "7"))
+        self.assertFalse(tree.is_ancestor("1", "7"))
+
+    def test_missing_parent(self):
+        tree = sample_tree()
+        self.assertEqual(tree.subtree_size("0"), 7)
+        items = tree.to_list("0")
+
+        self.assertRaises(KeyError, tree.add_node, "7", "99")
+        self.assertEqual(sorted(tree.nodes), list("0123456"))
+        self.assertEqual(tree.to_list("0"), items)
+        self.assertEqual(tree.subtree_size("0"), 7)
+        self.assertRaises(KeyError, tree.depth, "7")
+
+    def test_to_list(self):
+        tree = sample_tree()
+        self.assertEqual(tree.to_list("0"), [["0", None, ""], ["1", "0", "category 1"], ["3", "1", "category 3"],
+            ["4", "1", "category 4"], ["6", "4", "category 6"], ["2", "0", "category 2"], ["5", "2", "category 5"]])
+
+        # a subtree comes without its parent
+        self.assertEqual(tree.to_list("4"), [["4", None, "category 4"], ["6", "4", "category 6"]])
+
+    def test_from_list(self):
+        tree = Tree.from_list(sample_tree().to_list("0"))
+        self.assertEqual(tree.to_list("0"), sample_tree().to_list("0"))
+        self.assertEqual(tree.parent("6"), "4")
+        self.assertEqual(tree["6"].category, "category 6")
+        self.assertEqual([tree.subtree_size(i) for i in "0123456"], [7, 4, 2, 1, 2, 1, 1])
+
+        subtree = Tree.from_list(sample_tree().to_list("1"))
+        self.assertEqual(sorted(subtree.nodes), ["1", "3", "4", "6"])
+        self.assertEqual((subtree.parent("1"), subtree.depth("6")), (None, 2))
+
+    def test_deep_tree(self):
+        # deeper than the recursion limit
+        tree = Tree()
+        tree.add_node(0)
+        for i in range(1, 5000):
+            tree.add_node(i, i - 1)
+        self.assertEqual((tree.depth(4999), tree.subtree_size(0), tree.subtree_size(4000)), (4999, 5000, 1000))
+        self.assertTrue(tree.is_ancestor(10, 4999))
+        self.assertEqual(len(Tree.from_list(tree.to_list(0)).nodes), 5000)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,264 @@
+#!/usr/bin/env python
+# sparse term-document matrix over the .txt files extracted from downloaded
+# articles, with tf-idf weights and top-k terms per document or per set of
+# documents (e.g. the results of an index.py query). requires numpy and
+# scipy.
+#
+# every document is kept as a sparse row of term counts, so documents can be
+# added (or replaced, if their .txt file changed, or dropped, if it's gone)
+# without rebuilding the matrix of the others. the scipy matrix is only
+# assembled when needed, and the whole thing is saved to a single .npz file
+# between runs.
+
+import os
+import sys
+import time
+import json
+import optparse
+
+import numpy as np
+import scipy.sparse as sparse
+
+from index import TextIndex, tokenize
+
+class TermDocumentMatrix(object):
+
+    def __init__(self, path=None):
+        # term -> column
+        self.vocabulary = {}
+        self.terms = []
+        # document -> row
+        self.rows = {}
+        self.documents = []
+        # size and mtime of each document's .txt file, to spot changes
+        self.sizes = []
+        self.mtimes = []
+
+        # per-document term ids and counts, as numpy arrays
+        self.__indices = []
+        self.__counts = []
+        # cached csr matrix of counts and tf-idf weights
+        self.__matrix = None
+        self.__tfidf = None
+
+        self.path = path
+        if path is not None and os.path.exists(path):
+            self.load(path)
+
+    def update(self, txt_dir):
+        # adds the new .txt files in txt_dir, re-reads the changed ones and
+        # drops the ones which are gone (as TextIndex.update() does).
+        # returns (nr. added or replaced, nr. removed).
+        txt_dir = os.path.abspath(txt_dir)
+        paths = [os.path.join(txt_dir, f) for f in sorted(os.listdir(txt_dir)) if f.endswith(".txt")]
+        start = time.time()
+
+        present = set(paths)
+        removed = self.remove_documents([document for document in self.documents
+            if os.path.dirname(document) == txt_dir and document not in present])
+
+        updated = 0
+        for path in paths:
+            stat = os.stat(path)
+            row = self.rows.get(path)
+            if row is not None and self.sizes[row] == stat.st_size and self.mtimes[row] == stat.st_mtime:
+                continue
+
+            with open(path, 'rb') as txt_file:
+                self.add_document(path, txt_file.read().decode('utf-8', 'replace'), stat.st_mtime, stat.st_size)
+            updated += 1
+
+        print("tfidf.py::TermDocumentMatrix.update() : [INFO] %s : %d documents added, %d removed (%d documents, %d terms, %.2f sec)"
+            % (txt_dir, updated, removed, len(self.documents), len(self.terms), time.time() - start))
+
+        return updated, removed
+
+    def add_document(self, name, text, mtime=0.0, size=-1):
+
+        ids = np.fromiter((self.__term_id(token) for token in tokenize(text)), dtype=np.int32)
+        indices, counts = np.unique(ids, return_counts=True)
+
+        row = self.rows.get(name)
+        if row is None:
+            self.rows[name] = len(self.documents)
+            self.documents.append(name)
+            self.sizes.append(size)
+            self.mtimes.append(mtime)
+            self.__indices.append(indices)
+            self.__counts.append(counts.astype(np.int32))
+        else:
+            self.sizes[row] = size
+            self.mtimes[row] = mtime
+            self.__indices[row] = indices
+            self.__counts[row] = counts.astype(np.int32)
+
+        self.__matrix = None
+        self.__tfidf = None
+
+    def remove_documents(self, names):
+        # drops the rows of these documents, returns the nr. removed. their
+        # terms stay in the vocabulary, with a document frequency of 0 if no
+        # other document has them.
+        gone = set([self.rows[name] for name in names if name in self.rows])
+        if not gone:
+            return 0
+
+        keep = [row for row in range(len(self.documents)) if row not in gone]
+        self.documents = [self.documents[row] for row in keep]
+        self.sizes = [self.sizes[row] for row in keep]
+        self.mtimes = [self.mtimes[row] for row in keep]
+        self.__indices = [self.__indices[row] for row in keep]
+        self.__counts = [self.__counts[row] for row in keep]
+        self.rows = dict([(document, i) for i, document in enumerate(self.documents)])
+
+        self.__matrix = None
+        self.__tfidf = None
+
+        return len(gone)
+
+    @property
+    def matrix(self):
+        # documents x terms csr matrix of term counts
+        if self.__matrix is None:
+            indptr = np.zeros(len(self.documents) + 1, dtype=np.int64)
+            if self.documents:
+                np.cumsum([len(indices) for indices in self.__indices], out=indptr[1:])
+                indices = np.concatenate(self.__indices)
+                counts = np.concatenate(self.__counts)
+            else:
+                indices = np.zeros(0, dtype=np.int32)
+                counts = np.zeros(0, dtype=np.int32)
+
+            self.__matrix = sparse.csr_matrix((counts, indices, indptr), shape=(len(self.documents), len(self.terms)))
+
+        return self.__matrix
+
+    def document_frequencies(self):
+        return np.bincount(self.matrix.indices, minlength=len(self.terms))
+
+    def tfidf(self):
+        # documents x terms csr matrix of tf-idf weights: sublinear tf
+        # (1 + log(count)), smoothed idf (1 + log((1 + n) / (1 + df))), and
+        # rows scaled to unit length
+        if self.__tfidf is None:
+            counts = self.matrix
+            idf = 1.0 + np.log((1.0 + counts.shape[0]) / (1.0 + self.document_frequencies()))
+
+            weights = counts.astype(np.float64)
+            weights.data = (1.0 + np.log(weights.data)) * idf[weights.indices]
+
+            norms = np.sqrt(np.asarray(weights.multiply(weights).sum(axis=1)).ravel())
+            norms[norms == 0.0] = 1.0
+            weights = sparse.csr_matrix(sparse.diags(1.0 / norms).dot(weights))
+
+            self.__tfidf = weights
+
+        return self.__tfidf
+
+    def top_terms(self, documents=None, k=10):
+        # returns the k (term, weight) pairs with the largest tf-idf weight
+        # summed over documents (all of them, by default)
+        weights = self.tfidf()
+        if documents is not None:
+            rows = [self.rows[document] for document in documents if document in self.rows]
+            if not rows:
+                return []
+            weights = weights[rows]
+
+        totals = np.asarray(weights.sum(axis=0)).ravel()
+        k = min(k, np.count_nonzero(totals))
+        if k == 0:
+            return []
+
+        top = np.argpartition(-totals, k - 1)[:k]
+        top = top[np.argsort(-totals[top], kind='mergesort')]
+
+        return [(self.terms[i], float(totals[i])) for i in top]
+
+    def save(self, path=None):
+        # a single .npz file, written to a temporary file first
+        path = path or self.path
+        matrix = self.matrix
+
+        tmp_path = path + '.tmp.npz'
+        np.savez(tmp_path, indptr=matrix.indptr, indices=matrix.indices, counts=matrix.data,
+            sizes=np.array(self.sizes, dtype=np.int64), mtimes=np.array(self.mtimes, dtype=np.float64),
+            meta=np.array([json.dumps({'terms': self.terms, 'documents': self.documents})]))
+        os.rename(tmp_path, path)
+
+    def load(self, path):
+        with np.load(path) as data:
+            indptr, indices, counts = data['indptr'], data['indices'], data['counts']
+            meta = json.loads(str(data['meta'][0]))
+            self.mtimes = data['mtimes'].tolist()
+            # files saved before sizes were kept : re-read on the next update
+            self.sizes = data['sizes'].tolist() if 'sizes' in data.files else [-1] * len(self.mtimes)
+
+        self.terms = meta['terms']
+        self.vocabulary = dict([(term, i) for i, term in enumerate(self.terms)])
+        self.documents = meta['documents']
+        self.rows = dict([(document, i) for i, document in enumerate(self.documents)])
+
+        self.__indices = [indices[indptr[i]:indptr[i + 1]] for i in range(len(self.documents))]
+        self.__counts = [counts[indptr[i]:indptr[i + 1]] for i in range(len(self.documents))]
+        self.__matrix = None
+        self.__tfidf = None
+
+    def __term_id(self, term):
+        term_id = self.vocabulary.get(term)
+        if term_id is None:
+            term_id = self.vocabulary[term] = len(self.terms)
+            self.terms.append(term)
+        return term_id
+
+def main():
+    usage = """tfidf.py [options]
+tf-idf weights of the terms in .txt files. with --add, adds the new and
+changed .txt files in a directory to the matrix, and drops the deleted ones.
+lists the top terms of the whole corpus, of a document (--document) or of
+the documents matching an index.py query (--index and --query)."""
+
+    fmt = optparse.IndentedHelpFormatter(max_help_position=50, width=100)
+    parser = optparse.OptionParser(usage=usage, formatter=fmt)
+    parser.add_option('--matrix', metavar='FILE', default=None,
+                      help='term-document matrix file (.npz)')
+    parser.add_option('--add', metavar='DIR', action='append', default=[],
+                      help='add the .txt files in DIR (may be given several times)')
+    parser.add_option('--document', metavar='FILE', action='append', default=[],
+                      help='list the top terms of the .txt file FILE')
+    parser.add_option('--index', metavar='FILE', default=None,
+                      help='index database file (see index.py), for --query')
+    parser.add_option('--query', metavar='QUERY', default=None,
+                      help='list the top terms of the documents matching QUERY')
+    parser.add_option('-k', '--top', metavar='K', type='int', default=20,
+                      help='nr. of terms listed (default 20)')
+
+    options, _ = parser.parse_args()
+
+    if not options.matrix or (options.query and not options.index):
+        parser.print_help()
+        return 1
+
+    tdm = TermDocumentMatrix(options.matrix)
+
+    for txt_dir in options.add:
+        tdm.update(txt_dir)
+    if options.add:
+        tdm.save()
+
+    documents = None
+    if options.document:
+        documents = [os.path.abspath(document) for document in options.document]
+    elif options.query:
+        index = TextIndex(options.index)
+        documents = [path for path, _ in index.search(options.query)]
+        index.close()
+        print("tfidf.py::main() : [INFO] %d documents match %s" % (len(documents), options.query))
+
+    for term, weight in tdm.top_terms(documents, k=options.top):
+        print("%8.4f %s" % (weight, term))
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
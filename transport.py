@@ -0,0 +1,146 @@
+# pooled, keep-alive http transport, shared by the scholar querier and the
+# scrapers in leonardo.py. all requests go through a single requests.Session,
+# so tcp/tls connections to the same hosts are reused instead of being set
+# up again for every request. responses fetched with open() can optionally
+# be served from an on-disk ResponseCache (see cache.py), and requests can
+# be paced per host by a RateLimiter (see scheduler.py).
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    # python 3
+    from urllib.parse import urlparse
+except ImportError:
+    # python 2
+    from urlparse import urlparse
+
+from scholar import ScholarConf
+from scheduler import RateLimiter, RateLimitError
+
+class TransportResponse(object):
+    # wraps a requests.Response so that it can be used in place of the
+    # handles returned by urllib openers (e.g. in ScholarQuerier)
+
+    def __init__(self, response):
+        self.response = response
+
+    def read(self):
+        return self.response.content
+
+    def geturl(self):
+        return self.response.url
+
+    def getcode(self):
+        return self.response.status_code
+
+    def info(self):
+        return '\n'.join(["%s: %s" % (k, v) for k, v in self.response.headers.items()])
+
+class CachedResponse(object):
+    # urllib-like handle for a body served from the response cache
+
+    def __init__(self, url, body):
+        self.url = url
+        self.body = body
+
+    def read(self):
+        return self.body
+
+    def geturl(self):
+        return self.url
+
+    def getcode(self):
+        return 200
+
+    def info(self):
+        return 'X-Cache: HIT'
+
+class HTTPTransport(object):
+
+    # nr. of hosts for which connection pools are kept
+    POOL_CONNECTIONS = 10
+    # max. nr. of keep-alive connections kept per host
+    POOL_MAXSIZE = 10
+    # connect and read timeout, in seconds
+    TIMEOUT = 30.0
+    # max. nr. of attempts for requests which get throttled or blocked
+    MAX_ATTEMPTS = 4
+
+    def __init__(self, cookie_jar=None, pool_connections=None, pool_maxsize=None, timeout=None, cache=None, limiter=None):
+
+        self.timeout = timeout or HTTPTransport.TIMEOUT
+        self.cache = cache
+        self.limiter = limiter
+
+        self.session = requests.Session()
+        self.session.headers['User-Agent'] = ScholarConf.USER_AGENT
+
+        adapter = HTTPAdapter(
+            pool_connections=(pool_connections or HTTPTransport.POOL_CONNECTIONS),
+            pool_maxsize=(pool_maxsize or HTTPTransport.POOL_MAXSIZE))
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        if cookie_jar is not None:
+            self.set_cookie_jar(cookie_jar)
+
+    def set_cookie_jar(self, cookie_jar):
+        # cookies set by any response end up in this jar (e.g. the
+        # MozillaCookieJar of a ScholarQuerier, which saves it to disk)
+        self.session.cookies = cookie_jar
+
+    def get(self, url, headers=None, stream=False):
+
+        if self.limiter is None:
+            return self.session.get(url, headers=headers, timeout=self.timeout, stream=stream)
+
+        # wait for our turn, and retry (after backing off or cooling down)
+        # if the host throttles or blocks us
+        host = urlparse(url).netloc.lower()
+        for attempt in range(HTTPTransport.MAX_ATTEMPTS):
+
+            self.limiter.acquire(host)
+            response = self.session.get(url, headers=headers, timeout=self.timeout, stream=stream)
+
+            verdict = self.limiter.report(host, response, inspect_body=(not stream))
+            if verdict == RateLimiter.OK:
+                return response
+
+            response.close()
+
+        # a captcha page comes with a 200 status code, so make sure nobody
+        # mistakes it for the real thing
+        if verdict == RateLimiter.BLOCKED:
+            raise RateLimitError("blocked by %s after %d attempts" % (host, HTTPTransport.MAX_ATTEMPTS))
+
+        return response
+
+    def open(self, url, headers=None):
+        # like get(), but raises an exception on http errors (as urllib
+        # openers do) and returns a urllib-like handle. plain requests (no 
+        # custom headers) go through the response cache, if any.
+        use_cache = (self.cache is not None and headers is None)
+        if use_cache:
+            body = self.cache.get(url)
+            if body is not None:
+                return CachedResponse(url, body)
+
+        response = self.get(url, headers=headers)
+        response.raise_for_status()
+
+        if use_cache and response.status_code == 200:
+            # a captcha page comes with a 200 status code too, and would be
+            # served as a results page for as long as it's cached. get()
+            # only checks for one if requests are rate limited.
+            if RateLimiter.check(response, host=urlparse(url).netloc.lower()) == RateLimiter.BLOCKED:
+                print("transport.py::HTTPTransport.open() : [ERROR] blocked by %s, not caching %s" % (urlparse(url).netloc, url))
+            else:
+                self.cache.put(url, response.content)
+
+        return TransportResponse(response)
+
+    def close(self):
+        self.session.close()
+        if self.cache is not None:
+            self.cache.close()
@@ -1,13 +1,23 @@
 # Brett Kromkamp (brett@perfectlearn.com)
 # You Programming (http://www.youprogramming.com)
 # May 03, 2014
+#
+# nodes keep a pointer to their parent, and the tree keeps a pre-order index
+# of its nodes (the position of each node in a depth-first walk, and the size
+# of the subtree under it), so that ancestor / descendant checks and subtree
+# sizes take constant time. the index is (re-)built when first needed after
+# nodes are added. walks are iterative, so deep trees don't hit the
+# recursion limit.
+
+from collections import deque
 
 (_ROOT, _DEPTH, _BREADTH) = range(3)
 
 class Node:
-    def __init__(self, identifier, category):
+    def __init__(self, identifier, category, parent=None):
         self.__identifier = identifier
         self.__category = category
+        self.__parent = parent
         self.__children = []
 
     @property
@@ -18,6 +28,10 @@ class Node:
     def category(self):
         return self.__category
 
+    @property
+    def parent(self):
+        return self.__parent
+
     @property
     def children(self):
         return self.__children
@@ -29,44 +43,115 @@ class Tree:
 
     def __init__(self):
         self.__nodes = {}
+        # pre-order index: identifier -> (position, subtree size, depth)
+        self.__index = None
 
     @property
     def nodes(self):
         return self.__nodes
 
     def add_node(self, identifier, parent=None, category=""):
-        node = Node(identifier, category)
-        self[identifier] = node
-
+        # raises KeyError (leaving the tree untouched) if parent isn't in it
         if parent is not None:
             self[parent].add_child(identifier)
 
+        node = Node(identifier, category, parent)
+        self[identifier] = node
+
+        self.__index = None
         return node
 
     def display(self, identifier, depth=_ROOT):
-        children = self[identifier].children
-        if depth == _ROOT:
-            print("{0}".format(identifier), "{0}".format(self[identifier].category))
-        else:
-            print("\t"*depth, "{0}".format(identifier), "{0}".format(self[identifier].category))
+        stack = [(identifier, depth)]
+        while stack:
+            identifier, depth = stack.pop()
+            if depth == _ROOT:
+                print("{0}".format(identifier), "{0}".format(self[identifier].category))
+            else:
+                print("\t"*depth, "{0}".format(identifier), "{0}".format(self[identifier].category))
 
-        depth += 1
-        for child in children:
-            self.display(child, depth)  # recursive call
+            # last child on top of the stack, so that children come out in order
+            stack.extend([(child, depth + 1) for child in reversed(self[identifier].children)])
 
     def traverse(self, identifier, mode=_DEPTH):
         # Python generator. Loosly based on an algorithm from 
         # 'Essential LISP' by John R. Anderson, Albert T. Corbett, 
         # and Brian J. Reiser, page 239-241
         yield identifier
-        queue = self[identifier].children
+        queue = deque(self[identifier].children)
         while queue:
-            yield queue[0]
-            expansion = self[queue[0]].children
+            identifier = queue.popleft()
+            yield identifier
+            expansion = self[identifier].children
             if mode == _DEPTH:
-                queue = expansion + queue[1:]  # depth-first
+                queue.extendleft(reversed(expansion))  # depth-first
             elif mode == _BREADTH:
-                queue = queue[1:] + expansion  # width-first
+                queue.extend(expansion)  # width-first
+
+    def to_list(self, identifier):
+        # compact, json serializable form of the subtree under identifier:
+        # [identifier, parent, category] triples, parents before children
+        # (identifier itself comes first, without a parent)
+        items = [[i, self[i].parent, self[i].category] for i in self.traverse(identifier)]
+        items[0][1] = None
+        return items
+
+    @staticmethod
+    def from_list(items):
+        # inverse of to_list()
+        tree = Tree()
+        for identifier, parent, category in items:
+            tree.add_node(identifier, parent, category)
+        return tree
+
+    def parent(self, identifier):
+        return self[identifier].parent
+
+    def ancestors(self, identifier):
+        # from the parent of identifier up to the root
+        parent = self[identifier].parent
+        while parent is not None:
+            yield parent
+            parent = self[parent].parent
+
+    def depth(self, identifier):
+        return self.__indexed(identifier)[2]
+
+    def subtree_size(self, identifier):
+        # nr. of nodes under identifier, itself included
+        return self.__indexed(identifier)[1]
+
+    def is_ancestor(self, ancestor, identifier):
+        # True if identifier is in the subtree under ancestor (a node is
+        # its own ancestor)
+        position, size, _ = self.__indexed(ancestor)
+        return position <= self.__indexed(identifier)[0] < position + size
+
+    def __indexed(self, identifier):
+        if self.__index is None:
+            self.__build_index()
+        return self.__index[identifier]
+
+    def __build_index(self):
+        # a single depth-first walk from each root, numbering nodes in
+        # pre-order. subtree sizes are then summed up in reverse order,
+        # children before parents.
+        order = []
+        depths = {}
+        for root in [i for i, node in self.__nodes.items() if node.parent is None]:
+            depths[root] = 0
+            for identifier in self.traverse(root):
+                order.append(identifier)
+                for child in self[identifier].children:
+                    depths[child] = depths[identifier] + 1
+
+        sizes = dict([(identifier, 1) for identifier in order])
+        for identifier in reversed(order):
+            parent = self[identifier].parent
+            if parent is not None:
+                sizes[parent] += sizes[identifier]
+
+        self.__index = dict([(identifier, (i, sizes[identifier], depths[identifier])) for i, identifier in enumerate(order)])
 
     def __getitem__(self, key):
         return self.__nodes[key]